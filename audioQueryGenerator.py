@@ -1,26 +1,47 @@
 import argparse
 import base64
+import json
 import logging
 import os
+import queue
 import sys
+import threading
+import time
 import warnings
 from io import TextIOWrapper
 from pathlib import Path
-from typing import Dict, Optional
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+)
 
 from bridge_plugin import __version__
-from bridge_plugin.bridge_config import BridgeConfigLoader
 from bridge_plugin.kana_parser import create_kana
 from bridge_plugin.model import (
+    AccentPhrase,
     AudioQuery,
 )
 from bridge_plugin.part_of_speech_data import MAX_PRIORITY, MIN_PRIORITY
-from bridge_plugin.synthesis_engine import SynthesisEngineBase, make_synthesis_engines
 
 from bridge_plugin.utility import (
     engine_root,
     get_latest_core_version,
 )
+
+# AccentPhraseExtractorPoolのワーカーはspawnで起動し、このスクリプトを読み直す。
+# 音声合成エンジン(torch・ESPnet)をワーカーに読み込ませないよう、
+# エンジン関連のモジュールはSpeechSynthesisの中で読み込む
+if TYPE_CHECKING:
+    from bridge_plugin.synthesis_engine import (
+        AccentPhraseExtractorPool,
+        SynthesisEngineBase,
+    )
 logging.getLogger("uvicorn").propagate = False
 
 
@@ -56,20 +77,70 @@ def set_output_log_utf8() -> None:
             )
 
 
+def parse_input_lines(lines: Iterable[str], default_style_id: int) -> Iterator[Tuple[str, int]]:
+    """
+    1行1件の入力を(text, style_id)の組に変換する
+    `{`で始まる行は`text`と`style_id`を持つJSONとして扱い、それ以外の行はテキストそのものとして扱う
+    空行は読み飛ばす。解釈できないJSONの行は行番号とともに標準エラー出力に警告を出して読み飛ばす
+    """
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if len(line) == 0:
+            continue
+        if line.startswith("{"):
+            try:
+                item = json.loads(line)
+                yield str(item["text"]), int(item.get("style_id", default_style_id))
+            except (ValueError, KeyError, TypeError) as err:
+                print(
+                    f"WARNING:  skipped invalid input at line {line_number}: {err!r}",
+                    file=sys.stderr,
+                )
+        else:
+            yield line, default_style_id
+
+
+def iter_prefetched(items: Iterable, buffer_size: int) -> Iterator:
+    """
+    別スレッドでitemsを先読みしながら順に返す
+    先読みする件数はbuffer_sizeまでに制限されるため、入力の大きさによらずメモリ使用量は一定になる
+    """
+    buffer: queue.Queue = queue.Queue(maxsize=max(buffer_size, 1))
+    end_of_items = object()
+
+    def read():
+        try:
+            for item in items:
+                buffer.put((item, None))
+        except Exception as err:
+            buffer.put((None, err))
+        finally:
+            buffer.put((end_of_items, None))
+
+    threading.Thread(target=read, daemon=True).start()
+    while True:
+        item, err = buffer.get()
+        if err is not None:
+            raise err
+        if item is end_of_items:
+            return
+        yield item
+
+
 class App:
     def __init__(
         self,
-        text: str,
-        synthesis_engines: Dict[str, SynthesisEngineBase],
+        synthesis_engines: Dict[str, "SynthesisEngineBase"],
         latest_core_version: str,
         root_dir: Optional[Path] = None,
         speaker_info_root_dir: Optional[Path] = None,
+        accent_phrase_pool: Optional["AccentPhraseExtractorPool"] = None,
     ):
-        self.text = text
         self.synthesis_engines = synthesis_engines
         self.latest_core_version = latest_core_version
         self.root_dir = root_dir
         self.speaker_info_root_dir = speaker_info_root_dir
+        self.accent_phrase_pool = accent_phrase_pool
         
         if self.root_dir is None:
             self.root_dir = engine_root()
@@ -78,20 +149,52 @@ class App:
 
         self.default_sampling_rate = self.synthesis_engines[latest_core_version].default_sampling_rate
     
-    def get_engine(self, core_version: Optional[str]) -> SynthesisEngineBase:
+    def get_engine(self, core_version: Optional[str]) -> "SynthesisEngineBase":
         if core_version is None:
             return self.synthesis_engines[self.latest_core_version]
         if core_version in self.synthesis_engines:
             return self.synthesis_engines[core_version]
         raise Exception(status_code=422, detail="不明なバージョンです")
 
-    def audio_query(self, style_id):
+    def audio_query(self, text: str, style_id: int) -> AudioQuery:
         """
         クエリの初期値を得ます。ここで得られたクエリはそのまま音声合成に利用できます。各値の意味は`Schemas`を参照してください。
         """
         style_id = get_style_id_from_deprecated(style_id=style_id, speaker_id=self.speaker_info_root_dir)
         engine = self.get_engine(self.latest_core_version)
-        accent_phrases = engine.create_accent_phrases(self.text, style_id=style_id)
+        accent_phrases = engine.create_accent_phrases(text, style_id=style_id)
+        return self._create_audio_query(accent_phrases)
+
+    def audio_query_batch(
+        self,
+        items: Iterable[Tuple[str, int]],
+        timings: Optional[List[float]] = None,
+    ) -> Iterator[AudioQuery]:
+        """
+        (text, style_id)の組を順に処理し、クエリの初期値を1件ずつ返します。
+        timingsにリストを渡すと、各要素の処理時間(秒)が入力と同じ順番で追加されます。
+        accent_phrase_poolが設定されている場合、テキストの解析はワーカープロセスで並列に行われます。
+        その場合の処理時間はワーカーでの解析時間を含み、ワーカーの空きを待った時間は含みません。
+        """
+        engine = self.get_engine(self.latest_core_version)
+        items = (
+            (
+                text,
+                get_style_id_from_deprecated(style_id=style_id, speaker_id=self.speaker_info_root_dir),
+            )
+            for text, style_id in items
+        )
+        engine_timings: Optional[List[float]] = [] if timings is not None else None
+        for accent_phrases in engine.create_accent_phrases_batch(
+            items, pool=self.accent_phrase_pool, timings=engine_timings
+        ):
+            start = time.perf_counter()
+            query = self._create_audio_query(accent_phrases)
+            if timings is not None:
+                timings.append(engine_timings[-1] + time.perf_counter() - start)
+            yield query
+
+    def _create_audio_query(self, accent_phrases: List[AccentPhrase]) -> AudioQuery:
         return AudioQuery(
             accent_phrases=accent_phrases,
             speedScale=1,
@@ -107,11 +210,208 @@ class App:
     
 
 
+def create_argument_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="VOICEVOX のエンジンです。")
+    parser.add_argument("--host", type=str, default=None, help="接続を受け付けるホストアドレスです。")
+    parser.add_argument("--port", type=int, default=None, help="接続を受け付けるポート番号です。")
+    parser.add_argument(
+        "--use_gpu", action="store_true", help="指定するとGPUを使って音声合成するようになります。"
+    )
+    parser.add_argument(
+        "--voicevox_dir",
+        type=Path,
+        default=None,
+        help="この引数は無視されます。（VOICEVOX Engineとの互換性のために維持されています。）",
+    )
+    parser.add_argument(
+        "--voicelib_dir",
+        type=Path,
+        default=None,
+        action="append",
+        help="この引数は無視されます。（VOICEVOX Engineとの互換性のために維持されています。）",
+    )
+    parser.add_argument(
+        "--runtime_dir",
+        type=Path,
+        default=None,
+        action="append",
+        help="この引数は無視されます。（VOICEVOX Engineとの互換性のために維持されています。）",
+    )
+    parser.add_argument(
+        "--enable_mock",
+        action="store_true",
+        help="指定するとVOICEVOX COREを使わずモックで音声合成を行います。",
+    )
+    parser.add_argument(
+        "--enable_cancellable_synthesis",
+        action="store_true",
+        help="この引数は無視されます。（VOICEVOX Engineとの互換性のために維持されています。）",
+    )
+    parser.add_argument(
+        "--init_processes",
+        type=int,
+        default=2,
+        help="cancellable_synthesis機能の初期化時に生成するプロセス数です。",
+    )
+    parser.add_argument(
+        "--load_all_models",
+        action="store_true",
+        help=(
+            "指定すると起動時に全ての音声合成モデルを読み込みます。"
+            "--max_loaded_models などの上限を指定した場合は、上限に達するまで読み込みます。"
+        ),
+    )
+
+    parser.add_argument(
+        "--cpu_num_threads",
+        type=int,
+        default=None,
+        help="この引数は無視されます。（VOICEVOX Engineとの互換性のために維持されています。）",
+    )
+
+    parser.add_argument(
+        "--output_log_utf8",
+        action="store_true",
+        help=(
+            "指定するとログ出力をUTF-8でおこないます。指定しないと、代わりに環境変数 VV_OUTPUT_LOG_UTF8 の値が使われます。"
+            "VV_OUTPUT_LOG_UTF8 の値が1の場合はUTF-8で、0または空文字、値がない場合は環境によって自動的に決定されます。"
+        ),
+    )
+
+
+    parser.add_argument(
+        "--allow_origin", nargs="*", help="許可するオリジンを指定します。スペースで区切ることで複数指定できます。"
+    )
+
+    parser.add_argument(
+        "--bridge_config_dir",
+        type=Path,
+        default=engine_root(),
+        help="Bridge Configファイルのあるディレクトリです。",
+    )
+
+    parser.add_argument(
+        "--preset_file",
+        type=Path,
+        default=None,
+        help=(
+            "プリセットファイルを指定できます。"
+            "指定がない場合、環境変数 VV_PRESET_FILE、--voicevox_dirのpresets.yaml、"
+            "実行ファイルのディレクトリのpresets.yamlを順に探します。"
+        ),
+    )
+
+    parser.add_argument(
+        "--tts_max_batch_size",
+        type=int,
+        default=1,
+        help="2以上を指定すると、同じスタイル・話速の音声合成リクエストを最大この件数までまとめて推論します。",
+    )
+
+    parser.add_argument(
+        "--tts_batch_window_ms",
+        type=float,
+        default=5.0,
+        help="--tts_max_batch_size 指定時に、まとめるリクエストを待つ最大の時間(ミリ秒)です。",
+    )
+
+    parser.add_argument(
+        "--tts_batch_workers",
+        type=int,
+        default=None,
+        help="--tts_max_batch_size 指定時に、異なるスタイル・話速のバッチを並行して推論するスレッド数です。指定しない場合はCPUコア数です。",
+    )
+
+    parser.add_argument(
+        "--max_loaded_models",
+        type=int,
+        default=None,
+        help="同時に読み込んでおく音声合成モデル数の上限です。超えた場合は最も長く使われていないモデルを破棄します。",
+    )
+
+    parser.add_argument(
+        "--model_memory_budget_mb",
+        type=int,
+        default=None,
+        help="読み込んでおく音声合成モデルのパラメータの合計サイズ(MB)の上限です。",
+    )
+
+    parser.add_argument(
+        "--pinned_style_ids",
+        type=int,
+        nargs="*",
+        default=[],
+        help="起動時にモデルを読み込み、上限を超えても破棄しないスタイルIDです。スペースで区切ることで複数指定できます。",
+    )
+
+    parser.add_argument(
+        "--input",
+        type=str,
+        default=None,
+        help=(
+            "指定すると、1行1件のテキストまたは`text`と`style_id`を持つJSONLを読み込み、"
+            "AudioQueryのJSONを1行ずつ標準出力に書き出します。`-`を指定すると標準入力から読み込みます。"
+        ),
+    )
+
+    parser.add_argument(
+        "--style_id",
+        type=int,
+        default=1,
+        help="--input の行にstyle_idが指定されていない場合に使うスタイルIDです。",
+    )
+
+    parser.add_argument(
+        "--buffer_size",
+        type=int,
+        default=16,
+        help="--input から先読みしておく行数の上限です。",
+    )
+
+    parser.add_argument(
+        "--accent_phrase_cache_size",
+        type=int,
+        default=1024,
+        help="同じテキストのアクセント句をキャッシュする件数の上限です。0を指定するとキャッシュしません。",
+    )
+
+    parser.add_argument(
+        "--accent_phrase_cache_memory_mb",
+        type=int,
+        default=64,
+        help="アクセント句のキャッシュが使うおおよそのメモリ量(MB)の上限です。",
+    )
+
+    parser.add_argument(
+        "--label_workers",
+        type=int,
+        default=0,
+        help="1以上を指定すると、複数件のクエリ作成時にテキストの解析をこの数のワーカープロセスで並列に行います。",
+    )
+
+    parser.add_argument(
+        "--label_chunk_size",
+        type=int,
+        default=16,
+        help="--label_workers 指定時に、1回でワーカープロセスに渡すテキストの件数です。",
+    )
+
+    return parser
+
+
 class SpeechSynthesis:
-    def __init__(self):
-        pass
-        
-    def audioQueryGenerator(self, text):
+    """
+    音声合成エンジンとAppを一度だけ構築して保持し、
+    以降のaudio_queryの呼び出しでは読み込み済みの状態を使い回す
+    """
+
+    def __init__(self, argv: Optional[List[str]] = None):
+        """
+        Parameters
+        ----------
+        argv : Optional[List[str]]
+            コマンドライン引数。Noneの場合はsys.argvを使う
+        """
         output_log_utf8 = os.getenv("VV_OUTPUT_LOG_UTF8", default="")
         if output_log_utf8 == "1":
             set_output_log_utf8()
@@ -121,92 +421,15 @@ class SpeechSynthesis:
                 file=sys.stderr,
             )
 
-        parser = argparse.ArgumentParser(description="VOICEVOX のエンジンです。")
-        parser.add_argument("--host", type=str, default=None, help="接続を受け付けるホストアドレスです。")
-        parser.add_argument("--port", type=int, default=None, help="接続を受け付けるポート番号です。")
-        parser.add_argument(
-            "--use_gpu", action="store_true", help="指定するとGPUを使って音声合成するようになります。"
-        )
-        parser.add_argument(
-            "--voicevox_dir",
-            type=Path,
-            default=None,
-            help="この引数は無視されます。（VOICEVOX Engineとの互換性のために維持されています。）",
-        )
-        parser.add_argument(
-            "--voicelib_dir",
-            type=Path,
-            default=None,
-            action="append",
-            help="この引数は無視されます。（VOICEVOX Engineとの互換性のために維持されています。）",
-        )
-        parser.add_argument(
-            "--runtime_dir",
-            type=Path,
-            default=None,
-            action="append",
-            help="この引数は無視されます。（VOICEVOX Engineとの互換性のために維持されています。）",
-        )
-        parser.add_argument(
-            "--enable_mock",
-            action="store_true",
-            help="指定するとVOICEVOX COREを使わずモックで音声合成を行います。",
-        )
-        parser.add_argument(
-            "--enable_cancellable_synthesis",
-            action="store_true",
-            help="この引数は無視されます。（VOICEVOX Engineとの互換性のために維持されています。）",
-        )
-        parser.add_argument(
-            "--init_processes",
-            type=int,
-            default=2,
-            help="cancellable_synthesis機能の初期化時に生成するプロセス数です。",
-        )
-        parser.add_argument(
-            "--load_all_models", action="store_true", help="指定すると起動時に全ての音声合成モデルを読み込みます。"
-        )
-
-        parser.add_argument(
-            "--cpu_num_threads",
-            type=int,
-            default=None,
-            help="この引数は無視されます。（VOICEVOX Engineとの互換性のために維持されています。）",
-        )
-
-        parser.add_argument(
-            "--output_log_utf8",
-            action="store_true",
-            help=(
-                "指定するとログ出力をUTF-8でおこないます。指定しないと、代わりに環境変数 VV_OUTPUT_LOG_UTF8 の値が使われます。"
-                "VV_OUTPUT_LOG_UTF8 の値が1の場合はUTF-8で、0または空文字、値がない場合は環境によって自動的に決定されます。"
-            ),
-        )
-
-
-        parser.add_argument(
-            "--allow_origin", nargs="*", help="許可するオリジンを指定します。スペースで区切ることで複数指定できます。"
+        from bridge_plugin.bridge_config import BridgeConfigLoader
+        from bridge_plugin.synthesis_engine import (
+            AccentPhraseCache,
+            AccentPhraseExtractorPool,
+            make_synthesis_engines,
         )
 
-        parser.add_argument(
-            "--bridge_config_dir",
-            type=Path,
-            default=engine_root(),
-            help="Bridge Configファイルのあるディレクトリです。",
-        )
-
-        parser.add_argument(
-            "--preset_file",
-            type=Path,
-            default=None,
-            help=(
-                "プリセットファイルを指定できます。"
-                "指定がない場合、環境変数 VV_PRESET_FILE、--voicevox_dirのpresets.yaml、"
-                "実行ファイルのディレクトリのpresets.yamlを順に探します。"
-            ),
-        )
-
-        args = parser.parse_args()
+        args = create_argument_parser().parse_args(argv)
+        self.args = args
 
         bridge_config_loader = BridgeConfigLoader(args.bridge_config_dir)
 
@@ -223,27 +446,115 @@ class SpeechSynthesis:
             enable_mock=enable_mock,
             load_all_models=load_all_models,
             bridge_config_loader=bridge_config_loader,
+            tts_batch_window=args.tts_batch_window_ms / 1000,
+            tts_max_batch_size=args.tts_max_batch_size,
+            tts_batch_workers=args.tts_batch_workers,
+            max_loaded_models=args.max_loaded_models,
+            model_memory_budget=(
+                args.model_memory_budget_mb * 1024 * 1024
+                if args.model_memory_budget_mb is not None
+                else None
+            ),
+            pinned_style_ids=args.pinned_style_ids,
         )
         
         assert len(synthesis_engines) != 0, "音声合成エンジンがありません。"
+
+        # キャッシュのキーにはエンジンのバージョンが含まれるので、全エンジンで共有する
+        self.accent_phrase_cache = AccentPhraseCache(
+            max_entries=args.accent_phrase_cache_size,
+            max_bytes=args.accent_phrase_cache_memory_mb * 1024 * 1024,
+        )
+        for synthesis_engine in synthesis_engines.values():
+            synthesis_engine.accent_phrase_cache = self.accent_phrase_cache
         latest_core_version = get_latest_core_version(versions=synthesis_engines.keys())
 
         root_dir: Path | None = None
         if root_dir is None:
             root_dir = engine_root()
         
-        app =  App(
-                text,
-                synthesis_engines,
-                latest_core_version,
-                root_dir=root_dir,
-                speaker_info_root_dir=args.bridge_config_dir,
+        self.accent_phrase_pool: Optional["AccentPhraseExtractorPool"] = None
+        if args.label_workers > 0:
+            self.accent_phrase_pool = AccentPhraseExtractorPool(
+                num_workers=args.label_workers,
+                chunk_size=args.label_chunk_size,
             )
-        return app.audio_query(style_id=1)
+
+        self.app = App(
+            synthesis_engines,
+            latest_core_version,
+            root_dir=root_dir,
+            speaker_info_root_dir=args.bridge_config_dir,
+            accent_phrase_pool=self.accent_phrase_pool,
+        )
+
+    def close(self) -> None:
+        """
+        テキスト解析用のワーカープロセスを終了する。close後はaudio_query_batchを使えない
+        """
+        if self.accent_phrase_pool is not None:
+            self.accent_phrase_pool.shutdown()
+            self.accent_phrase_pool = None
+            self.app.accent_phrase_pool = None
+
+    def __enter__(self) -> "SpeechSynthesis":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def audio_query(self, text: str, style_id: int = 1) -> AudioQuery:
+        """
+        読み込み済みのエンジンを使ってクエリの初期値を得る。何度でも呼び出せる
+        """
+        return self.app.audio_query(text, style_id=style_id)
+
+    def audio_query_batch(
+        self,
+        items: Iterable[Tuple[str, int]],
+        timings: Optional[List[float]] = None,
+    ) -> Iterator[AudioQuery]:
+        """
+        複数の(text, style_id)の組からクエリの初期値を順に得る
+        """
+        return self.app.audio_query_batch(items, timings=timings)
+
+    def audioQueryGenerator(self, text):
+        return self.audio_query(text, style_id=1)
         
         
+def stream_audio_queries(
+    speech_synthesis: SpeechSynthesis,
+    input_stream: TextIO,
+    output_stream: TextIO,
+    default_style_id: int,
+    buffer_size: int,
+) -> None:
+    """
+    input_streamの各行からクエリを作成し、完成した順にJSONLとしてoutput_streamへ書き出す
+    """
+    items = iter_prefetched(
+        parse_input_lines(input_stream, default_style_id), buffer_size
+    )
+    for query in speech_synthesis.audio_query_batch(items):
+        output_stream.write(query.json(ensure_ascii=False) + "\n")
+        output_stream.flush()
+
+
 if __name__ == "__main__":
-    speechSynthesis = SpeechSynthesis()
-    text = "日本語は美しい言語です。"
-    print(speechSynthesis.audioQueryGenerator(text))
-        
+    with SpeechSynthesis() as speechSynthesis:
+        args = speechSynthesis.args
+        if args.input is None:
+            text = "日本語は美しい言語です。"
+            print(speechSynthesis.audioQueryGenerator(text))
+        else:
+            set_output_log_utf8()
+            if args.input == "-":
+                stream_audio_queries(
+                    speechSynthesis, sys.stdin, sys.stdout, args.style_id, args.buffer_size
+                )
+            else:
+                with open(args.input, encoding="utf-8") as input_file:
+                    stream_audio_queries(
+                        speechSynthesis, input_file, sys.stdout, args.style_id, args.buffer_size
+                    )
@@ -0,0 +1,78 @@
+"""
+AccentPhraseExtractorPoolのワーカー数ごとのテキスト解析のスループットを、
+プールを使わない逐次処理と比較する
+
+    python benchmarks/bench_accent_phrase_extractor_pool.py --workers 1 2 4 8 --texts 2000
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bridge_plugin.accent_phrase_extractor import (  # noqa: E402
+    initialize_worker,
+    text_to_accent_phrases,
+)
+from bridge_plugin.synthesis_engine.accent_phrase_extractor_pool import (  # noqa: E402
+    AccentPhraseExtractorPool,
+)
+
+SENTENCES = [
+    "吾輩は猫である。",
+    "名前はまだ無い。",
+    "どこで生れたかとんと見当がつかぬ。",
+    "何でも薄暗いじめじめした所でニャーニャー泣いていた事だけは記憶している。",
+    "今日はいい天気ですね、散歩に行きませんか？",
+]
+
+
+def make_texts(count: int) -> list:
+    # キャッシュなどの影響を避けるため、すべて異なるテキストにする
+    return [f"{SENTENCES[i % len(SENTENCES)]}{i}番目です。" for i in range(count)]
+
+
+def measure_serial(texts: list) -> float:
+    initialize_worker()
+    start = time.perf_counter()
+    for text in texts:
+        text_to_accent_phrases(text)
+    return time.perf_counter() - start
+
+
+def measure_pool(texts: list, num_workers: int, chunk_size: int) -> float:
+    with AccentPhraseExtractorPool(num_workers, chunk_size) as pool:
+        # ワーカーの起動と辞書の読み込みを計測に含めないように、一度ずつ解析させておく
+        for _ in pool.map(make_texts(num_workers * chunk_size)):
+            pass
+        start = time.perf_counter()
+        for _ in pool.map(texts):
+            pass
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1]
+    )
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--chunk_size", type=int, default=16)
+    args = parser.parse_args()
+
+    texts = make_texts(args.texts)
+    print(f"CPU: {os.cpu_count()}, texts: {len(texts)}, chunk_size: {args.chunk_size}")
+    baseline = measure_serial(texts)
+    print(f"serial      : {baseline:7.3f} s ({len(texts) / baseline:8.1f} texts/s)")
+    for num_workers in sorted(set(args.workers)):
+        elapsed = measure_pool(texts, num_workers, args.chunk_size)
+        print(
+            f"{num_workers:2d} workers  : {elapsed:7.3f} s"
+            f" ({len(texts) / elapsed:8.1f} texts/s, x{baseline / elapsed:.2f})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+SynthesisEngineESPNetで使っていた1要素ずつ処理する抑揚の適用と、apply_intonationの速度を比較する
+フレーム数は既定のフレーム周期5msで、1秒から10分の音声に相当する長さを計測する
+
+    python benchmarks/bench_apply_intonation.py --seconds 1 10 60 600 --frame_period 5
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bridge_plugin.synthesis_engine.synthesis_engine_base import (  # noqa: E402
+    apply_intonation,
+)
+
+
+def loop_apply_intonation(f0: np.ndarray, intonation_scale: float, onkou: float):
+    """
+    SynthesisEngineESPNetで使っていた以前の実装
+    """
+    total = 0
+    index = 0
+    for f in f0:
+        if f != 0:
+            total += f
+            index += 1
+
+    ave = total / index
+
+    pos = 0
+    for f in f0:
+        if f != 0:
+            f0[pos] = ave * onkou + (f - ave) * intonation_scale
+        pos += 1
+    return f0
+
+
+def measure(func, f0: np.ndarray, repeat: int) -> float:
+    # f0はその場で書き換えられるので、毎回コピーしてから計測する。最速の回を使う
+    elapsed = []
+    for _ in range(repeat):
+        target = f0.copy()
+        start = time.perf_counter()
+        func(target, 1.2, 1.05)
+        elapsed.append(time.perf_counter() - start)
+    return min(elapsed)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, nargs="+", default=[1, 10, 60, 600])
+    parser.add_argument("--frame_period", type=float, default=5.0)
+    parser.add_argument("--unvoiced_ratio", type=float, default=0.3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"frame period: {args.frame_period} ms")
+    print(" seconds   frames    loop(ms)  vectorized(ms)  speedup")
+    for seconds in args.seconds:
+        frames = int(seconds * 1000 / args.frame_period)
+        # pyworldの出力と同じfloat64で、無声部分は0
+        f0 = rng.uniform(80, 400, frames)
+        f0[rng.random(frames) < args.unvoiced_ratio] = 0
+
+        expected = loop_apply_intonation(f0.copy(), 1.2, 1.05)
+        np.testing.assert_allclose(apply_intonation(f0.copy(), 1.2, 1.05), expected)
+
+        loop = measure(loop_apply_intonation, f0, args.repeat)
+        vectorized = measure(apply_intonation, f0, args.repeat)
+        print(
+            f"{seconds:8.0f} {frames:8d} {loop * 1e3:11.3f} {vectorized * 1e3:15.3f}"
+            f" {loop / vectorized:8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
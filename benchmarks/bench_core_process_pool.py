@@ -0,0 +1,128 @@
+"""
+CoreProcessPoolのワーカー数ごとの波形生成のスループットを、スタブのコアライブラリで計測する
+stub_core/stub_core.cをCコンパイラ(環境変数CC、既定はcc)でビルドして使う
+
+    python benchmarks/bench_core_process_pool.py --workers 1 2 4 --requests 16
+"""
+import argparse
+import contextlib
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bridge_plugin.synthesis_engine.core_process_pool import (  # noqa: E402
+    CoreProcessPool,
+)
+from bridge_plugin.synthesis_engine.core_scheduler import CoreScheduler  # noqa: E402
+from bridge_plugin.synthesis_engine.core_wrapper import (  # noqa: E402
+    CORENAME_DICT,
+    CoreWrapper,
+    OldCoreError,
+)
+
+STUB_SOURCE = Path(__file__).resolve().parent / "stub_core" / "stub_core.c"
+PHONEME_SIZE = 45
+
+
+def build_stub_core(core_dir: Path) -> None:
+    """
+    スタブをcore_dirにコアライブラリとして認識される名前でビルドする
+    """
+    output = core_dir / CORENAME_DICT[platform.system()][0]
+    compiler = os.environ.get("CC", "cc")
+    subprocess.run(
+        [compiler, "-O1", "-shared", "-fPIC", "-o", str(output), str(STUB_SOURCE)],
+        check=True,
+    )
+
+
+def decode_args(length: int) -> dict:
+    return dict(
+        length=length,
+        phoneme_size=PHONEME_SIZE,
+        f0=np.ones((length, 1), dtype=np.float32),
+        phoneme=np.ones((length, PHONEME_SIZE), dtype=np.float32),
+        style_id=np.array([0], dtype=np.int64),
+    )
+
+
+def measure_in_process(core_dir: Path, requests: int, length: int) -> float:
+    """
+    CoreProcessPoolを使わず、1つのCoreWrapperで順番に波形を生成する
+    """
+    core = CoreWrapper(False, core_dir)
+    # CoreWrapper.load_modelは読み込みに成功してもOldCoreErrorを送出する
+    with contextlib.suppress(OldCoreError):
+        core.load_model(0)
+    start = time.perf_counter()
+    for _ in range(requests):
+        core.decode_forward(**decode_args(length))
+    return time.perf_counter() - start
+
+
+def measure_pool(core_dir: Path, num_workers: int, requests: int, length: int):
+    """
+    num_workers個のワーカーにCoreSchedulerでrequests件の波形生成を同時に投入する
+    """
+    with CoreProcessPool(False, core_dir, num_workers) as pool:
+        scheduler = CoreScheduler(pool.sessions)
+        try:
+            with contextlib.suppress(OldCoreError):
+                scheduler.load_model(0)
+            # 共有メモリの確保を計測に含めないように、各ワーカーで一度ずつ実行しておく
+            warmup = [
+                scheduler.submit("decode_forward", **decode_args(length))
+                for _ in range(num_workers)
+            ]
+            for future in warmup:
+                future.result()
+
+            start = time.perf_counter()
+            futures = [
+                scheduler.submit("decode_forward", **decode_args(length))
+                for _ in range(requests)
+            ]
+            for future in futures:
+                future.result()
+            return time.perf_counter() - start
+        finally:
+            scheduler.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--length", type=int, default=500, help="1件あたりのフレーム数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        core_dir = Path(tmp_dir)
+        build_stub_core(core_dir)
+
+        print(
+            f"CPU: {os.cpu_count()}, requests: {args.requests}, length: {args.length}"
+        )
+        baseline = measure_in_process(core_dir, args.requests, args.length)
+        print(
+            f"in-process  : {baseline:7.3f} s"
+            f" ({args.requests / baseline:7.2f} req/s)"
+        )
+        for num_workers in args.workers:
+            elapsed = measure_pool(core_dir, num_workers, args.requests, args.length)
+            print(
+                f"{num_workers:2d} workers  : {elapsed:7.3f} s"
+                f" ({args.requests / elapsed:7.2f} req/s, x{baseline / elapsed:.2f})"
+            )
+
+
+if __name__ == "__main__":
+    main()
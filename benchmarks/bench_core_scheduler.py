@@ -0,0 +1,131 @@
+"""
+CoreSchedulerのキューでの待ち時間とリクエストの所要時間を、セッション数・到着レートごとに計測する
+1件のリクエストは音声合成と同じくyukarin_s・yukarin_sa・decodeを順に呼び出し、
+各推論は一定時間sleepするスタブで、ctypesの呼び出しと同じくGILを手放す
+優先度を使う場合と、全ての推論を到着順に実行する場合(fifo)を比較する
+
+    python benchmarks/bench_core_scheduler.py --sessions 1 2 4 --rates 5 20 40
+"""
+import argparse
+import contextlib
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bridge_plugin.synthesis_engine import core_scheduler  # noqa: E402
+from bridge_plugin.synthesis_engine.core_scheduler import CoreScheduler  # noqa: E402
+
+
+class SleepSession:
+    """
+    推論の種類ごとに一定時間かかるセッションのスタブ
+    """
+
+    def __init__(self, yukarin_time: float, decode_time: float):
+        self.yukarin_time = yukarin_time
+        self.decode_time = decode_time
+
+    def yukarin_s_forward(self, length, **kwargs):
+        time.sleep(self.yukarin_time)
+        return np.full(length, 0.1, dtype=np.float32)
+
+    def yukarin_sa_forward(self, length, **kwargs):
+        time.sleep(self.yukarin_time)
+        return np.full((1, length), 5.5, dtype=np.float32)
+
+    def decode_forward(self, length, **kwargs):
+        time.sleep(self.decode_time)
+        return np.zeros(length * 256, dtype=np.float32)
+
+
+def measure(scheduler: CoreScheduler, rate: float, requests: int, seed: int):
+    """
+    平均rate件/秒のポアソン過程でリクエストを到着させ、
+    yukarin_s・yukarin_saの結果が返るまでの時間と、波形が返るまでの時間を返す
+    """
+    rng = np.random.default_rng(seed)
+    arrivals = np.cumsum(rng.exponential(1 / rate, size=requests))
+    prosody_latencies = []
+    total_latencies = []
+    lock = threading.Lock()
+
+    def run(arrival: float) -> None:
+        scheduler.yukarin_s_forward(length=20)
+        scheduler.yukarin_sa_forward(length=10)
+        prosody = time.perf_counter() - arrival
+        scheduler.decode_forward(length=100)
+        with lock:
+            prosody_latencies.append(prosody)
+            total_latencies.append(time.perf_counter() - arrival)
+
+    with ThreadPoolExecutor(max_workers=requests) as executor:
+        start = time.perf_counter()
+        for offset in arrivals:
+            arrival = start + offset
+            time.sleep(max(0.0, arrival - time.perf_counter()))
+            executor.submit(run, arrival)
+    return prosody_latencies, total_latencies
+
+
+def percentiles(latencies) -> str:
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1e3
+    return f"p50 {p50:7.1f} p95 {p95:7.1f} p99 {p99:7.1f} ms"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--rates", type=float, nargs="+", default=[5, 20, 40])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--yukarin_ms", type=float, default=2.0)
+    parser.add_argument("--decode_ms", type=float, default=40.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(
+        f"requests: {args.requests}, yukarin: {args.yukarin_ms} ms, "
+        f"decode: {args.decode_ms} ms"
+    )
+    fifo = {method: 0 for method in core_scheduler._PRIORITIES}
+    for sessions in args.sessions:
+        for rate in args.rates:
+            for label, priorities in [("priority", None), ("fifo    ", fifo)]:
+                # fifoでは全ての推論を同じ優先度にして、到着順に実行させる
+                patch = (
+                    mock.patch.dict(core_scheduler._PRIORITIES, priorities)
+                    if priorities is not None
+                    else contextlib.nullcontext()
+                )
+                with patch:
+                    scheduler = CoreScheduler(
+                        [
+                            SleepSession(args.yukarin_ms / 1000, args.decode_ms / 1000)
+                            for _ in range(sessions)
+                        ]
+                    )
+                    try:
+                        prosody, total = measure(
+                            scheduler, rate, args.requests, args.seed
+                        )
+                    finally:
+                        scheduler.shutdown()
+                wait = scheduler.stats()["mean_wait"]
+                print(
+                    f"sessions {sessions} rate {rate:5.1f}/s {label}: "
+                    f"prosody {percentiles(prosody)}, "
+                    f"total {percentiles(total)}, "
+                    f"mean queue wait yukarin_s "
+                    f"{wait['yukarin_s_forward'] * 1e3:6.1f} ms "
+                    f"decode {wait['decode_forward'] * 1e3:6.1f} ms"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+数千モーラのアクセント句に対するcreate_kanaの速度を、文字列の連結を繰り返していた以前の実装と比較する
+1つのアクセント句を編集した後に、IncrementalKanaSerializerで読み仮名を作り直す時間も計測する
+
+    python benchmarks/bench_create_kana.py --moras 1000 5000 20000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_kana_parser import make_accent_phrases  # noqa: E402
+
+from bridge_plugin.kana_parser import (  # noqa: E402
+    ACCENT_SYMBOL,
+    NOPAUSE_DELIMITER,
+    PAUSE_DELIMITER,
+    UNVOICE_SYMBOL,
+    WIDE_INTERROGATION_MARK,
+    IncrementalKanaSerializer,
+    create_kana,
+)
+from bridge_plugin.model import AccentPhrase  # noqa: E402
+
+
+def reference_create_kana(accent_phrases: List[AccentPhrase]) -> str:
+    """
+    以前の実装と同じく、1文字ずつ文字列を連結する
+    """
+    text = ""
+    for i, phrase in enumerate(accent_phrases):
+        for j, mora in enumerate(phrase.moras):
+            if mora.vowel in ["A", "I", "U", "E", "O"]:
+                text += UNVOICE_SYMBOL
+
+            text += mora.text
+            if j + 1 == phrase.accent:
+                text += ACCENT_SYMBOL
+
+        if phrase.is_interrogative:
+            text += WIDE_INTERROGATION_MARK
+
+        if i < len(accent_phrases) - 1:
+            if phrase.pause_mora is None:
+                text += NOPAUSE_DELIMITER
+            else:
+                text += PAUSE_DELIMITER
+    return text
+
+
+def measure(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--moras", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print("moras  reference(ms)  create_kana(ms)  speedup  incremental replace(ms)")
+    for num_moras in args.moras:
+        accent_phrases = make_accent_phrases(num_moras)
+        assert create_kana(accent_phrases) == reference_create_kana(accent_phrases)
+
+        reference = measure(lambda: reference_create_kana(accent_phrases), args.repeat)
+        current = measure(lambda: create_kana(accent_phrases), args.repeat)
+
+        # 中央のアクセント句を編集した場合
+        serializer = IncrementalKanaSerializer(accent_phrases)
+        index = len(accent_phrases) // 2
+        edited = accent_phrases[index].copy(update={"accent": 1})
+        incremental = measure(lambda: serializer.replace(index, edited), args.repeat)
+        print(
+            f"{num_moras:5d}  {reference * 1e3:13.3f}  {current * 1e3:15.3f}"
+            f"  x{reference / current:6.2f}  {incremental * 1e3:23.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
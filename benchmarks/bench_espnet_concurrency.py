@@ -0,0 +1,231 @@
+"""
+SynthesisEngineESPNetに複数のスレッドから同時に合成を依頼したときのスループットと1件ごとの合成時間を、
+スタイルのmax_concurrency(同時推論数の上限)ごとに比較する
+1つのモデルを全リクエストで共有し、max_concurrencyの値ごとにエンジンを作り直して計測する
+設定を指定しない場合は、既定のパラメータでランダムに初期化したVITSを一時ディレクトリに作る
+
+    python benchmarks/bench_espnet_concurrency.py --threads 1 2 4 8 --max_concurrency 0 1 2 4
+    python benchmarks/bench_espnet_concurrency.py \\
+        --train_config exp/tts/config.yaml --model_file exp/tts/model.pth
+"""
+import argparse
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import torch
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bridge_plugin.bridge_config import BridgeConfigLoader  # noqa: E402
+from bridge_plugin.model import AccentPhrase, AudioQuery, Mora  # noqa: E402
+from bridge_plugin.synthesis_engine.synthesis_engine_espnet import (  # noqa: E402
+    SynthesisEngineESPNet,
+)
+
+_TOKEN_LIST = [
+    "<blank>",
+    "<unk>",
+    "a",
+    "i",
+    "u",
+    "e",
+    "o",
+    "k",
+    "s",
+    "t",
+    "pau",
+    "<sos/eos>",
+]
+
+
+def write_model(model_dir: Path) -> None:
+    """
+    既定のパラメータでランダムに初期化したVITSを保存する
+    """
+    from espnet2.bin.tts_inference import Text2Speech
+
+    train_config = {
+        "token_list": _TOKEN_LIST,
+        "odim": None,
+        "feats_extract": "linear_spectrogram",
+        "feats_extract_conf": {"n_fft": 1024, "hop_length": 256},
+        "normalize": None,
+        "tts": "vits",
+        "tts_conf": {"sampling_rate": 22050},
+        "model_conf": {},
+        "use_preprocessor": False,
+        "token_type": "phn",
+        "bpemodel": None,
+        "non_linguistic_symbols": None,
+        "cleaner": None,
+        "g2p": None,
+    }
+    (model_dir / "config.yaml").write_text(yaml.safe_dump(train_config))
+    torch.manual_seed(0)
+    text2speech = Text2Speech(train_config=model_dir / "config.yaml")
+    torch.save(text2speech.model.state_dict(), model_dir / "model.pth")
+
+
+def write_bridge_config(
+    config_dir: Path,
+    train_config: Path,
+    model_file: Optional[Path],
+    max_concurrency: Optional[int],
+) -> None:
+    """
+    1つのモデルを使うスタイルを1つだけ持つ設定を書き出す
+    """
+    style = {
+        "name": "style",
+        "id": 0,
+        "g2p": "pyopenjtalk_accent_with_pause",
+        "tts_inference_init_args": {"train_config": str(train_config)},
+        "token_id_converter_init_args": {"token_list": _TOKEN_LIST},
+    }
+    if model_file is not None:
+        style["tts_inference_init_args"]["model_file"] = str(model_file)
+    if max_concurrency is not None:
+        style["max_concurrency"] = max_concurrency
+    bridge_config = {
+        "speakers": [
+            {
+                "name": "speaker",
+                "speaker_uuid": "00000000-0000-0000-0000-000000000000",
+                "version": "0.0.1",
+                "styles": [style],
+            }
+        ]
+    }
+    (config_dir / "bridge_config.yaml").write_text(yaml.safe_dump(bridge_config))
+
+
+def make_mora(text: str, consonant: Optional[str], vowel: str) -> Mora:
+    return Mora(
+        text=text,
+        consonant=consonant,
+        consonant_length=0 if consonant is not None else None,
+        vowel=vowel,
+        vowel_length=0,
+        pitch=0,
+    )
+
+
+def make_query(n_phrases: int) -> AudioQuery:
+    """
+    2つ目ごとのアクセント句の後にポーズを入れたクエリを作る
+    """
+    moras = [
+        make_mora("カ", "k", "a"),
+        make_mora("イ", None, "i"),
+        make_mora("ス", "s", "u"),
+        make_mora("ト", "t", "o"),
+    ]
+    pause = make_mora("、", None, "pau")
+    accent_phrases = [
+        AccentPhrase(
+            moras=moras[: 2 + i % 3],
+            accent=1 + i % 2,
+            pause_mora=pause if i % 2 == 1 and i != n_phrases - 1 else None,
+        )
+        for i in range(n_phrases)
+    ]
+    return AudioQuery(
+        accent_phrases=accent_phrases,
+        speedScale=1,
+        pitchScale=0,
+        intonationScale=1,
+        volumeScale=1,
+        prePhonemeLength=0.1,
+        postPhonemeLength=0.1,
+        outputSamplingRate=22050,
+        outputStereo=False,
+    )
+
+
+def measure(
+    engine: SynthesisEngineESPNet, query: AudioQuery, threads: int, requests: int
+):
+    """
+    threads個のスレッドからrequests件の合成を同時に依頼し、
+    全体の経過時間と1件ごとの合成時間(他のスレッドとの競合を含む)を返す
+    """
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def run() -> None:
+        start = time.perf_counter()
+        engine.synthesis(query, 0)
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        start = time.perf_counter()
+        for future in [executor.submit(run) for _ in range(requests)]:
+            future.result()
+    return time.perf_counter() - start, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--train_config", type=Path, default=None)
+    parser.add_argument("--model_file", type=Path, default=None)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument(
+        "--max_concurrency",
+        type=int,
+        nargs="+",
+        default=[0, 1, 2, 4],
+        help="計測するmax_concurrencyの値。0は上限なし",
+    )
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--phrases", type=int, default=8)
+    parser.add_argument("--torch_threads", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.torch_threads is not None:
+        torch.set_num_threads(args.torch_threads)
+    query = make_query(args.phrases)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        train_config, model_file = args.train_config, args.model_file
+        if train_config is None:
+            write_model(tmp_dir)
+            train_config, model_file = tmp_dir / "config.yaml", tmp_dir / "model.pth"
+
+        print(
+            f"requests: {args.requests}, phrases: {args.phrases}, "
+            f"torch threads: {torch.get_num_threads()}"
+        )
+        for max_concurrency in args.max_concurrency:
+            write_bridge_config(
+                tmp_dir,
+                train_config.resolve(),
+                model_file.resolve() if model_file is not None else None,
+                max_concurrency or None,
+            )
+            engine = SynthesisEngineESPNet(
+                BridgeConfigLoader(tmp_dir), use_gpu=False, load_all_models=True
+            )
+            # 初回の推論は遅いので、計測前に1回実行しておく
+            engine.synthesis(query, 0)
+            label = max_concurrency or "none"
+            for threads in args.threads:
+                elapsed, latencies = measure(engine, query, threads, args.requests)
+                p50, p95 = np.percentile(latencies, [50, 95]) * 1e3
+                print(
+                    f"max_concurrency {label!s:>4}, threads {threads:2d}: "
+                    f"{args.requests / elapsed:7.2f} req/s, "
+                    f"latency p50 {p50:8.1f} ms, p95 {p95:8.1f} ms"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+フルコンテキストラベルの解析速度を、以前の正規表現による解析と比較する
+
+    python benchmarks/bench_full_context_label.py --repeat 20
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pyopenjtalk  # noqa: E402
+
+from bridge_plugin.full_context_label import (  # noqa: E402
+    _LABEL_FIELDS,
+    Phoneme,
+    extract_full_context_label,
+)
+
+DEFAULT_TEXT = (
+    "吾輩は猫である。名前はまだ無い。どこで生れたかとんと見当がつかぬ。" "何でも薄暗いじめじめした所でニャーニャー泣いていた事だけは記憶している。"
+)
+
+
+def reference_pattern() -> "re.Pattern[str]":
+    """
+    以前の実装と同じ、各contextを最短一致で取り出す正規表現
+    """
+    pattern = "^"
+    for name, delimiter in _LABEL_FIELDS:
+        pattern += f"(?P<{name}>.+?)"
+        pattern += re.escape(delimiter) if delimiter is not None else "$"
+    return re.compile(pattern)
+
+
+def measure(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--text", default=DEFAULT_TEXT)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    labels = pyopenjtalk.extract_fullcontext(args.text)
+    pattern = reference_pattern()
+
+    regex_time = measure(
+        lambda: [pattern.search(label).groupdict() for label in labels], args.repeat
+    )
+    phoneme_time = measure(
+        lambda: [Phoneme.from_label(label) for label in labels], args.repeat
+    )
+    utterance_time = measure(lambda: extract_full_context_label(args.text), args.repeat)
+    print(f"labels: {len(labels)}")
+    print(f"regex groupdict       : {regex_time * 1e3:8.3f} ms")
+    print(f"Phoneme.from_label    : {phoneme_time * 1e3:8.3f} ms")
+    print(f"extract_full_context_label (OpenJTalkを含む): {utterance_time * 1e3:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
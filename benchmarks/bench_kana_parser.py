@@ -0,0 +1,149 @@
+"""
+読み仮名の往復変換(parse_kana(create_kana(...)))の速度を、
+検証・deep copyでMoraを作成していた以前のparse_kanaと比較する
+
+    python benchmarks/bench_kana_parser.py --moras 5000 --repeat 20
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bridge_plugin.kana_parser import (  # noqa: E402
+    ACCENT_SYMBOL,
+    NOPAUSE_DELIMITER,
+    PAUSE_DELIMITER,
+    WIDE_INTERROGATION_MARK,
+    _TRIE_TERMINAL,
+    create_kana,
+    mora_trie,
+    parse_kana,
+    text2mora_with_unvoice,
+)
+from bridge_plugin.model import AccentPhrase, Mora  # noqa: E402
+
+
+def reference_text_to_accent_phrase(phrase: str) -> AccentPhrase:
+    """
+    以前の実装と同じく、テンプレートのMoraをdeep copyし、AccentPhraseを検証して作成する
+    エラーの検出は省略している
+    """
+    accent_index = None
+    moras: List[Mora] = []
+    base_index = 0
+    while base_index < len(phrase):
+        if phrase[base_index] == ACCENT_SYMBOL:
+            accent_index = len(moras)
+            base_index += 1
+            continue
+        node = mora_trie
+        matched = None
+        for watch_index in range(base_index, len(phrase)):
+            node = node.get(phrase[watch_index])
+            if node is None:
+                break
+            matched = node.get(_TRIE_TERMINAL, matched)
+        matched_text, _ = matched
+        moras.append(text2mora_with_unvoice[matched_text].copy(deep=True))
+        base_index += len(matched_text)
+    return AccentPhrase(moras=moras, accent=accent_index, pause_mora=None)
+
+
+def reference_parse_kana(text: str) -> List[AccentPhrase]:
+    parsed_results: List[AccentPhrase] = []
+    phrase_base = 0
+    for i in range(len(text) + 1):
+        if i == len(text) or text[i] in [PAUSE_DELIMITER, NOPAUSE_DELIMITER]:
+            phrase = text[phrase_base:i]
+            phrase_base = i + 1
+            is_interrogative = WIDE_INTERROGATION_MARK in phrase
+            phrase = phrase.replace(WIDE_INTERROGATION_MARK, "")
+            accent_phrase = reference_text_to_accent_phrase(phrase)
+            if i < len(text) and text[i] == PAUSE_DELIMITER:
+                accent_phrase.pause_mora = Mora(
+                    text="、",
+                    consonant=None,
+                    consonant_length=None,
+                    vowel="pau",
+                    vowel_length=0,
+                    pitch=0,
+                )
+            accent_phrase.is_interrogative = is_interrogative
+            parsed_results.append(accent_phrase)
+    return parsed_results
+
+
+def make_accent_phrases(num_moras: int, seed: int = 0) -> List[AccentPhrase]:
+    """
+    ランダムな仮名からなる、合計num_morasモーラのアクセント句を作る
+    """
+    rng = random.Random(seed)
+    kanas = list(text2mora_with_unvoice)
+    accent_phrases = []
+    total = 0
+    while total < num_moras:
+        n = min(rng.randint(1, 8), num_moras - total)
+        accent_phrases.append(
+            AccentPhrase(
+                moras=[
+                    text2mora_with_unvoice[kana] for kana in rng.choices(kanas, k=n)
+                ],
+                accent=rng.randint(1, n),
+                pause_mora=(
+                    Mora(
+                        text="、",
+                        consonant=None,
+                        consonant_length=None,
+                        vowel="pau",
+                        vowel_length=0,
+                        pitch=0,
+                    )
+                    if rng.random() < 0.2
+                    else None
+                ),
+                is_interrogative=rng.random() < 0.05,
+            )
+        )
+        total += n
+    return accent_phrases
+
+
+def measure(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--moras", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print("moras  reference(ms)  parse_kana(ms)  speedup")
+    for num_moras in args.moras:
+        accent_phrases = make_accent_phrases(num_moras)
+        kana = create_kana(accent_phrases)
+        # 以前の実装と同じ結果になることを確かめてから計測する
+        assert [ap.dict() for ap in parse_kana(kana)] == [
+            ap.dict() for ap in reference_parse_kana(kana)
+        ]
+        assert create_kana(parse_kana(kana)) == kana
+
+        reference = measure(
+            lambda: reference_parse_kana(create_kana(accent_phrases)), args.repeat
+        )
+        current = measure(lambda: parse_kana(create_kana(accent_phrases)), args.repeat)
+        print(
+            f"{num_moras:5d}  {reference * 1e3:13.2f}  {current * 1e3:14.2f}"
+            f"  x{reference / current:6.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
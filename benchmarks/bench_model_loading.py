@@ -0,0 +1,213 @@
+"""
+起動時に全てのモデルを読み込む場合(--load_all_models)と、使うときに読み込む場合の
+起動時間・RSS・全スタイルを使い始めるまでの時間を比較する
+同じモデルを使うスタイルでText2Speechを共有する場合と、スタイルごとに別々に読み込む場合
+(共有の導入前と同じ)の両方を計測する。後者のRSSはスタイル数に比例して増えるので、
+メモリの少ない環境では--stylesを減らす
+計測ごとに子プロセスを起動するので、RSSは他の計測の影響を受けない
+設定を指定しない場合は、既定のパラメータでランダムに初期化したVITSを--models個作り、
+--styles個のスタイルに順番に割り当てた設定を一時ディレクトリに作る
+
+    python benchmarks/bench_model_loading.py --styles 8 --models 2
+    python benchmarks/bench_model_loading.py --bridge_config_dir .
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from itertools import count
+from pathlib import Path
+from unittest import mock
+
+import torch
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bridge_plugin.bridge_config import BridgeConfigLoader  # noqa: E402
+from bridge_plugin.synthesis_engine import synthesis_engine_espnet  # noqa: E402
+from bridge_plugin.synthesis_engine.synthesis_engine_espnet import (  # noqa: E402
+    SynthesisEngineESPNet,
+)
+
+_TOKEN_LIST = ["<blank>", "<unk>", "a", "i", "u", "k", "s", "pau", "<sos/eos>"]
+
+
+def rss_mb() -> float:
+    """
+    現在のRSS(MB)を返す
+    """
+    for line in Path("/proc/self/status").read_text().splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) / 1024
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_bridge_config(config_dir: Path, styles: int, models: int) -> None:
+    """
+    ランダムに初期化したVITSをmodels個保存し、styles個のスタイルに順番に割り当てた設定を書き出す
+    """
+    from espnet2.bin.tts_inference import Text2Speech
+
+    train_config = {
+        "token_list": _TOKEN_LIST,
+        "odim": None,
+        "feats_extract": "linear_spectrogram",
+        "feats_extract_conf": {"n_fft": 1024, "hop_length": 256},
+        "normalize": None,
+        "tts": "vits",
+        "tts_conf": {"sampling_rate": 22050},
+        "model_conf": {},
+        "use_preprocessor": False,
+        "token_type": "phn",
+        "bpemodel": None,
+        "non_linguistic_symbols": None,
+        "cleaner": None,
+        "g2p": None,
+    }
+    for i in range(models):
+        model_dir = config_dir / f"model{i}"
+        model_dir.mkdir()
+        (model_dir / "config.yaml").write_text(yaml.safe_dump(train_config))
+        text2speech = Text2Speech(train_config=model_dir / "config.yaml")
+        torch.save(text2speech.model.state_dict(), model_dir / "model.pth")
+
+    bridge_config = {
+        "speakers": [
+            {
+                "name": "speaker",
+                "speaker_uuid": "00000000-0000-0000-0000-000000000000",
+                "version": "0.0.1",
+                "styles": [
+                    {
+                        "name": f"style{i}",
+                        "id": i,
+                        "g2p": "pyopenjtalk_accent_with_pause",
+                        "tts_inference_init_args": {
+                            "train_config": f"model{i % models}/config.yaml",
+                            "model_file": f"model{i % models}/model.pth",
+                        },
+                        "token_id_converter_init_args": {"token_list": _TOKEN_LIST},
+                    }
+                    for i in range(styles)
+                ],
+            }
+        ]
+    }
+    (config_dir / "bridge_config.yaml").write_text(yaml.safe_dump(bridge_config))
+
+
+def measure(
+    config_dir: Path, load_all_models: bool, max_loaded_models, share: bool = True
+) -> dict:
+    """
+    エンジンを構築し、起動時間・起動直後のRSS・全スタイルを使い始めるまでの時間を返す
+    shareがFalseの場合はスタイルごとに異なるキーを割り当て、Text2Speechを共有させない
+    """
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    if share:
+        engine = SynthesisEngineESPNet(
+            BridgeConfigLoader(config_dir),
+            use_gpu=False,
+            load_all_models=load_all_models,
+            max_loaded_models=max_loaded_models,
+        )
+    else:
+        # キーはスタイルの設定を読み込むときに1回ずつ作られるので、連番なら重複しない
+        keys = count()
+        with mock.patch.object(
+            synthesis_engine_espnet,
+            "text2speech_key",
+            lambda init_args: ("unshared", next(keys)),
+        ):
+            engine = SynthesisEngineESPNet(
+                BridgeConfigLoader(config_dir),
+                use_gpu=False,
+                load_all_models=load_all_models,
+                max_loaded_models=max_loaded_models,
+            )
+    startup = time.perf_counter() - start
+    rss_startup = rss_mb()
+    loads_startup = engine.model_stats()["loads"]
+
+    start = time.perf_counter()
+    for style_id in sorted(engine._config.styles):
+        engine.initialize_style_id_synthesis(style_id, skip_reinit=True)
+    first_use = time.perf_counter() - start
+    return {
+        "startup": startup,
+        "rss_before": rss_before,
+        "rss_startup": rss_startup,
+        "rss_all_styles": rss_mb(),
+        "loads_startup": loads_startup,
+        "first_use": first_use,
+        "styles": len(engine._config.styles),
+        "loads": engine.model_stats()["loads"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bridge_config_dir", type=Path, default=None)
+    parser.add_argument("--styles", type=int, default=8)
+    parser.add_argument("--models", type=int, default=2)
+    parser.add_argument("--max_loaded_models", type=int, default=None)
+    parser.add_argument("--child", choices=["eager", "lazy"], help=argparse.SUPPRESS)
+    parser.add_argument("--no_share", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        result = measure(
+            args.bridge_config_dir.resolve(),
+            args.child == "eager",
+            args.max_loaded_models,
+            share=not args.no_share,
+        )
+        print(json.dumps(result))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config_dir = args.bridge_config_dir
+        if config_dir is None:
+            config_dir = Path(tmp_dir)
+            write_bridge_config(config_dir, args.styles, args.models)
+        for mode, share in [
+            ("lazy", True),
+            ("eager", True),
+            ("lazy", False),
+            ("eager", False),
+        ]:
+            command = [
+                sys.executable,
+                __file__,
+                "--child",
+                mode,
+                "--bridge_config_dir",
+                str(config_dir),
+            ]
+            if args.max_loaded_models is not None:
+                command += ["--max_loaded_models", str(args.max_loaded_models)]
+            if not share:
+                command.append("--no_share")
+            output = subprocess.run(
+                command, check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.splitlines()[-1])
+            label = f"{mode}, {'shared' if share else 'per style'}"
+            print(
+                f"{label:16s}: startup {result['startup'] * 1e3:8.1f} ms "
+                f"(loads {result['loads_startup']}), "
+                f"RSS {result['rss_before']:7.1f} -> {result['rss_startup']:7.1f} MB, "
+                f"all {result['styles']} styles ready after "
+                f"{result['first_use'] * 1e3:8.1f} ms more "
+                f"(RSS {result['rss_all_styles']:7.1f} MB, loads {result['loads']})"
+            )
+
+
+if __name__ == "__main__":
+    main()
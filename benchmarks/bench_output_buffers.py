@@ -0,0 +1,202 @@
+"""
+デコード結果をOutputBufferPoolのバッファに書き込んでから出力を作る現在の実装と、
+デコードのたびに配列を確保する以前の実装の、1回の音声合成あたりのピークメモリと所要時間を比較する
+デコードはnumpyで波形を作るスタブで、ピークメモリはtracemalloc(numpyの確保も記録される)で計測する
+所要時間はtracemallocを有効にした状態のもので、実装間の比較にのみ使う
+RSSの最大値が他の計測の影響を受けないように、実装ごとに子プロセスで計測する
+
+    python benchmarks/bench_output_buffers.py --seconds 10 --repeat 20
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bridge_plugin.model import AccentPhrase, AudioQuery, Mora  # noqa: E402
+from bridge_plugin.synthesis_engine.core_wrapper import OutputBufferPool  # noqa: E402
+from bridge_plugin.synthesis_engine.synthesis_engine import (  # noqa: E402
+    SynthesisEngine,
+)
+from bridge_plugin.utility.resample_utility import resample_wave  # noqa: E402
+
+SETTINGS = [(24000, False), (24000, True), (48000, True), (44100, False)]
+
+
+class NumpyCore:
+    """
+    各フレームを256サンプルの正弦波にするデコードのスタブ。outが渡されればそこに書き込む
+    """
+
+    def __init__(self):
+        self.output_buffers = OutputBufferPool()
+
+    def metas(self):
+        return "[]"
+
+    def supported_devices(self):
+        return "{}"
+
+    def is_model_loaded(self, style_id):
+        return True
+
+    def load_model(self, style_id):
+        pass
+
+    def yukarin_s_forward(self, length, phoneme_list, style_id):
+        return np.full(length, 0.1, dtype=np.float32)
+
+    def yukarin_sa_forward(self, length, vowel_phoneme_list, style_id, **kwargs):
+        return np.full((len(style_id), length), 5.5, dtype=np.float32)
+
+    def decode_forward(self, length, phoneme_size, f0, phoneme, style_id, out=None):
+        if out is None:
+            out = np.empty(length * 256, dtype=np.float32)
+        frames = out.reshape(length, 256)
+        np.sin(np.arange(256, dtype=np.float32) * 0.05, out=frames[0])
+        frames[1:] = frames[0]
+        frames *= f0
+        return out
+
+
+def make_query(seconds: float, sampling_rate: int, stereo: bool) -> AudioQuery:
+    """
+    1モーラ0.15秒で、およそseconds秒になるクエリを作る
+    """
+    moras = [
+        Mora(
+            text="カ",
+            consonant="k",
+            consonant_length=0.05,
+            vowel="a",
+            vowel_length=0.1,
+            pitch=5.5,
+        )
+        for _ in range(max(1, int(seconds / 0.15)))
+    ]
+    return AudioQuery(
+        accent_phrases=[AccentPhrase(moras=moras, accent=1)],
+        speedScale=1,
+        pitchScale=0,
+        intonationScale=1,
+        volumeScale=0.5,
+        prePhonemeLength=0.1,
+        postPhonemeLength=0.1,
+        outputSamplingRate=sampling_rate,
+        outputStereo=stereo,
+        kana="",
+    )
+
+
+def reference_synthesis(engine: SynthesisEngine, query: AudioQuery) -> np.ndarray:
+    """
+    以前の実装: デコードのたびに配列を確保し、ゲインをその場で掛け、
+    リサンプリング後にnumpy.repeatでステレオにする
+    """
+    phoneme, f0 = engine._frame_scale_features(query, 0)
+    wave = engine.scheduler.decode_forward(
+        length=phoneme.shape[0],
+        phoneme_size=phoneme.shape[1],
+        f0=f0[:, np.newaxis],
+        phoneme=phoneme,
+        style_id=np.array([0], dtype=np.int64),
+    )
+    if query.volumeScale != 1:
+        wave *= query.volumeScale
+    wave = resample_wave(wave, engine.default_sampling_rate, query.outputSamplingRate)
+    if query.outputStereo:
+        wave = np.repeat(wave[:, np.newaxis], 2, axis=1)
+    return wave
+
+
+def measure(mode: str, seconds: float, repeat: int) -> dict:
+    core = NumpyCore()
+    engine = SynthesisEngine(core)
+    # クエリの前処理は両方で同じなので、_synthesis_implを直接呼んで比較する
+    synthesis = (
+        engine._synthesis_impl
+        if mode == "pooled"
+        else lambda query, style_id: reference_synthesis(engine, query)
+    )
+    results = {}
+    try:
+        for sampling_rate, stereo in SETTINGS:
+            query = make_query(seconds, sampling_rate, stereo)
+            # 最初の呼び出しではフィルタの計算などが行われるので、計測に含めない
+            synthesis(query, 0)
+            peaks = []
+            elapsed = []
+            for _ in range(repeat):
+                tracemalloc.start()
+                start = time.perf_counter()
+                wave = synthesis(query, 0)
+                elapsed.append(time.perf_counter() - start)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                peaks.append(peak)
+                del wave
+            results[f"{sampling_rate}{' stereo' if stereo else ''}"] = {
+                "peak": float(np.mean(peaks)),
+                "time": float(np.median(elapsed)),
+            }
+    finally:
+        engine.scheduler.shutdown()
+    return {
+        "settings": results,
+        "pool": core.output_buffers.stats(),
+        "maxrss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument(
+        "--child", choices=["pooled", "reference"], help=argparse.SUPPRESS
+    )
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(measure(args.child, args.seconds, args.repeat)))
+        return
+
+    print(f"about {args.seconds} s of audio, {args.repeat} repeats")
+    for mode in ["reference", "pooled"]:
+        output = subprocess.run(
+            [
+                sys.executable,
+                __file__,
+                "--child",
+                mode,
+                "--seconds",
+                str(args.seconds),
+                "--repeat",
+                str(args.repeat),
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        result = json.loads(output.splitlines()[-1])
+        for setting, values in result["settings"].items():
+            print(
+                f"{mode:9s} {setting:12s}: peak {values['peak'] / 2**20:7.2f} MiB, "
+                f"time {values['time'] * 1e3:7.2f} ms"
+            )
+        pool = result["pool"]
+        print(
+            f"{mode:9s} pool allocations {pool['allocations']}, reuses "
+            f"{pool['reuses']}, max RSS {result['maxrss_mb']:.1f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
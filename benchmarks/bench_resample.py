@@ -0,0 +1,78 @@
+"""
+以前のFFTによるリサンプリング(scipy.signal.resample)と、resample_waveのポリフェーズリサンプリングの速度を比較する
+FFTの速さは長さの素因数分解に依存するため、素数や奇数の長さも含めて計測する
+
+    python benchmarks/bench_resample.py --lengths 100000 100003 1000003 --dst_rate 44100
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy.signal import resample
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bridge_plugin.utility import StreamingResampler, resample_wave  # noqa: E402
+from bridge_plugin.utility.resample_utility import resampled_length  # noqa: E402
+
+
+def measure(func, repeat: int) -> float:
+    # 最速の回を使う。初回はフィルタの設計(キャッシュされる)を含むため除く
+    func()
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed.append(time.perf_counter() - start)
+    return min(elapsed)
+
+
+def streaming(wave: np.ndarray, src_rate: int, dst_rate: int, chunk_size: int):
+    resampler = StreamingResampler(src_rate, dst_rate)
+    chunks = [
+        resampler.process(wave[i : i + chunk_size])
+        for i in range(0, len(wave), chunk_size)
+    ]
+    chunks.append(resampler.flush())
+    return np.concatenate(chunks)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--lengths",
+        type=int,
+        nargs="+",
+        # 素因数の小さい長さ(65536, 100000, 1000000)と、素数(100003, 1000003)や大きな素因数を持つ奇数(1000001)
+        default=[65536, 100000, 100003, 1000000, 1000001, 1000003],
+    )
+    parser.add_argument("--src_rate", type=int, default=24000)
+    parser.add_argument("--dst_rate", type=int, default=44100)
+    parser.add_argument("--chunk_size", type=int, default=4800)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{args.src_rate} Hz -> {args.dst_rate} Hz")
+    print("   length    FFT(ms)  polyphase(ms)  streaming(ms)  speedup")
+    for length in args.lengths:
+        wave = rng.normal(0, 0.1, length)
+        n_out = resampled_length(length, args.src_rate, args.dst_rate)
+        fft = measure(lambda: resample(wave, n_out), args.repeat)
+        poly = measure(
+            lambda: resample_wave(wave, args.src_rate, args.dst_rate), args.repeat
+        )
+        stream = measure(
+            lambda: streaming(wave, args.src_rate, args.dst_rate, args.chunk_size),
+            args.repeat,
+        )
+        print(
+            f"{length:9d}  {fft * 1e3:9.1f}  {poly * 1e3:13.1f}"
+            f"  {stream * 1e3:13.1f}  x{fft / poly:6.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+SpeechSynthesisを呼び出しごとに構築する場合(以前のaudioQueryGenerator)と、
+一度構築したものを使い回す場合のaudio_queryの所要時間を比較する
+
+    python benchmarks/bench_speech_synthesis.py --cold 3 --warm 50 -- --bridge_config_dir .
+
+`--`以降の引数はそのままSpeechSynthesisに渡す
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from audioQueryGenerator import SpeechSynthesis  # noqa: E402
+
+DEFAULT_TEXT = "日本語は美しい言語です。"
+
+
+def measure_cold(text: str, style_id: int, repeat: int, engine_args) -> list:
+    """
+    1件ごとにSpeechSynthesisを構築してからクエリを作成する
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with SpeechSynthesis(engine_args) as speech_synthesis:
+            speech_synthesis.audio_query(text, style_id=style_id)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def measure_warm(text: str, style_id: int, repeat: int, engine_args):
+    """
+    SpeechSynthesisを1回だけ構築し、以降のクエリ作成ではそれを使い回す
+    構築にかかった時間と、各クエリの所要時間を返す
+    """
+    start = time.perf_counter()
+    with SpeechSynthesis(engine_args) as speech_synthesis:
+        startup = time.perf_counter() - start
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            speech_synthesis.audio_query(text, style_id=style_id)
+            timings.append(time.perf_counter() - start)
+    return startup, timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--text", default=DEFAULT_TEXT)
+    parser.add_argument("--style_id", type=int, default=1)
+    parser.add_argument("--cold", type=int, default=3)
+    parser.add_argument("--warm", type=int, default=50)
+    parser.add_argument("engine_args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    engine_args = [arg for arg in args.engine_args if arg != "--"]
+
+    cold = measure_cold(args.text, args.style_id, args.cold, engine_args)
+    startup, warm = measure_warm(args.text, args.style_id, args.warm, engine_args)
+    # 最初のクエリではOpenJTalkの辞書の読み込みなどが行われるため、中央値も表示する
+    print(
+        f"cold (構築+クエリ)  : mean {statistics.mean(cold) * 1e3:9.1f} ms  "
+        f"median {statistics.median(cold) * 1e3:9.1f} ms"
+    )
+    print(f"warm 構築          : {startup * 1e3:9.1f} ms")
+    print(
+        f"warm クエリ        : mean {statistics.mean(warm) * 1e3:9.1f} ms  "
+        f"median {statistics.median(warm) * 1e3:9.1f} ms  "
+        f"first {warm[0] * 1e3:9.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
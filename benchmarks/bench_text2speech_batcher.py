@@ -0,0 +1,157 @@
+"""
+Text2SpeechBatcherでまとめて推論した場合と1件ずつ推論した場合の
+スループットと待ち時間(p50/p95/p99)を、リクエストの到着レートごとに比較する
+到着はポアソン過程とし、待ち時間は到着から波形が返るまでの時間とする
+モデルを指定しない場合は、既定のパラメータで初期化したVITSを使う
+
+    python benchmarks/bench_text2speech_batcher.py --rates 2 8 32 --requests 64
+    python benchmarks/bench_text2speech_batcher.py \\
+        --train_config exp/tts/config.yaml --model_file exp/tts/model.pth
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import torch
+import yaml
+from espnet2.bin.tts_inference import Text2Speech
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bridge_plugin.synthesis_engine.text2speech_batcher import (  # noqa: E402
+    Text2SpeechBatcher,
+    text2speech_batch,
+)
+
+_TOKEN_LIST = ["<blank>", "<unk>", "a", "i", "u", "k", "s", "pau", "<sos/eos>"]
+
+
+def build_text2speech(train_config, model_file) -> Text2Speech:
+    """
+    学習済みモデルが指定されていなければ、既定のパラメータのVITSをランダムに初期化して返す
+    """
+    if train_config is not None:
+        return Text2Speech(
+            train_config=train_config, model_file=model_file, device="cpu"
+        )
+    config = {
+        "token_list": _TOKEN_LIST,
+        "odim": None,
+        "feats_extract": "linear_spectrogram",
+        "feats_extract_conf": {"n_fft": 1024, "hop_length": 256},
+        "normalize": None,
+        "tts": "vits",
+        "tts_conf": {"sampling_rate": 22050},
+        "model_conf": {},
+        "use_preprocessor": False,
+        "token_type": "phn",
+        "bpemodel": None,
+        "non_linguistic_symbols": None,
+        "cleaner": None,
+        "g2p": None,
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config_path = Path(tmp_dir) / "config.yaml"
+        config_path.write_text(yaml.safe_dump(config))
+        torch.manual_seed(0)
+        return Text2Speech(train_config=config_path, device="cpu")
+
+
+def make_ids_list(text2speech: Text2Speech, count: int, seed: int):
+    """
+    長さ10から60のランダムなトークンID列を作る(<blank>, <unk>, <sos/eos>は使わない)
+    """
+    rng = np.random.default_rng(seed)
+    vocab = len(text2speech.train_args.token_list)
+    return [
+        rng.integers(2, vocab - 1, size=int(rng.integers(10, 61))) for _ in range(count)
+    ]
+
+
+def measure(infer, ids_list, rate: float, seed: int):
+    """
+    平均rate件/秒のポアソン過程でids_listを順に到着させ、
+    全体の経過時間と1件ごとの待ち時間を返す
+    """
+    rng = np.random.default_rng(seed)
+    arrivals = np.cumsum(rng.exponential(1 / rate, size=len(ids_list)))
+    latencies = []
+    lock = threading.Lock()
+
+    def run(ids, arrival: float) -> None:
+        infer(ids)
+        with lock:
+            latencies.append(time.perf_counter() - arrival)
+
+    with ThreadPoolExecutor(max_workers=len(ids_list)) as executor:
+        start = time.perf_counter()
+        for ids, offset in zip(ids_list, arrivals):
+            arrival = start + offset
+            time.sleep(max(0.0, arrival - time.perf_counter()))
+            executor.submit(run, ids, arrival)
+    return time.perf_counter() - start, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--train_config", type=Path, default=None)
+    parser.add_argument("--model_file", type=Path, default=None)
+    parser.add_argument("--rates", type=float, nargs="+", default=[2, 8, 32])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--batch_window_ms", type=float, default=20.0)
+    parser.add_argument("--max_batch_size", type=int, default=8)
+    parser.add_argument("--noise_scale", type=float, default=0.667)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    text2speech = build_text2speech(args.train_config, args.model_file)
+    call_args = {"decode_conf": {"noise_scale": args.noise_scale}}
+    ids_list = make_ids_list(text2speech, args.requests, args.seed)
+    # 初回の推論は遅いので、計測前に1回ずつ実行しておく
+    text2speech_batch(text2speech, ids_list[:2], call_args)
+
+    def infer_single(ids):
+        with torch.no_grad():
+            return text2speech(ids, **call_args)["wav"]
+
+    print(
+        f"requests: {args.requests}, batch window: {args.batch_window_ms} ms, "
+        f"max batch size: {args.max_batch_size}, torch threads: "
+        f"{torch.get_num_threads()}"
+    )
+    for rate in args.rates:
+        batcher = Text2SpeechBatcher(
+            batch_window=args.batch_window_ms / 1000,
+            max_batch_size=args.max_batch_size,
+        )
+
+        def infer_batched(ids):
+            return batcher.infer_ids("style", text2speech, ids, call_args)
+
+        try:
+            results = {
+                "single ": measure(infer_single, ids_list, rate, args.seed),
+                "batched": measure(infer_batched, ids_list, rate, args.seed),
+            }
+        finally:
+            batcher.shutdown()
+        for label, (elapsed, latencies) in results.items():
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1e3
+            print(
+                f"rate {rate:6.1f}/s {label}: {len(latencies) / elapsed:7.2f} req/s, "
+                f"p50 {p50:8.1f} ms, p95 {p95:8.1f} ms, p99 {p99:8.1f} ms, "
+                f"mean {statistics.mean(latencies) * 1e3:8.1f} ms"
+            )
+        print(
+            f"rate {rate:6.1f}/s mean batch size: {batcher.stats()['mean_batch_size']:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
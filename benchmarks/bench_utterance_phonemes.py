@@ -0,0 +1,110 @@
+"""
+Utterance.phonemesの実行時間を、文の数を増やしながら以前の実装と比較する
+以前の実装はアクセント句の数に対して2乗の時間がかかっていた
+
+    python benchmarks/bench_utterance_phonemes.py --sentences 1 10 100 1000
+"""
+import argparse
+import copy
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bridge_plugin.full_context_label import (  # noqa: E402
+    Phoneme,
+    Utterance,
+    extract_full_context_label,
+)
+
+DEFAULT_SENTENCE = "吾輩は猫である、名前はまだ無い。"
+
+
+def reference_phonemes(utterance: Utterance) -> List[Phoneme]:
+    """
+    以前の実装と同じく、contextを1つずつ書き換え、i5・i6をlist.indexで求める
+    """
+    accent_phrases = [
+        accent_phrase
+        for breath_group in utterance.breath_groups
+        for accent_phrase in breath_group.accent_phrases
+    ]
+    for prev, cent, post in zip(
+        [None] + accent_phrases[:-1], accent_phrases, accent_phrases[1:] + [None]
+    ):
+        mora_num = len(cent.moras)
+        accent = cent.accent
+        if prev is not None:
+            prev.set_context("g1", str(mora_num))
+            prev.set_context("g2", str(accent))
+        if post is not None:
+            post.set_context("e1", str(mora_num))
+            post.set_context("e2", str(accent))
+        cent.set_context("f1", str(mora_num))
+        cent.set_context("f2", str(accent))
+        for i_mora, mora in enumerate(cent.moras):
+            mora.set_context("a1", str(i_mora - accent + 1))
+            mora.set_context("a2", str(i_mora + 1))
+            mora.set_context("a3", str(mora_num - i_mora))
+
+    breath_groups = utterance.breath_groups
+    for prev, cent, post in zip(
+        [None] + breath_groups[:-1], breath_groups, breath_groups[1:] + [None]
+    ):
+        accent_phrase_num = len(cent.accent_phrases)
+        if prev is not None:
+            prev.set_context("j1", str(accent_phrase_num))
+        if post is not None:
+            post.set_context("h1", str(accent_phrase_num))
+        cent.set_context("i1", str(accent_phrase_num))
+        cent.set_context("i5", str(accent_phrases.index(cent.accent_phrases[0]) + 1))
+        cent.set_context(
+            "i6",
+            str(len(accent_phrases) - accent_phrases.index(cent.accent_phrases[0])),
+        )
+    utterance.set_context("k2", str(len(accent_phrases)))
+
+    phonemes: List[Phoneme] = []
+    for i in range(len(utterance.pauses)):
+        if utterance.pauses[i] is not None:
+            phonemes += [utterance.pauses[i]]
+        if i < len(utterance.pauses) - 1:
+            phonemes += breath_groups[i].phonemes
+    return phonemes
+
+
+def measure(func, utterance: Utterance, repeat: int) -> float:
+    # 書き換え済みのcontextの影響を受けないよう、毎回複製したものを使う
+    utterances = [copy.deepcopy(utterance) for _ in range(repeat)]
+    start = time.perf_counter()
+    for target in utterances:
+        func(target)
+    return (time.perf_counter() - start) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sentence", default=DEFAULT_SENTENCE)
+    parser.add_argument("--sentences", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print("sentences  accent_phrases  phonemes  reference(ms)  linear(ms)  speedup")
+    for num_sentences in args.sentences:
+        utterance = extract_full_context_label(args.sentence * num_sentences)
+        num_accent_phrases = sum(
+            len(breath_group.accent_phrases) for breath_group in utterance.breath_groups
+        )
+        reference = measure(reference_phonemes, utterance, args.repeat)
+        linear = measure(lambda target: target.phonemes, utterance, args.repeat)
+        print(
+            f"{num_sentences:9d}  {num_accent_phrases:14d}"
+            f"  {len(utterance.phonemes):8d}  {reference * 1e3:13.2f}"
+            f"  {linear * 1e3:10.2f}  x{reference / linear:6.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
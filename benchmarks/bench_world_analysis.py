@@ -0,0 +1,89 @@
+"""
+WORLDによる音高・抑揚の加工(分析と合成)の実時間比(RTF)を、WorldAnalysisConfigの設定ごとに計測する
+
+    python benchmarks/bench_world_analysis.py --duration 3 --sampling_rate 44100
+    python benchmarks/bench_world_analysis.py --wav sample.wav
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pyworld
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bridge_plugin.bridge_config.BridgeConfig import WorldAnalysisConfig  # noqa: E402
+from bridge_plugin.synthesis_engine.synthesis_engine_base import (  # noqa: E402
+    apply_intonation,
+)
+from bridge_plugin.synthesis_engine.synthesis_engine_espnet import (  # noqa: E402
+    world_analysis,
+)
+
+PROFILES = {
+    "defaults": WorldAnalysisConfig(),
+    "frame_period=10": WorldAnalysisConfig(frame_period=10),
+    "frame_period=10, refine_f0=false, fft_size=1024": WorldAnalysisConfig(
+        frame_period=10, refine_f0=False, fft_size=1024
+    ),
+    "harvest": WorldAnalysisConfig(f0_method="harvest"),
+}
+
+
+def make_voice(duration: float, fs: int, seed: int = 0) -> np.ndarray:
+    """
+    f0がゆっくり揺れる高調波と雑音からなり、ところどころ無声区間を挟む音声のような波形を作る
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * fs)) / fs
+    f0 = 150 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / fs
+    wave = sum(np.sin(k * phase) / k for k in range(1, 20))
+    wave *= 0.1
+    # 0.5秒ごとに0.1秒の無声区間(雑音)にする
+    unvoiced = (t % 0.5) > 0.4
+    wave[unvoiced] = rng.normal(0, 0.02, unvoiced.sum())
+    return wave.astype(np.float64)
+
+
+def process(wave: np.ndarray, fs: int, config: WorldAnalysisConfig) -> np.ndarray:
+    """
+    SynthesisEngineESPNet._post_processと同じく、分析・抑揚の適用・合成を行う
+    """
+    f0, sp, ap = world_analysis(wave, fs, config)
+    f0 = apply_intonation(f0, 1.2, pitch_ratio=1.3)
+    return pyworld.synthesize(f0, sp, ap, fs, frame_period=config.frame_period)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--wav", type=Path, default=None, help="指定すると合成音声の代わりに使う")
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--sampling_rate", type=int, default=44100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.wav is not None:
+        import librosa
+
+        wave, fs = librosa.load(args.wav, sr=None, mono=True)
+        wave = wave.astype(np.float64)
+    else:
+        fs = args.sampling_rate
+        wave = make_voice(args.duration, fs)
+    duration = len(wave) / fs
+    print(f"{duration:.2f} s, {fs} Hz")
+
+    for name, config in PROFILES.items():
+        elapsed = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            process(wave, fs, config)
+            elapsed.append(time.perf_counter() - start)
+        print(f"RTF {min(elapsed) / duration:5.2f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+入力が同じyukarin_s_forward・yukarin_sa_forwardの呼び出しを共有した場合としない場合の
+スループットと待ち時間を、同時リクエスト数ごとに比較する
+コアは推論時間の分だけsleepするスタブで、ctypesの呼び出しと同じくGILを手放す
+
+    python benchmarks/bench_yukarin_coalescing.py --concurrency 1 4 16 --distinct 4
+"""
+import argparse
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bridge_plugin.model import AccentPhrase, Mora  # noqa: E402
+from bridge_plugin.synthesis_engine.synthesis_engine import (  # noqa: E402
+    SynthesisEngine,
+)
+
+
+class SleepCore:
+    """
+    1回の推論に一定時間かかるyukarin_s/yukarin_saのスタブ
+    """
+
+    def __init__(self, inference_time: float):
+        self.inference_time = inference_time
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _infer(self) -> None:
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.inference_time)
+
+    def metas(self):
+        return "[]"
+
+    def supported_devices(self):
+        return "{}"
+
+    def is_model_loaded(self, style_id):
+        return True
+
+    def load_model(self, style_id):
+        pass
+
+    def yukarin_s_forward(self, length, phoneme_list, style_id):
+        self._infer()
+        return np.full(length, 0.1, dtype=np.float32)
+
+    def yukarin_sa_forward(self, length, vowel_phoneme_list, style_id, **kwargs):
+        self._infer()
+        return np.full((len(style_id), length), 5.5, dtype=np.float32)
+
+
+def accent_phrases(index: int):
+    """
+    indexごとに異なるモーラ列のアクセント句を作る
+    """
+    kana = [("カ", "k", "a"), ("キ", "k", "i"), ("ク", "k", "u"), ("サ", "s", "a")]
+    moras = [
+        Mora(
+            text=text,
+            consonant=consonant,
+            consonant_length=0,
+            vowel=vowel,
+            vowel_length=0,
+            pitch=0,
+        )
+        # indexを4進数の各桁に分けてモーラを選ぶので、1024通りまで異なる列になる
+        for text, consonant, vowel in [kana[(index >> (2 * k)) & 3] for k in range(5)]
+    ]
+    return [AccentPhrase(moras=moras, accent=1)]
+
+
+def measure(engine: SynthesisEngine, concurrency: int, requests: int, distinct: int):
+    """
+    concurrency個のスレッドからrequests件のreplace_mora_dataを実行し、
+    経過時間と1件ごとの待ち時間を返す
+    """
+    latencies = []
+
+    def run(i: int) -> None:
+        start = time.perf_counter()
+        engine.replace_mora_data(accent_phrases(i % distinct), style_id=0)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run, range(requests)))
+    return time.perf_counter() - start, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument(
+        "--distinct", type=int, default=0, help="異なる入力の数。0の場合は全て異なる入力にする"
+    )
+    parser.add_argument("--inference_ms", type=float, default=2.0)
+    args = parser.parse_args()
+    distinct = args.distinct or args.requests
+
+    print(
+        f"requests: {args.requests}, distinct inputs: {distinct}, "
+        f"inference: {args.inference_ms} ms"
+    )
+    for concurrency in args.concurrency:
+        for coalesce in [False, True]:
+            core = SleepCore(args.inference_ms / 1000)
+            engine = SynthesisEngine(core, coalesce_requests=coalesce)
+            try:
+                elapsed, latencies = measure(
+                    engine, concurrency, args.requests, distinct
+                )
+            finally:
+                engine.scheduler.shutdown()
+            label = "coalesced" if coalesce else "single   "
+            print(
+                f"concurrency {concurrency:3d} {label}: "
+                f"{args.requests / elapsed:8.1f} req/s, "
+                f"p50 {statistics.median(latencies) * 1e3:7.2f} ms, "
+                f"p95 {np.percentile(latencies, 95) * 1e3:7.2f} ms, "
+                f"core calls {core.calls}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+/*
+ * ベンチマーク用のコアライブラリのスタブ
+ * voicevox_core 0.12以降と同じ関数を持ち、decode_forwardはフレーム数に比例した時間CPUを使う
+ */
+#include <stdbool.h>
+#include <stdint.h>
+
+#define MAX_STYLE_ID 1024
+#define DECODE_WORK_PER_FRAME 20000
+
+static bool loaded[MAX_STYLE_ID];
+
+bool initialize(bool use_gpu, int cpu_num_threads, bool load_all_models) {
+  return true;
+}
+
+const char *metas(void) { return "[]"; }
+
+const char *supported_devices(void) { return "{\"cpu\": true, \"cuda\": false}"; }
+
+const char *last_error_message(void) { return "invalid style_id"; }
+
+void finalize(void) {}
+
+bool load_model(int64_t style_id) {
+  if (style_id < 0 || style_id >= MAX_STYLE_ID) return false;
+  loaded[style_id] = true;
+  return true;
+}
+
+bool is_model_loaded(int64_t style_id) {
+  return style_id >= 0 && style_id < MAX_STYLE_ID && loaded[style_id];
+}
+
+bool yukarin_s_forward(int length, int64_t *phoneme_list, int64_t *style_id,
+                       float *output) {
+  for (int i = 0; i < length; i++) output[i] = 0.1f;
+  return true;
+}
+
+bool yukarin_sa_forward(int length, int64_t *vowel_phoneme_list,
+                        int64_t *consonant_phoneme_list,
+                        int64_t *start_accent_list, int64_t *end_accent_list,
+                        int64_t *start_accent_phrase_list,
+                        int64_t *end_accent_phrase_list, int64_t *style_id,
+                        float *output) {
+  for (int i = 0; i < length; i++) output[i] = 5.5f;
+  return true;
+}
+
+bool decode_forward(int length, int phoneme_size, float *f0, float *phoneme,
+                    int64_t *style_id, float *output) {
+  if (style_id[0] < 0) return false;
+  volatile double work = 0;
+  for (int64_t k = 0; k < (int64_t)length * DECODE_WORK_PER_FRAME; k++) work += k;
+  for (int64_t i = 0; i < (int64_t)length * 256; i++) {
+    output[i] = f0[i / 256] + phoneme[(i / 256) * phoneme_size];
+  }
+  return true;
+}
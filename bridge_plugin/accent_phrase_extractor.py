@@ -0,0 +1,109 @@
+"""
+テキストからアクセント句を作成する処理のうち、エンジンの状態に依存しない部分
+pyopenjtalkとフルコンテキストラベルの解析だけを使い、音声合成エンジン(torch・ESPnet)を読み込まないため、
+AccentPhraseExtractorPoolのワーカープロセスからも軽量に読み込める
+"""
+import time
+from typing import List, Tuple
+
+import pyopenjtalk
+
+from . import full_context_label
+from .full_context_label import extract_full_context_label
+from .model import AccentPhrase, Mora
+from .mora_list import openjtalk_mora2text
+
+
+def mora_to_text(mora: str) -> str:
+    if mora[-1:] in ["A", "I", "U", "E", "O"]:
+        # 無声化母音を小文字に
+        mora = mora[:-1] + mora[-1].lower()
+    if mora in openjtalk_mora2text:
+        return openjtalk_mora2text[mora]
+    else:
+        return mora
+
+
+def full_context_label_moras_to_moras(
+    full_context_moras: List[full_context_label.Mora],
+) -> List[Mora]:
+    return [
+        Mora(
+            text=mora_to_text("".join([p.phoneme for p in mora.phonemes])),
+            consonant=(mora.consonant.phoneme if mora.consonant is not None else None),
+            consonant_length=0 if mora.consonant is not None else None,
+            vowel=mora.vowel.phoneme,
+            vowel_length=0,
+            pitch=0,
+        )
+        for mora in full_context_moras
+    ]
+
+
+def text_to_accent_phrases(text: str) -> List[AccentPhrase]:
+    """
+    テキストを解析し、音素長・音高が未設定(0)のアクセント句を作成する
+    エンジンの状態に依存しないため、別プロセスからも呼び出せる
+    Parameters
+    ----------
+    text : str
+        解析するテキスト
+    Returns
+    -------
+    accent_phrases : List[AccentPhrase]
+        アクセント句モデルのリスト
+    """
+    if len(text.strip()) == 0:
+        return []
+
+    utterance = extract_full_context_label(text)
+    if len(utterance.breath_groups) == 0:
+        return []
+
+    return [
+        AccentPhrase(
+            moras=full_context_label_moras_to_moras(accent_phrase.moras),
+            accent=accent_phrase.accent,
+            pause_mora=(
+                Mora(
+                    text="、",
+                    consonant=None,
+                    consonant_length=None,
+                    vowel="pau",
+                    vowel_length=0,
+                    pitch=0,
+                )
+                if (
+                    i_accent_phrase == len(breath_group.accent_phrases) - 1
+                    and i_breath_group != len(utterance.breath_groups) - 1
+                )
+                else None
+            ),
+            is_interrogative=accent_phrase.is_interrogative,
+        )
+        for i_breath_group, breath_group in enumerate(utterance.breath_groups)
+        for i_accent_phrase, accent_phrase in enumerate(breath_group.accent_phrases)
+    ]
+
+
+def initialize_worker() -> None:
+    """
+    ワーカープロセスの起動時に呼び出す
+    OpenJTalkの辞書は初回呼び出し時に読み込まれるので、ここで済ませておく
+    """
+    pyopenjtalk.extract_fullcontext("あ")
+
+
+def texts_to_accent_phrases_timed(
+    texts: List[str],
+) -> List[Tuple[List[AccentPhrase], float]]:
+    """
+    複数のテキストをtext_to_accent_phrasesで順に解析し、1件ごとの処理時間(秒)とともに返す
+    処理時間はキューで待った時間を含まないよう、ワーカー内で1件ずつ計測する
+    """
+    results = []
+    for text in texts:
+        start = time.perf_counter()
+        accent_phrases = text_to_accent_phrases(text)
+        results.append((accent_phrases, time.perf_counter() - start))
+    return results
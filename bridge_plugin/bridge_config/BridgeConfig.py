@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Literal, Optional, Union
+from typing import Any, Dict, List, Literal, Optional, Union
 
 import numpy as np
 import torch
@@ -56,10 +56,32 @@ class TokenIDConverterInitArgs(BaseModel):
     espnet2.text.token_id_converter.TokenIDConverterの呼び出し時に渡すパラメータ
     """
 
-    token_list: Union[Path, str, Iterable[str]]
+    token_list: Union[Path, str, List[str]]
     unk_symbol: str = "<unk>"
 
 
+class WorldAnalysisConfig(BaseModel):
+    """
+    音高・抑揚を加工する際のWORLDによる分析のパラメータ
+    デフォルト値はpyworldのデフォルトと同じで、最も品質が高く最も遅い
+    - f0_method: "dio"は"harvest"より数倍速いが、有声・無声の判定を誤りやすい
+    - refine_f0: Falseにするとdioの後のstonemaskを省略する。速くなるがf0が粗くなる
+    - frame_period: 大きくするとフレーム数に比例して分析・合成が速くなるが、
+      10msを超えると子音などの速い変化が平滑化される
+    - fft_size: 小さくするとcheaptrick・d4cが速くなるが、
+      分析できるf0の下限が上がる(fft_size >= 3 * fs / f0_floor)ため、低い声では音質が落ちる
+    """
+
+    f0_method: Literal["dio", "harvest"] = Field(title="f0の推定方法", default="dio")
+    refine_f0: bool = Field(title="stonemaskでf0を補正するか", default=True)
+    frame_period: float = Field(title="フレーム周期(ms)", default=5.0, gt=0)
+    fft_size: Optional[int] = Field(
+        title="cheaptrick・d4cのFFTサイズ。Noneの場合はサンプリングレートから決める",
+        default=None,
+        gt=0,
+    )
+
+
 class StyleConfig(SpeakerStyle):
     """
     スタイルの設定のフォーマット
@@ -81,6 +103,14 @@ class StyleConfig(SpeakerStyle):
     token_id_converter_init_args: TokenIDConverterInitArgs = Field(
         title="TokenIDConverterクラス初期化時の引数",
     )
+    max_concurrency: Optional[int] = Field(
+        title="このスタイルで同時に推論できるリクエスト数の上限。Noneの場合は制限しない",
+        default=None,
+        gt=0,
+    )
+    world_analysis: WorldAnalysisConfig = Field(
+        title="音高・抑揚の加工時のWORLDの分析設定", default=WorldAnalysisConfig()
+    )
     text2speech: Optional[Text2Speech] = Field(
         title="Text2Speechクラスのインスタンス（内部で使用）", default=None
     )
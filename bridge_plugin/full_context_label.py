@@ -1,16 +1,79 @@
 import re
 from dataclasses import dataclass
 from itertools import chain
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import pyopenjtalk
 
 
-@dataclass
+# フルコンテキストラベルの仕様は、
+# http://hts.sp.nitech.ac.jp/?Download の HTS-2.3のJapanese tar.bz2 (126 MB)をダウンロードして、data/lab_format.pdfを見るとリストが見つかります。 # noqa
+_LABEL_FORMAT = (
+    "{p1}^{p2}-{p3}+{p4}={p5}"
+    "/A:{a1}+{a2}+{a3}"
+    "/B:{b1}-{b2}_{b3}"
+    "/C:{c1}_{c2}+{c3}"
+    "/D:{d1}+{d2}_{d3}"
+    "/E:{e1}_{e2}!{e3}_{e4}-{e5}"
+    "/F:{f1}_{f2}#{f3}_{f4}@{f5}_{f6}|{f7}_{f8}"
+    "/G:{g1}_{g2}%{g3}_{g4}_{g5}"
+    "/H:{h1}_{h2}"
+    "/I:{i1}-{i2}@{i3}+{i4}&{i5}-{i6}|{i7}+{i8}"
+    "/J:{j1}_{j2}"
+    "/K:{k1}+{k2}-{k3}"
+)
+
+# (contextのキー, 直後の区切り文字)のタプル。最後のキーの区切り文字はNone
+_LABEL_FIELDS: Tuple[Tuple[str, Optional[str]], ...] = tuple(
+    (name, delimiter if delimiter != "" else None)
+    for delimiter, name in zip(
+        re.split(r"\{\w+\}", _LABEL_FORMAT)[1:], re.findall(r"\{(\w+)\}", _LABEL_FORMAT)
+    )
+)
+
+# Phonemeが生成時に解析して保持するcontextのキー。その他のキーは必要になった時点で解析する
+_EAGER_KEYS = frozenset(["p3", "a2", "f1", "f2", "f3", "f5", "i3"])
+
+
+def _split_fields(
+    label: str, start: int, delimiters: Tuple[str, ...]
+) -> Tuple[List[str], int]:
+    """
+    labelのstartの位置から、区切り文字で順に区切った値のリストと、最後の区切り文字の直後の位置を返す
+    各値は1文字以上とし、正規表現の最短一致(.+?)と同じ位置で区切る
+    """
+    values = []
+    for delimiter in delimiters:
+        end = label.find(delimiter, start + 1)
+        if end == -1:
+            raise ValueError(f"フルコンテキストラベルの形式が不正です: {label}")
+        values.append(label[start:end])
+        start = end + len(delimiter)
+    return values, start
+
+
+def _parse_label(label: str) -> Dict[str, str]:
+    """
+    フルコンテキストラベルを1回の走査で全てのcontextに分解する
+    """
+    contexts: Dict[str, str] = {}
+    start = 0
+    for name, delimiter in _LABEL_FIELDS:
+        if delimiter is None:
+            if start >= len(label):
+                raise ValueError(f"フルコンテキストラベルの形式が不正です: {label}")
+            contexts[name] = label[start:]
+        else:
+            (contexts[name],), start = _split_fields(label, start, (delimiter,))
+    return contexts
+
+
 class Phoneme:
     """
     音素(母音・子音)クラス、音素の元となるcontextを保持する
     音素には、母音や子音以外にも無音(silent/pause)も含まれる
+    後段の処理で参照するcontext(p3, a2, f1, f2, f3, f5, i3)のみ生成時に解析し、
+    その他のcontextはcontextsへの初回アクセス時に解析する
 
     Attributes
     ----------
@@ -18,7 +81,22 @@ class Phoneme:
         音素の元
     """
 
-    contexts: Dict[str, str]
+    __slots__ = ("_label", "_contexts", "p3", "a2", "f1", "f2", "f3", "f5", "i3")
+
+    def __init__(self, label: str):
+        self._label = label
+        self._contexts: Optional[Dict[str, str]] = None
+        # ラベルの各値は区切り文字を含まないので、固定の区切り文字で順に分割するだけで取り出せる
+        # (符号付きの値をとるa1などは、区切り文字に"-"を含まないブロックにのみ存在する)
+        p, a, _, _, _, _, f, _, _, i, _, _ = label.split("/")
+        self.p3 = p[p.index("-") + 1 : p.index("+")]
+        self.a2 = a.split("+", 2)[1]
+        self.f1, f = f[2:].split("_", 1)
+        self.f2, f = f.split("#", 1)
+        self.f3, f = f.split("_", 1)
+        f = f[f.index("@") + 1 :]
+        self.f5 = f[: f.index("_")]
+        self.i3 = i[i.index("@") + 1 : i.index("+")]
 
     @classmethod
     def from_label(cls, label: str):
@@ -34,25 +112,46 @@ class Phoneme:
         phoneme: Phoneme
             Phonemeクラスを返す
         """
+        return cls(label)
+
+    @property
+    def contexts(self) -> Dict[str, str]:
+        """
+        全てのcontextを返す。値を変更する場合はset_contextを使う
+        Returns
+        -------
+        contexts : Dict[str, str]
+            音素の元
+        """
+        if self._contexts is None:
+            self._contexts = _parse_label(self._label)
+        return self._contexts
+
+    def set_context(self, key: str, value: str):
+        """
+        contextのうち、指定されたキーの値を変更する
+        Parameters
+        ----------
+        key : str
+            変更したいcontextのキー
+        value : str
+            変更したいcontextの値
+        """
+        self.contexts[key] = value
+        if key in _EAGER_KEYS:
+            setattr(self, key, value)
 
-        # フルコンテキストラベルの仕様は、
-        # http://hts.sp.nitech.ac.jp/?Download の HTS-2.3のJapanese tar.bz2 (126 MB)をダウンロードして、data/lab_format.pdfを見るとリストが見つかります。 # noqa
-        contexts = re.search(
-            r"^(?P<p1>.+?)\^(?P<p2>.+?)\-(?P<p3>.+?)\+(?P<p4>.+?)\=(?P<p5>.+?)"
-            r"/A\:(?P<a1>.+?)\+(?P<a2>.+?)\+(?P<a3>.+?)"
-            r"/B\:(?P<b1>.+?)\-(?P<b2>.+?)\_(?P<b3>.+?)"
-            r"/C\:(?P<c1>.+?)\_(?P<c2>.+?)\+(?P<c3>.+?)"
-            r"/D\:(?P<d1>.+?)\+(?P<d2>.+?)\_(?P<d3>.+?)"
-            r"/E\:(?P<e1>.+?)\_(?P<e2>.+?)\!(?P<e3>.+?)\_(?P<e4>.+?)\-(?P<e5>.+?)"
-            r"/F\:(?P<f1>.+?)\_(?P<f2>.+?)\#(?P<f3>.+?)\_(?P<f4>.+?)\@(?P<f5>.+?)\_(?P<f6>.+?)\|(?P<f7>.+?)\_(?P<f8>.+?)"  # noqa
-            r"/G\:(?P<g1>.+?)\_(?P<g2>.+?)\%(?P<g3>.+?)\_(?P<g4>.+?)\_(?P<g5>.+?)"
-            r"/H\:(?P<h1>.+?)\_(?P<h2>.+?)"
-            r"/I\:(?P<i1>.+?)\-(?P<i2>.+?)\@(?P<i3>.+?)\+(?P<i4>.+?)\&(?P<i5>.+?)\-(?P<i6>.+?)\|(?P<i7>.+?)\+(?P<i8>.+?)"  # noqa
-            r"/J\:(?P<j1>.+?)\_(?P<j2>.+?)"
-            r"/K\:(?P<k1>.+?)\+(?P<k2>.+?)\-(?P<k3>.+?)$",
-            label,
-        ).groupdict()
-        return cls(contexts=contexts)
+    def set_contexts(self, contexts: Dict[str, str]):
+        """
+        contextのうち、指定された複数のキーの値をまとめて変更する
+        Parameters
+        ----------
+        contexts : Dict[str, str]
+            変更したいcontextのキーと値
+        """
+        self.contexts.update(contexts)
+        for key in _EAGER_KEYS.intersection(contexts):
+            setattr(self, key, contexts[key])
 
     @property
     def label(self):
@@ -63,20 +162,9 @@ class Phoneme:
         lebel: str
             ラベルを返す
         """
-        return (
-            "{p1}^{p2}-{p3}+{p4}={p5}"
-            "/A:{a1}+{a2}+{a3}"
-            "/B:{b1}-{b2}_{b3}"
-            "/C:{c1}_{c2}+{c3}"
-            "/D:{d1}+{d2}_{d3}"
-            "/E:{e1}_{e2}!{e3}_{e4}-{e5}"
-            "/F:{f1}_{f2}#{f3}_{f4}@{f5}_{f6}|{f7}_{f8}"
-            "/G:{g1}_{g2}%{g3}_{g4}_{g5}"
-            "/H:{h1}_{h2}"
-            "/I:{i1}-{i2}@{i3}+{i4}&{i5}-{i6}|{i7}+{i8}"
-            "/J:{j1}_{j2}"
-            "/K:{k1}+{k2}-{k3}"
-        ).format(**self.contexts)
+        if self._contexts is None:
+            return self._label
+        return _LABEL_FORMAT.format(**self._contexts)
 
     @property
     def phoneme(self):
@@ -87,7 +175,7 @@ class Phoneme:
         phoneme : str
             発声に必要な要素を返す
         """
-        return self.contexts["p3"]
+        return self.p3
 
     def is_pause(self):
         """
@@ -97,7 +185,7 @@ class Phoneme:
         is_pose : bool
             音素がポーズ(無音、silent/pause)であるか(True)否か(False)
         """
-        return self.contexts["f1"] == "xx"
+        return self.f1 == "xx"
 
     def __repr__(self):
         return f"<Phoneme phoneme='{self.phoneme}'>"
@@ -131,9 +219,9 @@ class Mora:
         value : str
             変更したいcontextの値
         """
-        self.vowel.contexts[key] = value
+        self.vowel.set_context(key, value)
         if self.consonant is not None:
-            self.consonant.contexts[key] = value
+            self.consonant.set_context(key, value)
 
     @property
     def phonemes(self):
@@ -199,15 +287,12 @@ class AccentPhrase:
             # workaround for Hihosiba/voicevox_engine#57
             # (py)openjtalk によるアクセント句内のモーラへの附番は 49 番目まで
             # 49 番目のモーラについて、続く音素のモーラ番号を単一モーラの特定に使えない
-            if int(phoneme.contexts["a2"]) == 49:
+            if int(phoneme.a2) == 49:
                 break
 
             mora_phonemes.append(phoneme)
 
-            if (
-                next_phoneme is None
-                or phoneme.contexts["a2"] != next_phoneme.contexts["a2"]
-            ):
+            if next_phoneme is None or phoneme.a2 != next_phoneme.a2:
                 if len(mora_phonemes) == 1:
                     consonant, vowel = None, mora_phonemes[0]
                 elif len(mora_phonemes) == 2:
@@ -218,11 +303,11 @@ class AccentPhrase:
                 moras.append(mora)
                 mora_phonemes = []
 
-        accent = int(moras[0].vowel.contexts["f2"])
+        accent = int(moras[0].vowel.f2)
         # workaround for Hihosiba/voicevox_engine#55
         # アクセント位置とするキー f2 の値がアクセント句内のモーラ数を超える場合がある
         accent = accent if accent <= len(moras) else len(moras)
-        is_interrogative = moras[-1].vowel.contexts["f3"] == "1"
+        is_interrogative = moras[-1].vowel.f3 == "1"
         return cls(moras=moras, accent=accent, is_interrogative=is_interrogative)
 
     def set_context(self, key: str, value: str):
@@ -315,8 +400,8 @@ class BreathGroup:
 
             if (
                 next_phoneme is None
-                or phoneme.contexts["i3"] != next_phoneme.contexts["i3"]
-                or phoneme.contexts["f5"] != next_phoneme.contexts["f5"]
+                or phoneme.i3 != next_phoneme.i3
+                or phoneme.f5 != next_phoneme.f5
             ):
                 accent_phrase = AccentPhrase.from_phonemes(accent_phonemes)
                 accent_phrases.append(accent_phrase)
@@ -439,62 +524,54 @@ class Utterance:
                 breath_group.accent_phrases for breath_group in self.breath_groups
             )
         )
-        for prev, cent, post in zip(
-            [None] + accent_phrases[:-1],
-            accent_phrases,
-            accent_phrases[1:] + [None],
-        ):
-            mora_num = len(cent.moras)
-            accent = cent.accent
-
-            if prev is not None:
-                prev.set_context("g1", str(mora_num))
-                prev.set_context("g2", str(accent))
-
-            if post is not None:
-                post.set_context("e1", str(mora_num))
-                post.set_context("e2", str(accent))
-
-            cent.set_context("f1", str(mora_num))
-            cent.set_context("f2", str(accent))
-            for i_mora, mora in enumerate(cent.moras):
-                mora.set_context("a1", str(i_mora - accent + 1))
-                mora.set_context("a2", str(i_mora + 1))
-                mora.set_context("a3", str(mora_num - i_mora))
-
-        for prev, cent, post in zip(
-            [None] + self.breath_groups[:-1],
-            self.breath_groups,
-            self.breath_groups[1:] + [None],
-        ):
-            accent_phrase_num = len(cent.accent_phrases)
-
-            if prev is not None:
-                prev.set_context("j1", str(accent_phrase_num))
-
-            if post is not None:
-                post.set_context("h1", str(accent_phrase_num))
-
-            cent.set_context("i1", str(accent_phrase_num))
-            cent.set_context(
-                "i5", str(accent_phrases.index(cent.accent_phrases[0]) + 1)
-            )
-            cent.set_context(
-                "i6",
-                str(len(accent_phrases) - accent_phrases.index(cent.accent_phrases[0])),
-            )
-
-        self.set_context(
-            "k2",
-            str(
-                sum(
-                    [
-                        len(breath_group.accent_phrases)
-                        for breath_group in self.breath_groups
-                    ]
-                )
-            ),
-        )
+        accent_phrase_num_total = str(len(accent_phrases))
+
+        # 全てのPhonemeを1回ずつ走査し、位置に応じたcontextをまとめて設定する
+        # i_accent_phraseは発話全体でのアクセント句の位置で、BreathGroupの先頭のアクセント句の位置(i5, i6)にも使う
+        i_accent_phrase = 0
+        for i_breath_group, breath_group in enumerate(self.breath_groups):
+            breath_group_contexts = {
+                "i1": str(len(breath_group.accent_phrases)),
+                "i5": str(i_accent_phrase + 1),
+                "i6": str(len(accent_phrases) - i_accent_phrase),
+                "k2": accent_phrase_num_total,
+            }
+            if i_breath_group > 0:
+                prev = self.breath_groups[i_breath_group - 1]
+                breath_group_contexts["h1"] = str(len(prev.accent_phrases))
+            if i_breath_group < len(self.breath_groups) - 1:
+                post = self.breath_groups[i_breath_group + 1]
+                breath_group_contexts["j1"] = str(len(post.accent_phrases))
+
+            for accent_phrase in breath_group.accent_phrases:
+                mora_num = len(accent_phrase.moras)
+                accent = accent_phrase.accent
+
+                accent_phrase_contexts = {
+                    **breath_group_contexts,
+                    "f1": str(mora_num),
+                    "f2": str(accent),
+                }
+                if i_accent_phrase > 0:
+                    prev = accent_phrases[i_accent_phrase - 1]
+                    accent_phrase_contexts["e1"] = str(len(prev.moras))
+                    accent_phrase_contexts["e2"] = str(prev.accent)
+                if i_accent_phrase < len(accent_phrases) - 1:
+                    post = accent_phrases[i_accent_phrase + 1]
+                    accent_phrase_contexts["g1"] = str(len(post.moras))
+                    accent_phrase_contexts["g2"] = str(post.accent)
+
+                for i_mora, mora in enumerate(accent_phrase.moras):
+                    mora_contexts = {
+                        **accent_phrase_contexts,
+                        "a1": str(i_mora - accent + 1),
+                        "a2": str(i_mora + 1),
+                        "a3": str(mora_num - i_mora),
+                    }
+                    for phoneme in mora.phonemes:
+                        phoneme.set_contexts(mora_contexts)
+
+                i_accent_phrase += 1
 
         phonemes: List[Phoneme] = []
         for i in range(len(self.pauses)):
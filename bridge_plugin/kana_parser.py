@@ -1,14 +1,14 @@
-from typing import List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from .model import AccentPhrase, Mora, ParseKanaError, ParseKanaErrorCode
 from .mora_list import openjtalk_text2mora
 
-LOOP_LIMIT = 300
 UNVOICE_SYMBOL = "_"
 ACCENT_SYMBOL = "'"
 NOPAUSE_DELIMITER = "/"
 PAUSE_DELIMITER = "、"
 WIDE_INTERROGATION_MARK = "？"
+_UNVOICED_VOWELS = frozenset(["A", "I", "U", "E", "O"])
 
 text2mora_with_unvoice = {}
 for text, (consonant, vowel) in openjtalk_text2mora.items():
@@ -33,21 +33,39 @@ for text, (consonant, vowel) in openjtalk_text2mora.items():
         )
 
 
+# text2mora_with_unvoiceのキーから作るトライ木
+# 各ノードは{文字: 子ノード}の辞書で、ノードまでの文字列が仮名として存在する場合は
+# _TRIE_TERMINALをキーに(仮名, Moraのフィールドの値)を持つ
+# フィールドの値は検証済みのtext2mora_with_unvoiceから取り出したものなので、
+# Mora.constructで検証やdeep copyを省いてMoraを作成できる
+_TRIE_TERMINAL = ""
+mora_trie: Dict[str, Any] = {}
+for text, mora in text2mora_with_unvoice.items():
+    node = mora_trie
+    for char in text:
+        node = node.setdefault(char, {})
+    node[_TRIE_TERMINAL] = (text, mora.dict())
+
+_PAUSE_MORA_FIELDS = Mora(
+    text="、",
+    consonant=None,
+    consonant_length=None,
+    vowel="pau",
+    vowel_length=0,
+    pitch=0,
+).dict()
+
+
 def _text_to_accent_phrase(phrase: str) -> AccentPhrase:
     """
     longest matchにより読み仮名からAccentPhraseを生成
-    入力長Nに対し計算量O(N^2)
+    トライ木をたどって最長一致を探すため、入力長Nに対し計算量O(N)
     """
     accent_index: Optional[int] = None
     moras: List[Mora] = []
 
-    base_index = 0  # パース開始位置。ここから右の文字列をstackに詰めていく。
-    stack = ""  # 保留中の文字列
-    matched_text: Optional[str] = None  # 保留中の文字列内で最後にマッチした仮名
-
-    outer_loop = 0
+    base_index = 0  # パース開始位置。ここから右の文字列をトライ木でたどる。
     while base_index < len(phrase):
-        outer_loop += 1
         if phrase[base_index] == ACCENT_SYMBOL:
             if len(moras) == 0:
                 raise ParseKanaError(ParseKanaErrorCode.ACCENT_TOP, text=phrase)
@@ -56,27 +74,29 @@ def _text_to_accent_phrase(phrase: str) -> AccentPhrase:
             accent_index = len(moras)
             base_index += 1
             continue
+        node = mora_trie
+        matched: Optional[Tuple[str, Dict[str, Any]]] = None  # 最後にマッチした仮名
         for watch_index in range(base_index, len(phrase)):
-            if phrase[watch_index] == ACCENT_SYMBOL:
+            # アクセント記号はトライ木に含まれないので、ここで探索が打ち切られる
+            node = node.get(phrase[watch_index])
+            if node is None:
                 break
-            # 普通の文字の場合
-            stack += phrase[watch_index]
-            if stack in text2mora_with_unvoice:
-                matched_text = stack
+            matched = node.get(_TRIE_TERMINAL, matched)
         # push mora
-        if matched_text is None:
-            raise ParseKanaError(ParseKanaErrorCode.UNKNOWN_TEXT, text=stack)
-        else:
-            moras.append(text2mora_with_unvoice[matched_text].copy(deep=True))
-            base_index += len(matched_text)
-            stack = ""
-            matched_text = None
-        if outer_loop > LOOP_LIMIT:
-            raise ParseKanaError(ParseKanaErrorCode.INFINITE_LOOP)
+        if matched is None:
+            unknown_end = phrase.find(ACCENT_SYMBOL, base_index)
+            if unknown_end == -1:
+                unknown_end = len(phrase)
+            raise ParseKanaError(
+                ParseKanaErrorCode.UNKNOWN_TEXT, text=phrase[base_index:unknown_end]
+            )
+        matched_text, mora_fields = matched
+        moras.append(Mora.construct(**mora_fields))
+        base_index += len(matched_text)
     if accent_index is None:
         raise ParseKanaError(ParseKanaErrorCode.ACCENT_NOTFOUND, text=phrase)
     else:
-        return AccentPhrase(moras=moras, accent=accent_index, pause_mora=None)
+        return AccentPhrase.construct(moras=moras, accent=accent_index, pause_mora=None)
 
 
 def parse_kana(text: str) -> List[AccentPhrase]:
@@ -109,14 +129,7 @@ def parse_kana(text: str) -> List[AccentPhrase]:
 
             accent_phrase: AccentPhrase = _text_to_accent_phrase(phrase)
             if i < len(text) and text[i] == PAUSE_DELIMITER:
-                accent_phrase.pause_mora = Mora(
-                    text="、",
-                    consonant=None,
-                    consonant_length=None,
-                    vowel="pau",
-                    vowel_length=0,
-                    pitch=0,
-                )
+                accent_phrase.pause_mora = Mora.construct(**_PAUSE_MORA_FIELDS)
             accent_phrase.is_interrogative = is_interrogative
 
             parsed_results.append(accent_phrase)
@@ -124,23 +137,76 @@ def parse_kana(text: str) -> List[AccentPhrase]:
     return parsed_results
 
 
+def _accent_phrase_to_kana(phrase: AccentPhrase) -> str:
+    """
+    アクセント句1つ分の読み仮名を区切り文字を含めずに返す
+    """
+    parts: List[str] = []
+    for j, mora in enumerate(phrase.moras, 1):
+        if mora.vowel in _UNVOICED_VOWELS:
+            parts.append(UNVOICE_SYMBOL)
+
+        parts.append(mora.text)
+        if j == phrase.accent:
+            parts.append(ACCENT_SYMBOL)
+
+    if phrase.is_interrogative:
+        parts.append(WIDE_INTERROGATION_MARK)
+    return "".join(parts)
+
+
+def _join_kana(phrase_kanas: List[str], accent_phrases: List[AccentPhrase]) -> str:
+    parts: List[str] = []
+    for phrase_kana, phrase in zip(phrase_kanas, accent_phrases):
+        parts.append(phrase_kana)
+        parts.append(
+            NOPAUSE_DELIMITER if phrase.pause_mora is None else PAUSE_DELIMITER
+        )
+    # 最後のアクセント句の後ろには区切り文字を付けない
+    return "".join(parts[:-1])
+
+
 def create_kana(accent_phrases: List[AccentPhrase]) -> str:
-    text = ""
-    for i, phrase in enumerate(accent_phrases):
-        for j, mora in enumerate(phrase.moras):
-            if mora.vowel in ["A", "I", "U", "E", "O"]:
-                text += UNVOICE_SYMBOL
-
-            text += mora.text
-            if j + 1 == phrase.accent:
-                text += ACCENT_SYMBOL
-
-        if phrase.is_interrogative:
-            text += WIDE_INTERROGATION_MARK
-
-        if i < len(accent_phrases) - 1:
-            if phrase.pause_mora is None:
-                text += NOPAUSE_DELIMITER
-            else:
-                text += PAUSE_DELIMITER
-    return text
+    return _join_kana(
+        [_accent_phrase_to_kana(phrase) for phrase in accent_phrases], accent_phrases
+    )
+
+
+def create_kana_batch(accent_phrases_list: Iterable[List[AccentPhrase]]) -> List[str]:
+    """
+    複数のアクセント句のリストをまとめて読み仮名に変換する
+    """
+    return [create_kana(accent_phrases) for accent_phrases in accent_phrases_list]
+
+
+class IncrementalKanaSerializer:
+    """
+    アクセント句ごとの読み仮名を保持しておき、
+    アクセント句が変更された場合はそのアクセント句の読み仮名だけを作り直す
+    """
+
+    def __init__(self, accent_phrases: List[AccentPhrase]):
+        self._accent_phrases = list(accent_phrases)
+        self._phrase_kanas = [
+            _accent_phrase_to_kana(phrase) for phrase in self._accent_phrases
+        ]
+
+    @property
+    def kana(self) -> str:
+        return _join_kana(self._phrase_kanas, self._accent_phrases)
+
+    def replace(self, index: int, accent_phrase: AccentPhrase) -> str:
+        """
+        index番目のアクセント句を置き換え、全体の読み仮名を返す
+        """
+        self._accent_phrases[index] = accent_phrase
+        self._phrase_kanas[index] = _accent_phrase_to_kana(accent_phrase)
+        return self.kana
+
+    def append(self, accent_phrase: AccentPhrase) -> str:
+        """
+        末尾にアクセント句を追加し、全体の読み仮名を返す
+        """
+        self._accent_phrases.append(accent_phrase)
+        self._phrase_kanas.append(_accent_phrase_to_kana(accent_phrase))
+        return self.kana
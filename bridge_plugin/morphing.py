@@ -5,12 +5,12 @@ from typing import Dict, List, Tuple
 
 import numpy as np
 import pyworld as pw
-from scipy.signal import resample
 
 from .metas.Metas import Speaker, SpeakerSupportPermittedSynthesisMorphing, StyleInfo
 from .metas.MetasStore import construct_lookup
 from .model import AudioQuery, MorphableTargetInfo, StyleIdNotFoundError
 from .synthesis_engine import SynthesisEngine
+from .utility import resample_wave
 
 
 # FIXME: ndarray type hint, https://github.com/JeremyCCHsu/Python-Wrapper-for-World-Vocoder/blob/2b64f86197573497c685c785c6e0e743f407b63e/pyworld/pyworld.pyx#L398  # noqa
@@ -196,9 +196,7 @@ def synthesis_morphing(
         morph_param.frame_period,
     )
 
-    # TODO: synthesis_engine.py でのリサンプル処理と共通化する
-    if output_fs != morph_param.fs:
-        y_h = resample(y_h, output_fs * len(y_h) // morph_param.fs)
+    y_h = resample_wave(y_h, morph_param.fs, output_fs)
 
     if output_stereo:
         y_h = np.array([y_h, y_h]).T
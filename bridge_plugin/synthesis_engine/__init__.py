@@ -1,12 +1,26 @@
+from .accent_phrase_cache import AccentPhraseCache
+from .accent_phrase_extractor_pool import AccentPhraseExtractorPool
+from .core_process_pool import CoreProcessPool
+from .core_scheduler import CoreScheduler
 from .core_wrapper import CoreWrapper, load_runtime_lib
 from .make_synthesis_engines import make_synthesis_engines
+from .model_residency_manager import ModelResidencyManager
+from .request_batcher import RequestBatcher
 from .synthesis_engine import SynthesisEngine
 from .synthesis_engine_base import SynthesisEngineBase
+from .text2speech_batcher import Text2SpeechBatcher
 
 __all__ = [
+    "AccentPhraseCache",
+    "AccentPhraseExtractorPool",
+    "CoreProcessPool",
+    "CoreScheduler",
     "CoreWrapper",
     "load_runtime_lib",
     "make_synthesis_engines",
+    "ModelResidencyManager",
+    "RequestBatcher",
     "SynthesisEngine",
     "SynthesisEngineBase",
+    "Text2SpeechBatcher",
 ]
@@ -0,0 +1,146 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from ..model import AccentPhrase
+
+# キャッシュのメモリ使用量の見積もりに使う、deep copyしたモデルのおおよそのバイト数
+# CPython 3.11・pydantic 1.10でtracemallocにより計測した値で、Moraは値を含めて1つあたり約1150バイト、
+# AccentPhraseはmorasのリストを含めて約550バイトだった
+_MORA_BYTES = 1150
+_ACCENT_PHRASE_BYTES = 550
+# キーのタプルとOrderedDictの要素のおおよそのバイト数
+_ENTRY_BYTES = 200
+
+CacheKey = Tuple[str, int, Optional[str]]
+
+
+def _copy_accent_phrases(accent_phrases: List[AccentPhrase]) -> List[AccentPhrase]:
+    return [accent_phrase.copy(deep=True) for accent_phrase in accent_phrases]
+
+
+def _estimate_bytes(text: str, accent_phrases: List[AccentPhrase]) -> int:
+    """
+    キャッシュの1件が使うメモリ量を、アクセント句とモーラの数から見積もる
+    """
+    num_moras = sum(
+        len(accent_phrase.moras) + (accent_phrase.pause_mora is not None)
+        for accent_phrase in accent_phrases
+    )
+    return (
+        sys.getsizeof(text)
+        + _ENTRY_BYTES
+        + len(accent_phrases) * _ACCENT_PHRASE_BYTES
+        + num_moras * _MORA_BYTES
+    )
+
+
+class AccentPhraseCache:
+    """
+    create_accent_phrasesの結果を(正規化したテキスト, スタイルID, エンジンのバージョン)ごとに保持するLRUキャッシュ
+    保持する値と返す値はどちらもコピーなので、呼び出し側で結果を書き換えてもキャッシュには影響しない
+    ユーザー辞書やモデルが変更された場合はclearで破棄すること
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: Optional[int] = None):
+        """
+        Parameters
+        ----------
+        max_entries : int
+            保持する最大件数。0の場合はキャッシュしない
+        max_bytes : Optional[int]
+            保持する値のおおよそのメモリ使用量の上限。Noneの場合は件数のみで制限する
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.enabled = max_entries > 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.total_bytes = 0
+
+        self._entries: "OrderedDict[CacheKey, Tuple[List[AccentPhrase], int]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _make_key(text: str, style_id: int, engine_version: Optional[str]) -> CacheKey:
+        # 前後の空白はOpenJTalkの解析結果に影響しないので取り除いておく
+        return text.strip(), style_id, engine_version
+
+    def get(
+        self, text: str, style_id: int, engine_version: Optional[str]
+    ) -> Optional[List[AccentPhrase]]:
+        """
+        キャッシュされたアクセント句のコピーを返す。存在しない場合はNoneを返す
+        """
+        if not self.enabled:
+            return None
+
+        key = self._make_key(text, style_id, engine_version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            accent_phrases, _ = entry
+        return _copy_accent_phrases(accent_phrases)
+
+    def put(
+        self,
+        text: str,
+        style_id: int,
+        engine_version: Optional[str],
+        accent_phrases: List[AccentPhrase],
+    ) -> None:
+        """
+        アクセント句のコピーをキャッシュに追加し、上限を超えた分を古いものから破棄する
+        """
+        if not self.enabled:
+            return
+
+        key = self._make_key(text, style_id, engine_version)
+        size = _estimate_bytes(key[0], accent_phrases)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        accent_phrases = _copy_accent_phrases(accent_phrases)
+        with self._lock:
+            old_entry = self._entries.pop(key, None)
+            if old_entry is not None:
+                self.total_bytes -= old_entry[1]
+            self._entries[key] = (accent_phrases, size)
+            self.total_bytes += size
+
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self.total_bytes > self.max_bytes
+            ):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        キャッシュを全て破棄する。カウンタは維持する
+        """
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,92 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Deque, Iterable, Iterator, List, Optional, Tuple
+
+from ..accent_phrase_extractor import initialize_worker, texts_to_accent_phrases_timed
+from ..model import AccentPhrase
+
+
+class AccentPhraseExtractorPool:
+    """
+    テキストからアクセント句への変換(フルコンテキストラベルの抽出と解析)を
+    複数のワーカープロセスに分散して行う
+    各ワーカーは起動時にOpenJTalkを初期化し、以降はそれを使い回す
+    ワーカーが読み込むのはbridge_plugin.accent_phrase_extractorとその依存だけで、
+    音声合成エンジン(torch・ESPnet)は読み込まない
+    """
+
+    def __init__(self, num_workers: Optional[int] = None, chunk_size: int = 16):
+        """
+        Parameters
+        ----------
+        num_workers : Optional[int]
+            ワーカープロセス数。Noneの場合はCPUコア数
+        chunk_size : int
+            1回のタスクでワーカーに渡すテキストの件数
+        """
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        if num_workers < 1:
+            raise ValueError("num_workersは1以上を指定してください")
+        if chunk_size < 1:
+            raise ValueError("chunk_sizeは1以上を指定してください")
+
+        self.num_workers = num_workers
+        self.chunk_size = chunk_size
+        # 呼び出し元ではモデルの読み込みや先読み・一括推論のスレッドが動いているため、
+        # forkで複製するとワーカーがロックを握ったまま止まることがある。spawnで起動する
+        self._executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=initialize_worker,
+        )
+
+    def map(self, texts: Iterable[str]) -> Iterator[List[AccentPhrase]]:
+        """
+        テキストごとのアクセント句を入力と同じ順番で返す
+        処理中のタスクはワーカー数の2倍までに制限されるため、texts全体を先に読み込むことはない
+        Parameters
+        ----------
+        texts : Iterable[str]
+            解析するテキスト
+        Returns
+        -------
+        accent_phrases : Iterator[List[AccentPhrase]]
+            音素長・音高が未設定のアクセント句モデルのリスト
+        """
+        for accent_phrases, _ in self.map_timed(texts):
+            yield accent_phrases
+
+    def map_timed(
+        self, texts: Iterable[str]
+    ) -> Iterator[Tuple[List[AccentPhrase], float]]:
+        """
+        mapと同様に、テキストごとのアクセント句をワーカー内での処理時間(秒)とともに返す
+        """
+        texts = iter(texts)
+        pending: Deque[Future] = deque()
+        max_pending = self.num_workers * 2
+
+        while True:
+            while len(pending) < max_pending:
+                chunk = list(islice(texts, self.chunk_size))
+                if len(chunk) == 0:
+                    break
+                pending.append(
+                    self._executor.submit(texts_to_accent_phrases_timed, chunk)
+                )
+            if len(pending) == 0:
+                return
+            yield from pending.popleft().result()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown()
+
+    def __enter__(self) -> "AccentPhraseExtractorPool":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
@@ -0,0 +1,329 @@
+import multiprocessing
+import threading
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .core_wrapper import CoreError, CoreWrapper, OldCoreError
+
+# 共有メモリ上の配列の先頭位置の揃え(バイト)
+_ALIGNMENT = 64
+
+# 推論メソッドごとの、共有メモリで受け渡す配列の引数名
+_ARRAY_ARGS = {
+    "yukarin_s_forward": ("phoneme_list", "style_id"),
+    "yukarin_sa_forward": (
+        "vowel_phoneme_list",
+        "consonant_phoneme_list",
+        "start_accent_list",
+        "end_accent_list",
+        "start_accent_phrase_list",
+        "end_accent_phrase_list",
+        "style_id",
+    ),
+    "decode_forward": ("f0", "phoneme", "style_id"),
+}
+
+
+def _align(n: int) -> int:
+    return (n + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _output_shape(method: str, kwargs: Dict[str, Any]) -> Tuple[int, ...]:
+    """
+    推論結果の形。CoreWrapperが確保する出力と同じ
+    """
+    length = kwargs["length"]
+    if method == "yukarin_s_forward":
+        return (length,)
+    if method == "yukarin_sa_forward":
+        return (len(kwargs["style_id"]), length)
+    return (length * 256,)
+
+
+def _worker_main(
+    connection,
+    use_gpu: bool,
+    core_dir: Path,
+    cpu_num_threads: int,
+    load_all_models: bool,
+) -> None:
+    """
+    ワーカープロセスの処理。コアを読み込み、親プロセスから届いた呼び出しを順番に実行する
+    """
+    try:
+        core = CoreWrapper(use_gpu, core_dir, cpu_num_threads, load_all_models)
+    except Exception as e:
+        connection.send(("error", _picklable_exception(e)))
+        return
+    connection.send(("ok", None))
+
+    segments: Dict[str, SharedMemory] = {}
+
+    def segment(name: str) -> SharedMemory:
+        # spawnで起動したワーカーは親プロセスのresource_trackerを共有するので、
+        # 開いた共有メモリは親プロセスがunlinkしたときに登録も消える
+        if name not in segments:
+            segments[name] = SharedMemory(name=name)
+        return segments[name]
+
+    try:
+        while True:
+            message = connection.recv()
+            if message is None:
+                break
+            method, kwargs, arrays, output = message
+            try:
+                if method in _ARRAY_ARGS:
+                    input_segment = segment(arrays[0])
+                    for key, offset, shape, dtype in arrays[1]:
+                        kwargs[key] = np.ndarray(
+                            shape, dtype=dtype, buffer=input_segment.buf, offset=offset
+                        )
+                    result = getattr(core, method)(**kwargs)
+                    output_name, shape = output
+                    np.ndarray(
+                        shape, dtype=np.float32, buffer=segment(output_name).buf
+                    )[...] = result
+                    result = None
+                else:
+                    result = getattr(core, method)(**kwargs)
+            except Exception as e:
+                connection.send(("error", _picklable_exception(e)))
+            else:
+                connection.send(("ok", result))
+            finally:
+                # 共有メモリを閉じられるように配列への参照を捨てる
+                kwargs = None
+    finally:
+        for shm in segments.values():
+            shm.close()
+
+
+def _picklable_exception(e: Exception) -> Exception:
+    if isinstance(e, (CoreError, OldCoreError)):
+        return e
+    return RuntimeError(f"{type(e).__name__}: {e}")
+
+
+class CoreProcessSession:
+    """
+    ワーカープロセスで読み込まれたコアを、CoreWrapperと同じメソッドで呼び出す
+    配列は呼び出しごとにpickleせず、ワーカーと共有するメモリに書き込んで受け渡す
+    1つのセッションは同時に1つの呼び出ししか処理しないので、並列に呼び出す場合はCoreSchedulerを通す
+    """
+
+    def __init__(
+        self,
+        context,
+        use_gpu: bool,
+        core_dir: Path,
+        cpu_num_threads: int,
+        load_all_models: bool,
+    ):
+        self._connection, child_connection = context.Pipe()
+        self._process = context.Process(
+            target=_worker_main,
+            args=(
+                child_connection,
+                use_gpu,
+                core_dir,
+                cpu_num_threads,
+                load_all_models,
+            ),
+            daemon=True,
+        )
+        self._process.start()
+        child_connection.close()
+        self._lock = threading.Lock()
+        self._input: Optional[SharedMemory] = None
+        self._output: Optional[SharedMemory] = None
+        self._retired: List[SharedMemory] = []
+
+    def wait_ready(self) -> None:
+        """
+        ワーカーでコアの初期化が終わるまで待つ。失敗した場合は例外を送出する
+        """
+        self._receive()
+
+    def _receive(self) -> Any:
+        try:
+            status, value = self._connection.recv()
+        except EOFError:
+            raise RuntimeError("コアのワーカープロセスが終了しました")
+        if status == "error":
+            raise value
+        return value
+
+    def _reserve(self, shm: Optional[SharedMemory], size: int) -> SharedMemory:
+        """
+        size バイト以上の共有メモリを返す。足りない場合は倍以上の大きさで作り直す
+        """
+        if shm is not None and shm.size >= size:
+            return shm
+        if shm is not None:
+            # ワーカーが古い共有メモリを開いたままなので、終了時にまとめて破棄する
+            self._retired.append(shm)
+        capacity = max(size, 2 * shm.size if shm is not None else _ALIGNMENT)
+        return SharedMemory(create=True, size=capacity)
+
+    def _call(self, method: str, **kwargs) -> Any:
+        with self._lock:
+            self._connection.send((method, kwargs, None, None))
+            return self._receive()
+
+    def _forward(self, method: str, kwargs: Dict[str, Any]) -> np.ndarray:
+        # ワーカーのCoreWrapperには渡さず、共有メモリの出力をここへコピーする
+        out = kwargs.pop("out", None)
+        with self._lock:
+            inputs = [
+                np.ascontiguousarray(kwargs.pop(key)) for key in _ARRAY_ARGS[method]
+            ]
+            offsets = []
+            size = 0
+            for array in inputs:
+                offsets.append(size)
+                size = _align(size + array.nbytes)
+            self._input = self._reserve(self._input, size)
+            specs = []
+            for key, array, offset in zip(_ARRAY_ARGS[method], inputs, offsets):
+                np.ndarray(
+                    array.shape,
+                    dtype=array.dtype,
+                    buffer=self._input.buf,
+                    offset=offset,
+                )[...] = array
+                specs.append((key, offset, array.shape, array.dtype.str))
+
+            shape = _output_shape(method, {**kwargs, "style_id": inputs[-1]})
+            if out is not None and (
+                out.shape != shape
+                or out.dtype != np.float32
+                or not out.flags.c_contiguous
+            ):
+                raise ValueError(f"outの形または型が{method}の出力と一致しません")
+            output_bytes = int(np.prod(shape)) * np.dtype(np.float32).itemsize
+            self._output = self._reserve(self._output, output_bytes)
+
+            self._connection.send(
+                (
+                    method,
+                    kwargs,
+                    (self._input.name, specs),
+                    (self._output.name, shape),
+                )
+            )
+            self._receive()
+            # 共有メモリは次の呼び出しで上書きされるのでコピーして返す
+            result = np.ndarray(shape, dtype=np.float32, buffer=self._output.buf)
+            if out is None:
+                return result.copy()
+            out[...] = result
+            return out
+
+    def yukarin_s_forward(self, **kwargs) -> np.ndarray:
+        return self._forward("yukarin_s_forward", kwargs)
+
+    def yukarin_sa_forward(self, **kwargs) -> np.ndarray:
+        return self._forward("yukarin_sa_forward", kwargs)
+
+    def decode_forward(self, **kwargs) -> np.ndarray:
+        return self._forward("decode_forward", kwargs)
+
+    def metas(self) -> str:
+        return self._call("metas")
+
+    def supported_devices(self) -> str:
+        return self._call("supported_devices")
+
+    def load_model(self, style_id: int) -> None:
+        return self._call("load_model", style_id=style_id)
+
+    def is_model_loaded(self, style_id: int) -> bool:
+        return self._call("is_model_loaded", style_id=style_id)
+
+    def finalize(self) -> None:
+        return self._call("finalize")
+
+    def close(self) -> None:
+        """
+        ワーカープロセスを終了し、共有メモリを破棄する
+        """
+        with self._lock:
+            if self._process.is_alive():
+                try:
+                    self._connection.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+                self._process.join(timeout=10)
+                if self._process.is_alive():
+                    self._process.terminate()
+                    self._process.join()
+            self._connection.close()
+            for shm in [self._input, self._output, *self._retired]:
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+            self._input = None
+            self._output = None
+            self._retired = []
+
+
+class CoreProcessPool:
+    """
+    num_workers個のプロセスでそれぞれコアを読み込む
+    sessionsをSynthesisEngineのextra_sessionsなどでCoreSchedulerに渡すと、
+    プロセスの数だけ推論を並列に実行できる
+    """
+
+    def __init__(
+        self,
+        use_gpu: bool,
+        core_dir: Path,
+        num_workers: int,
+        cpu_num_threads: int = 0,
+        load_all_models: bool = False,
+    ):
+        """
+        Parameters
+        ----------
+        use_gpu : bool
+            GPUを使うかどうか
+        core_dir : Path
+            コアのディレクトリ
+        num_workers : int
+            ワーカープロセスの数
+        cpu_num_threads : int
+            各ワーカーでコアが使うスレッド数。0の場合はコアの既定値
+            プロセス数を増やす場合は、合計がCPUのコア数を超えないように小さくする
+        load_all_models : bool
+            各ワーカーで全てのモデルを読み込むかどうか
+        """
+        if num_workers < 1:
+            raise ValueError("num_workersは1以上である必要があります")
+        # コアやonnxruntimeのスレッドをforkで複製しないようにspawnで起動する
+        context = multiprocessing.get_context("spawn")
+        self.sessions = [
+            CoreProcessSession(
+                context, use_gpu, core_dir, cpu_num_threads, load_all_models
+            )
+            for _ in range(num_workers)
+        ]
+        try:
+            for session in self.sessions:
+                session.wait_ready()
+        except Exception:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        for session in self.sessions:
+            session.close()
+
+    def __enter__(self) -> "CoreProcessPool":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,252 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .core_wrapper import OldCoreError
+
+# 値が小さいほど先に実行される。音素長・音高の推論は短時間で終わるので、
+# 待っている波形生成より先に実行して、後から来た短いリクエストが待たされないようにする
+PRIORITY_YUKARIN_S = 0
+PRIORITY_YUKARIN_SA = 0
+PRIORITY_DECODE = 1
+
+_PRIORITIES = {
+    "yukarin_s_forward": PRIORITY_YUKARIN_S,
+    "yukarin_sa_forward": PRIORITY_YUKARIN_SA,
+    "decode_forward": PRIORITY_DECODE,
+}
+
+# 入力が同じなら実行中・待機中のタスクの結果を共有できる推論
+# decode_forwardは入力が大きく、同じ入力が重なることもまれなので対象にしない
+_COALESCIBLE = ("yukarin_s_forward", "yukarin_sa_forward")
+
+
+def _request_key(method: str, kwargs: Dict[str, Any]) -> Hashable:
+    """
+    推論の種類と引数から、入力が同じリクエストを見分けるためのキーを作る
+    """
+    return (method,) + tuple(
+        (name, value.dtype.str, value.shape, value.tobytes())
+        if isinstance(value, np.ndarray)
+        else (name, value)
+        for name, value in sorted(kwargs.items())
+    )
+
+
+class _Task:
+    __slots__ = ("method", "kwargs", "future", "enqueued_at", "key", "followers")
+
+    def __init__(
+        self, method: str, kwargs: Dict[str, Any], key: Optional[Hashable] = None
+    ):
+        self.method = method
+        self.kwargs = kwargs
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+        self.key = key
+        # 同じ入力で後から投入され、このタスクの結果を受け取るFuture
+        self.followers: List[Future] = []
+
+
+class CoreScheduler:
+    """
+    コアの推論(yukarin_s_forward・yukarin_sa_forward・decode_forward)を優先度付きキューに入れ、
+    セッションごとのワーカースレッドで実行する
+    セッションはCoreWrapperと同じメソッドを持つオブジェクトで、1つのセッションは同時に1つの推論しか実行しない
+    同じプロセスで同じコアを複数回読み込んでも実体は1つなので、並列に推論するには
+    別プロセスで動くセッションを渡す
+    """
+
+    def __init__(self, sessions: Sequence[Any], coalesce: bool = False):
+        """
+        Parameters
+        ----------
+        sessions : Sequence[Any]
+            推論に使うセッション。CoreWrapperと同じメソッドを持つ必要がある
+        coalesce : bool
+            Trueの場合、yukarin_s_forward・yukarin_sa_forwardを投入したときに
+            入力が同じタスクが待機中または実行中であれば、新しく実行せずにその結果の複製を返す
+        """
+        if len(sessions) == 0:
+            raise ValueError("セッションが1つ以上必要です")
+        self.sessions = list(sessions)
+
+        # (優先度, 到着順, タスク)のヒープ
+        self._queue: List[Tuple[int, int, _Task]] = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+        # セッションごとに、推論とモデルの読み込みが同時に行われないようにする
+        self._session_locks = [threading.Lock() for _ in self.sessions]
+        self.coalesce = coalesce
+        # 待機中・実行中で、結果を共有できるタスク
+        self._in_flight: Dict[Hashable, _Task] = {}
+
+        self._executed: Dict[str, int] = {method: 0 for method in _PRIORITIES}
+        self._total_wait: Dict[str, float] = {method: 0.0 for method in _PRIORITIES}
+        self._max_wait: Dict[str, float] = {method: 0.0 for method in _PRIORITIES}
+        self._coalesced: Dict[str, int] = {method: 0 for method in _PRIORITIES}
+
+        self._workers = [
+            threading.Thread(target=self._work, args=(i,), daemon=True)
+            for i in range(len(self.sessions))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, method: str, **kwargs) -> Future:
+        """
+        推論をキューに入れ、結果を受け取るFutureを返す
+        複数の推論をまとめて投入すると、空いているセッションで並列に実行される
+        Parameters
+        ----------
+        method : str
+            yukarin_s_forward・yukarin_sa_forward・decode_forwardのいずれか
+        kwargs
+            CoreWrapperの同名のメソッドに渡す引数
+        """
+        key = (
+            _request_key(method, kwargs)
+            if self.coalesce and method in _COALESCIBLE
+            else None
+        )
+        task = _Task(method, kwargs, key)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("CoreSchedulerは終了しています")
+            if key is not None:
+                in_flight = self._in_flight.get(key)
+                if in_flight is not None:
+                    self._coalesced[method] += 1
+                    in_flight.followers.append(task.future)
+                    return task.future
+                self._in_flight[key] = task
+            heapq.heappush(
+                self._queue, (_PRIORITIES[method], next(self._counter), task)
+            )
+            self._condition.notify()
+        return task.future
+
+    def _submit(self, method: str, kwargs: Dict[str, Any]) -> np.ndarray:
+        return self.submit(method, **kwargs).result()
+
+    def _work(self, session_index: int) -> None:
+        session = self.sessions[session_index]
+        session_lock = self._session_locks[session_index]
+        while True:
+            with self._condition:
+                while len(self._queue) == 0:
+                    if self._closed:
+                        return
+                    self._condition.wait()
+                _, _, task = heapq.heappop(self._queue)
+                wait = time.perf_counter() - task.enqueued_at
+                self._executed[task.method] += 1
+                self._total_wait[task.method] += wait
+                self._max_wait[task.method] = max(self._max_wait[task.method], wait)
+
+            try:
+                with session_lock:
+                    result = getattr(session, task.method)(**task.kwargs)
+            except Exception as e:
+                self._finish_followers(task, exception=e)
+                task.future.set_exception(e)
+            else:
+                self._finish_followers(task, result=result)
+                task.future.set_result(result)
+
+    def _finish_followers(
+        self,
+        task: _Task,
+        result: Optional[np.ndarray] = None,
+        exception: Optional[Exception] = None,
+    ) -> None:
+        """
+        結果を共有していたFutureに結果を渡す
+        呼び出し元が結果を書き換えても影響しないように、それぞれに複製を渡す
+        """
+        if task.key is None:
+            return
+        with self._condition:
+            # これ以降に同じ入力で投入されたタスクは新しく実行される
+            del self._in_flight[task.key]
+        for follower in task.followers:
+            if exception is not None:
+                follower.set_exception(exception)
+            else:
+                follower.set_result(result.copy())
+
+    def yukarin_s_forward(self, **kwargs) -> np.ndarray:
+        return self._submit("yukarin_s_forward", kwargs)
+
+    def yukarin_sa_forward(self, **kwargs) -> np.ndarray:
+        return self._submit("yukarin_sa_forward", kwargs)
+
+    def decode_forward(self, **kwargs) -> np.ndarray:
+        return self._submit("decode_forward", kwargs)
+
+    def load_model(self, style_id: int) -> None:
+        """
+        全てのセッションでモデルを読み込む
+        CoreWrapper.load_modelは読み込みに成功してもOldCoreErrorを送出することがあるので、
+        その場合も残りのセッションで読み込んでから送出する
+        """
+        old_core_error = None
+        for session, session_lock in zip(self.sessions, self._session_locks):
+            with session_lock:
+                try:
+                    session.load_model(style_id)
+                except OldCoreError as e:
+                    old_core_error = e
+        if old_core_error is not None:
+            raise old_core_error
+
+    def is_model_loaded(self, style_id: int) -> bool:
+        """
+        全てのセッションでモデルが読み込まれているかどうかを返す
+        """
+        for session, session_lock in zip(self.sessions, self._session_locks):
+            with session_lock:
+                if not session.is_model_loaded(style_id):
+                    return False
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        キューに残っているタスク数と、推論の種類ごとの実行回数・平均待ち時間・最大待ち時間(秒)、
+        他のタスクの結果を共有した回数を返す
+        """
+        with self._condition:
+            queue_depth = {method: 0 for method in _PRIORITIES}
+            for _, _, task in self._queue:
+                queue_depth[task.method] += 1
+            return {
+                "sessions": len(self.sessions),
+                "queue_depth": queue_depth,
+                "executed": dict(self._executed),
+                "mean_wait": {
+                    method: (
+                        self._total_wait[method] / self._executed[method]
+                        if self._executed[method]
+                        else 0.0
+                    )
+                    for method in _PRIORITIES
+                },
+                "max_wait": dict(self._max_wait),
+                "coalesced": dict(self._coalesced),
+            }
+
+    def shutdown(self) -> None:
+        """
+        キューに残っているタスクを実行してから終了する
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        for worker in self._workers:
+            worker.join()
@@ -1,11 +1,12 @@
 import os
 import platform
+import threading
 from ctypes import CDLL, POINTER, c_bool, c_char_p, c_float, c_int, c_long
 from ctypes.util import find_library
 from dataclasses import dataclass
 from enum import Enum, auto
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 import numpy as np
 
@@ -348,6 +349,72 @@ def load_core(core_dir: Path, use_gpu: bool) -> CDLL:
         raise RuntimeError(f"このコンピュータのアーキテクチャ {platform.machine()} で利用可能なコアがありません")
 
 
+class OutputBufferPool:
+    """
+    コアの出力を書き込むfloat32のバッファを、2の累乗の大きさごとに使い回す
+    acquireで受け取った配列は、使い終わったらreleaseで返す
+    """
+
+    def __init__(self, min_size: int = 1 << 16, max_buffers_per_size: int = 4):
+        """
+        Parameters
+        ----------
+        min_size : int
+            確保するバッファの最小の要素数
+        max_buffers_per_size : int
+            大きさごとに保持する空きバッファの数の上限
+        """
+        self.min_size = min_size
+        self.max_buffers_per_size = max_buffers_per_size
+        self._free: Dict[int, List[np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self.allocations = 0
+        self.reuses = 0
+
+    def _size_class(self, length: int) -> int:
+        size = self.min_size
+        while size < length:
+            size <<= 1
+        return size
+
+    def acquire(self, length: int) -> np.ndarray:
+        """
+        要素数lengthのfloat32の配列を返す。中身は初期化されていない
+        """
+        size = self._size_class(length)
+        with self._lock:
+            free = self._free.get(size)
+            if free:
+                self.reuses += 1
+                return free.pop()[:length]
+            self.allocations += 1
+        return np.empty((size,), dtype=np.float32)[:length]
+
+    def release(self, array: np.ndarray) -> None:
+        """
+        acquireで受け取った配列を返す。返した後の配列は使ってはいけない
+        """
+        buffer = array.base if array.base is not None else array
+        size = len(buffer)
+        if size != self._size_class(size):
+            return
+        with self._lock:
+            free = self._free.setdefault(size, [])
+            if len(free) < self.max_buffers_per_size:
+                free.append(buffer)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "allocations": self.allocations,
+                "reuses": self.reuses,
+                "free_buffers": sum(len(free) for free in self._free.values()),
+                "free_bytes": sum(
+                    buffer.nbytes for free in self._free.values() for buffer in free
+                ),
+            }
+
+
 class CoreWrapper:
     def __init__(
         self,
@@ -358,6 +425,7 @@ class CoreWrapper:
     ) -> None:
 
         self.core = load_core(core_dir, use_gpu)
+        self.output_buffers = OutputBufferPool()
 
         self.core.initialize.restype = c_bool
         self.core.metas.restype = c_char_p
@@ -496,8 +564,22 @@ class CoreWrapper:
         f0: np.ndarray,
         phoneme: np.ndarray,
         style_id: np.ndarray,
+        out: Optional[np.ndarray] = None,
     ) -> np.ndarray:
-        output = np.empty((length * 256,), dtype=np.float32)
+        """
+        outを指定した場合は、新しく確保せずにoutへ波形を書き込んで返す
+        outは要素数length * 256のC連続なfloat32の配列である必要がある
+        """
+        if out is None:
+            output = np.empty((length * 256,), dtype=np.float32)
+        else:
+            if (
+                out.shape != (length * 256,)
+                or out.dtype != np.float32
+                or not out.flags.c_contiguous
+            ):
+                raise ValueError("outの形または型がdecode_forwardの出力と一致しません")
+            output = out
         self.assert_core_success(
             self.core.decode_forward(
                 c_int(length),
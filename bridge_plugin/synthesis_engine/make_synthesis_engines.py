@@ -1,6 +1,6 @@
 import sys
 import traceback
-from typing import Dict
+from typing import Dict, Iterable, Optional
 
 from ..bridge_config import BridgeConfigLoader
 from .synthesis_engine_base import SynthesisEngineBase
@@ -12,6 +12,12 @@ def make_synthesis_engines(
     bridge_config_loader: BridgeConfigLoader,
     enable_mock: bool = True,
     load_all_models: bool = False,
+    tts_batch_window: float = 0.0,
+    tts_max_batch_size: int = 1,
+    tts_batch_workers: Optional[int] = None,
+    max_loaded_models: Optional[int] = None,
+    model_memory_budget: Optional[int] = None,
+    pinned_style_ids: Iterable[int] = (),
 ) -> Dict[str, SynthesisEngineBase]:
     synthesis_engines = {}
     try:
@@ -19,6 +25,12 @@ def make_synthesis_engines(
             bridge_config_loader=bridge_config_loader,
             use_gpu=use_gpu,
             load_all_models=load_all_models,
+            tts_batch_window=tts_batch_window,
+            tts_max_batch_size=tts_max_batch_size,
+            tts_batch_workers=tts_batch_workers,
+            max_loaded_models=max_loaded_models,
+            model_memory_budget=model_memory_budget,
+            pinned_style_ids=pinned_style_ids,
         )
         synthesis_engines[_synthesis_engine.engine_version] = _synthesis_engine
     except Exception:
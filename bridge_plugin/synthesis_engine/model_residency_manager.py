@@ -0,0 +1,193 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+# 読み込み時間のヒストグラムの区切り(秒)
+LOAD_TIME_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+
+class ModelResidencyManager:
+    """
+    読み込んだモデルをキーごとに保持し、件数・メモリ使用量の上限を超えた場合は
+    最も長く使われていないものから破棄するLRU
+    ピン留めされたキーのモデルは破棄されない
+    """
+
+    def __init__(
+        self,
+        max_models: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        size_of: Optional[Callable[[Any], int]] = None,
+        on_evict: Optional[Callable[[Hashable, Any], None]] = None,
+        pinned: Iterable[Hashable] = (),
+    ):
+        """
+        Parameters
+        ----------
+        max_models : Optional[int]
+            保持するモデル数の上限。Noneの場合は制限しない
+        max_bytes : Optional[int]
+            保持するモデルのメモリ使用量の上限。Noneの場合は制限しない
+        size_of : Optional[Callable[[Any], int]]
+            モデルのメモリ使用量(バイト)を見積もる関数。Noneの場合は0とみなす
+        on_evict : Optional[Callable[[Hashable, Any], None]]
+            モデルが破棄されたときに(キー, モデル)を引数に呼ばれる関数
+        pinned : Iterable[Hashable]
+            破棄しないキー
+        """
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.pinned = set(pinned)
+        self._size_of = size_of
+        self._on_evict = on_evict
+
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.total_bytes = 0
+        self.total_load_time = 0.0
+        self._load_time_counts = [0] * (len(LOAD_TIME_BUCKETS) + 1)
+
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 同じキーのモデルが複数のスレッドから同時に読み込まれないようにする
+        self._load_locks: Dict[Hashable, threading.Lock] = {}
+
+    def get(self, key: Hashable, load: Callable[[], Any], reload: bool = False) -> Any:
+        """
+        キーのモデルを返す。保持していない場合はloadで読み込み、上限を超えた分を破棄する
+        Parameters
+        ----------
+        key : Hashable
+            モデルのキー
+        load : Callable[[], Any]
+            モデルを読み込む関数
+        reload : bool
+            Trueの場合、保持しているモデルがあっても読み込み直す
+        Returns
+        -------
+        model : Any
+            モデル
+        """
+        with self._lock:
+            if not reload and key in self._entries:
+                return self._touch(key)
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            if not reload:
+                with self._lock:
+                    # 待っている間に他のスレッドが読み込んだ場合
+                    if key in self._entries:
+                        return self._touch(key)
+
+            start = time.perf_counter()
+            model = load()
+            elapsed = time.perf_counter() - start
+            size = self._size_of(model) if self._size_of is not None else 0
+
+            with self._lock:
+                old_entry = self._entries.pop(key, None)
+                if old_entry is not None:
+                    self.total_bytes -= old_entry[1]
+                self._entries[key] = (model, size)
+                self.total_bytes += size
+                self.loads += 1
+                self._record_load_time(elapsed)
+                evicted = self._evict_over_budget(keep=key)
+
+        if self._on_evict is not None:
+            for evicted_key, evicted_model in evicted:
+                self._on_evict(evicted_key, evicted_model)
+        return model
+
+    def _touch(self, key: Hashable) -> Any:
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return self._entries[key][0]
+
+    def _record_load_time(self, elapsed: float) -> None:
+        self.total_load_time += elapsed
+        for i, bound in enumerate(LOAD_TIME_BUCKETS):
+            if elapsed <= bound:
+                self._load_time_counts[i] += 1
+                return
+        self._load_time_counts[-1] += 1
+
+    def has_room(self) -> bool:
+        """
+        保持しているモデルが件数・メモリ使用量の上限に達していなければTrueを返す
+        """
+        with self._lock:
+            return (
+                self.max_models is None or len(self._entries) < self.max_models
+            ) and (self.max_bytes is None or self.total_bytes < self.max_bytes)
+
+    def _over_budget(self) -> bool:
+        return (
+            self.max_models is not None and len(self._entries) > self.max_models
+        ) or (self.max_bytes is not None and self.total_bytes > self.max_bytes)
+
+    def _evict_over_budget(self, keep: Hashable) -> List[Tuple[Hashable, Any]]:
+        """
+        上限を下回るまで古いものから破棄する
+        ピン留めされたものと読み込んだばかりのものは破棄しないので、それらだけで上限を超える場合は超えたままになる
+        """
+        evicted = []
+        for key in list(self._entries):
+            if not self._over_budget():
+                break
+            if key == keep or key in self.pinned:
+                continue
+            model, size = self._entries.pop(key)
+            self.total_bytes -= size
+            self.evictions += 1
+            evicted.append((key, model))
+        return evicted
+
+    def evict(self, key: Hashable) -> bool:
+        """
+        キーのモデルを破棄する。ピン留めされていても破棄する
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return False
+            self.total_bytes -= entry[1]
+            self.evictions += 1
+        if self._on_evict is not None:
+            self._on_evict(key, entry[0])
+        return True
+
+    def clear(self) -> None:
+        """
+        全てのモデルを破棄する。on_evictは呼ばれず、カウンタは維持する
+        """
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            histogram = {
+                f"<={bound}s": count
+                for bound, count in zip(LOAD_TIME_BUCKETS, self._load_time_counts)
+            }
+            histogram[f">{LOAD_TIME_BUCKETS[-1]}s"] = self._load_time_counts[-1]
+            return {
+                "models": len(self._entries),
+                "bytes": self.total_bytes,
+                "pinned": len(self.pinned),
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "total_load_time": self.total_load_time,
+                "load_time_histogram": histogram,
+            }
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,155 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class RequestBatcher:
+    """
+    同じキーのリクエストをbatch_window秒まで待ってまとめ、
+    最大max_batch_size件ずつ一括で推論する
+    """
+
+    def __init__(
+        self,
+        batch_window: float,
+        max_batch_size: int,
+        num_workers: int = 1,
+    ):
+        """
+        Parameters
+        ----------
+        batch_window : float
+            最初のリクエストが届いてから一括推論を始めるまでに待つ最大の時間(秒)
+        max_batch_size : int
+            1回の一括推論で処理するリクエスト数の上限。上限に達した場合は待たずに推論する
+        num_workers : int
+            一括推論を並行して行うスレッド数
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_sizeは1以上である必要があります")
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+
+        self._condition = threading.Condition()
+        # キーごとの(到着時刻, 一括推論を行う関数, [(入力, 結果)])
+        self._pending: Dict[
+            Hashable,
+            Tuple[float, Callable, List[Tuple[Any, Future]]],
+        ] = {}
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=num_workers)
+
+        self.batches = 0
+        self.requests = 0
+
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def infer(
+        self,
+        key: Hashable,
+        item: Any,
+        run_batch: Callable[[List[Any]], List[Any]],
+    ) -> Any:
+        """
+        入力をキューに入れ、一括推論の結果のうち自分の分を返す
+        Parameters
+        ----------
+        key : Hashable
+            一緒に推論できるリクエストを表すキー
+        item : Any
+            入力(Text2SpeechBatcherではトークンID列)
+        run_batch : Callable[[List[Any]], List[Any]]
+            入力のリストから、同じ順番の結果のリストを生成する関数
+            同じキーのリクエストのうち、最初に届いたものの関数が使われる
+        Returns
+        -------
+        result : Any
+            run_batchが返した、この入力に対する結果
+        """
+        future: Future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError(f"{type(self).__name__}は終了しています")
+            if key not in self._pending:
+                self._pending[key] = (time.monotonic(), run_batch, [])
+            self._pending[key][2].append((item, future))
+            self._condition.notify()
+        return future.result()
+
+    def _take_ready_batches(
+        self,
+    ) -> Tuple[List[Tuple[Callable, List[Tuple[Any, Future]]]], Optional[float]]:
+        """
+        推論を始めるべきバッチを取り出し、次に待つべき時間とともに返す
+        """
+        now = time.monotonic()
+        ready = []
+        timeout: Optional[float] = None
+        for key in list(self._pending):
+            arrived, run_batch, items = self._pending[key]
+            if len(items) >= self.max_batch_size or now >= arrived + self.batch_window:
+                ready.append((run_batch, items[: self.max_batch_size]))
+                rest = items[self.max_batch_size :]
+                if len(rest) == 0:
+                    del self._pending[key]
+                    continue
+                # 溢れた分は次のバッチとして、待ち時間を数え直す
+                arrived = now
+                self._pending[key] = (arrived, run_batch, rest)
+            wait = arrived + self.batch_window - now
+            timeout = wait if timeout is None else min(timeout, wait)
+        return ready, timeout
+
+    def _dispatch(self) -> None:
+        while True:
+            with self._condition:
+                ready, timeout = self._take_ready_batches()
+                while len(ready) == 0:
+                    if self._closed and len(self._pending) == 0:
+                        return
+                    self._condition.wait(timeout)
+                    ready, timeout = self._take_ready_batches()
+                for _, items in ready:
+                    self.batches += 1
+                    self.requests += len(items)
+            for run_batch, items in ready:
+                self._executor.submit(self._run_batch, run_batch, items)
+
+    @staticmethod
+    def _run_batch(
+        run_batch: Callable[[List[Any]], List[Any]],
+        items: List[Tuple[Any, Future]],
+    ) -> None:
+        try:
+            results = run_batch([item for item, _ in items])
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(items, results):
+            future.set_result(result)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        一括推論の回数・リクエスト数・平均バッチサイズを返す
+        """
+        with self._condition:
+            batches = self.batches
+            requests = self.requests
+        return {
+            "batches": batches,
+            "requests": requests,
+            "mean_batch_size": requests / batches if batches else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        """
+        キューに残っているリクエストを処理してから終了する
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
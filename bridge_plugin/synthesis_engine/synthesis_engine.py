@@ -1,14 +1,16 @@
 import threading
+import uuid
 from itertools import chain
-from typing import List, Optional, Tuple
+from typing import Any, Iterator, List, Optional, Sequence, Set, Tuple
 
 import numpy
-from scipy.signal import resample
 
 from ..acoustic_feature_extractor import OjtPhoneme
 from ..model import AccentPhrase, AudioQuery, Mora
+from ..utility import StreamingResampler, resample_wave
+from .core_scheduler import CoreScheduler
 from .core_wrapper import CoreWrapper, OldCoreError
-from .synthesis_engine_base import SynthesisEngineBase
+from .synthesis_engine_base import SynthesisEngineBase, apply_intonation
 
 unvoiced_mora_phoneme_list = ["A", "I", "U", "E", "O", "cl", "pau"]
 mora_phoneme_list = ["a", "i", "u", "e", "o", "N"] + unvoiced_mora_phoneme_list
@@ -178,14 +180,9 @@ def generate_frame_scale_features(
     # 音高(ピッチ)の調節を適用する(2のPitch Scale乗を掛ける)
     f0 *= 2**query.pitchScale
 
-    # 有声音素(音高(ピッチ)が0より大きいもの)か否かを抽出する
-    voiced = f0 > 0
-    # 有声音素の音高(ピッチ)の平均値を求める
-    mean_f0 = f0[voiced].mean()
-    # 平均値がNaNではないとき、抑揚を適用する
+    # 有声音素(音高(ピッチ)が0より大きいもの)があるとき、抑揚を適用する
     # 抑揚は音高と音高の平均値の差に抑揚を掛けたもの((f0 - mean_f0) * Intonation Scale)に抑揚の平均値(mean_f0)を足したもの
-    if not numpy.isnan(mean_f0):
-        f0[voiced] = (f0[voiced] - mean_f0) * query.intonationScale + mean_f0
+    f0 = apply_intonation(f0, query.intonationScale)
 
     # OjtPhonemeの形に分解された音素リストから、vowel(母音)の位置を抜き出し、numpyのarrayにする
     _, _, vowel_indexes_data = split_mora(phoneme_data_list)
@@ -213,10 +210,100 @@ def generate_frame_scale_features(
     return phoneme, f0
 
 
+def split_frames_at_pauses(
+    phoneme: numpy.ndarray,
+    max_segment_frames: Optional[int],
+    overlap_frames: int,
+) -> List[Tuple[int, int]]:
+    """
+    フレームごとの音素onehotベクトル列を、文中のpauが続く区間の中央で分割する
+    各分割がなるべくmax_segment_frames以下になるように、収まる範囲で最も後ろの区切りを選ぶ
+    前後の分割と重ねてデコードするため、pauが2 * overlap_frames以上続く区間でのみ区切る
+    Parameters
+    ----------
+    phoneme : numpy.ndarray
+        フレームごとの音素onehotベクトル列
+    max_segment_frames : Optional[int]
+        分割の目安のフレーム数。Noneの場合は分割しない
+    overlap_frames : int
+        前後の分割と重ねるフレーム数
+    Returns
+    -------
+    segments : List[Tuple[int, int]]
+        分割ごとの(開始フレーム, 終了フレーム)。連結すると全体になる
+    """
+    length = len(phoneme)
+    if max_segment_frames is None or length <= max_segment_frames:
+        return [(0, length)]
+
+    pau = phoneme[:, OjtPhoneme.phoneme_list.index(OjtPhoneme.space_phoneme)] == 1
+    edges = numpy.diff(numpy.r_[0, pau.astype(numpy.int8), 0])
+    run_starts = numpy.flatnonzero(edges == 1)
+    run_ends = numpy.flatnonzero(edges == -1)
+    min_run = max(2 * overlap_frames, 1)
+    # 前後の無音(prePhonemeLength・postPhonemeLength)では区切らない
+    cuts = [
+        (start + end) // 2
+        for start, end in zip(run_starts, run_ends)
+        if end - start >= min_run and start > 0 and end < length
+    ]
+
+    boundaries = [0]
+    for i, cut in enumerate(cuts):
+        next_cut = cuts[i + 1] if i + 1 < len(cuts) else length
+        if (
+            next_cut - boundaries[-1] > max_segment_frames
+            and cut - boundaries[-1] >= min_run
+        ):
+            boundaries.append(cut)
+    boundaries.append(length)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def write_output(
+    wave: numpy.ndarray, volume_scale: float, stereo: bool
+) -> numpy.ndarray:
+    """
+    waveにゲインを掛けた出力を新しい配列に1回で書き込む。waveは書き換えない
+    Parameters
+    ----------
+    wave : numpy.ndarray
+        1次元の波形。プールから借りたバッファでもよい
+    volume_scale : float
+        ゲイン
+    stereo : bool
+        Trueの場合、(サンプル数, 2)のC連続な配列の両方のチャンネルに書き込む
+    Returns
+    -------
+    wave : numpy.ndarray
+        書き込み可能な出力
+    """
+    if not stereo:
+        return numpy.multiply(wave, volume_scale, dtype=wave.dtype)
+    # チャンネルの軸のストライドを0にしたビューなら複製せずに済むが、書き込めないか、
+    # 書き込むと両方のチャンネルが変わってしまう。呼び出し元が出力を加工できるように実体を確保する
+    output = numpy.empty((len(wave), 2), dtype=wave.dtype)
+    numpy.multiply(wave, volume_scale, out=output[:, 0])
+    output[:, 1] = output[:, 0]
+    return output
+
+
+def to_stereo(wave: numpy.ndarray) -> numpy.ndarray:
+    """
+    1次元の波形を、両方のチャンネルに同じ値を持つ(サンプル数, 2)のC連続な配列にする
+    """
+    return write_output(wave, 1, stereo=True)
+
+
 class SynthesisEngine(SynthesisEngineBase):
     def __init__(
         self,
         core: CoreWrapper,
+        extra_sessions: Sequence[Any] = (),
+        coalesce_requests: bool = False,
+        decode_segment_frames: Optional[int] = None,
+        decode_overlap_frames: int = 4,
+        engine_version: Optional[str] = None,
     ):
         """
         core.yukarin_s_forward: 音素列から、音素ごとの長さを求める関数
@@ -249,16 +336,48 @@ class SynthesisEngine(SynthesisEngineBase):
         supported_devices:
             coreから取得した対応デバイスに関するjsonデータの文字列
             Noneの場合はコアが情報の取得に対応していないため、対応デバイスは不明
+
+        extra_sessions:
+            coreに加えて推論に使う、coreと同じメソッドを持つセッション
+            推論はCoreSchedulerを通して空いているセッションで実行される
+
+        coalesce_requests:
+            Trueの場合、入力が同じyukarin_s_forward・yukarin_sa_forwardの呼び出しが同時に待っていれば1回だけ推論する
+            コアの関数は1回の呼び出しで1つの系列しか受け取れないので、異なる入力をパディングして1回で推論することはできない
+
+        decode_segment_frames:
+            長い文章をpauの位置で分割してデコードする場合の、分割の目安のフレーム数(1フレームは256サンプル)
+            分割はセッションが複数あれば並列にデコードされ、synthesis_streamでは先頭から順に返される
+            Noneの場合は分割しない
+
+        decode_overlap_frames:
+            分割したデコードを前後と重ねるフレーム数。重ねた部分はクロスフェードでつなぐ
+
+        engine_version:
+            エンジンのバージョン。アクセント句のキャッシュのキーに使う
+            Noneの場合はインスタンスごとに異なる値にし、キャッシュを他のエンジンと共有しても結果が混ざらないようにする
         """
         super().__init__()
         self.core = core
         self._speakers = self.core.metas()
+        # 推論はセッションごとに直列化されるので、ここではモデルの読み込みだけを排他する
         self.mutex = threading.Lock()
+        # 読み込み済みのスタイルID。コアへの問い合わせは実行中の推論が終わるまで待たされるので、
+        # 一度読み込んだスタイルはロックを取らずにここで判定する
+        self._loaded_style_ids: Set[int] = set()
+        self.scheduler = CoreScheduler(
+            [core, *extra_sessions], coalesce=coalesce_requests
+        )
+        self.decode_segment_frames = decode_segment_frames
+        self.decode_overlap_frames = decode_overlap_frames
         try:
             self._supported_devices = self.core.supported_devices()
         except OldCoreError:
             self._supported_devices = None
         self.default_sampling_rate = 24000
+        if engine_version is None:
+            engine_version = f"core-{uuid.uuid4().hex}"
+        self.engine_version = engine_version
 
     @property
     def speakers(self) -> str:
@@ -269,19 +388,28 @@ class SynthesisEngine(SynthesisEngineBase):
         return self._supported_devices
 
     def initialize_style_id_synthesis(self, style_id: int, skip_reinit: bool):
+        if skip_reinit and style_id in self._loaded_style_ids:
+            return
         try:
             with self.mutex:
                 # 以下の条件のいずれかを満たす場合, 初期化を実行する
                 # 1. 引数 skip_reinit が False の場合
                 # 2. 話者が初期化されていない場合
-                if (not skip_reinit) or (not self.core.is_model_loaded(style_id)):
-                    self.core.load_model(style_id)
+                if (not skip_reinit) or (not self.scheduler.is_model_loaded(style_id)):
+                    # モデルを読み直す場合、キャッシュされた音素長・音高は使えない
+                    # load_modelは読み込みに成功してもOldCoreErrorを送出することがあるので、読み込む前に消す
+                    if not skip_reinit and self.accent_phrase_cache is not None:
+                        self.accent_phrase_cache.clear()
+                    self.scheduler.load_model(style_id)
         except OldCoreError:
             pass  # コアが古い場合はどうしようもないので何もしない
+        self._loaded_style_ids.add(style_id)
 
     def is_initialized_style_id_synthesis(self, style_id: int) -> bool:
+        if style_id in self._loaded_style_ids:
+            return True
         try:
-            return self.core.is_model_loaded(style_id)
+            return self.scheduler.is_model_loaded(style_id)
         except OldCoreError:
             return True  # コアが古い場合はどうしようもないのでTrueを返す
 
@@ -315,12 +443,11 @@ class SynthesisEngine(SynthesisEngineBase):
             [p.phoneme_id for p in phoneme_data_list], dtype=numpy.int64
         )
         # Phoneme IDのリスト(phoneme_list_s)をyukarin_s_forwardにかけ、推論器によって適切な音素の長さを割り当てる
-        with self.mutex:
-            phoneme_length = self.core.yukarin_s_forward(
-                length=len(phoneme_list_s),
-                phoneme_list=phoneme_list_s,
-                style_id=numpy.array(style_id, dtype=numpy.int64).reshape(-1),
-            )
+        phoneme_length = self.scheduler.yukarin_s_forward(
+            length=len(phoneme_list_s),
+            phoneme_list=phoneme_list_s,
+            style_id=numpy.array(style_id, dtype=numpy.int64).reshape(-1),
+        )
 
         # yukarin_s_forwarderの結果をaccent_phrasesに反映する
         # flatten_moras変数に展開された値を変更することでコード量を削減しつつaccent_phrases内のデータを書き換えている
@@ -452,17 +579,16 @@ class SynthesisEngine(SynthesisEngineBase):
         )
 
         # 今までに生成された情報をyukarin_sa_forwardにかけ、推論器によってモーラごとに適切な音高(ピッチ)を割り当てる
-        with self.mutex:
-            f0_list = self.core.yukarin_sa_forward(
-                length=vowel_phoneme_list.shape[0],
-                vowel_phoneme_list=vowel_phoneme_list[numpy.newaxis],
-                consonant_phoneme_list=consonant_phoneme_list[numpy.newaxis],
-                start_accent_list=start_accent_list[numpy.newaxis],
-                end_accent_list=end_accent_list[numpy.newaxis],
-                start_accent_phrase_list=start_accent_phrase_list[numpy.newaxis],
-                end_accent_phrase_list=end_accent_phrase_list[numpy.newaxis],
-                style_id=numpy.array(style_id, dtype=numpy.int64).reshape(-1),
-            )[0]
+        f0_list = self.scheduler.yukarin_sa_forward(
+            length=vowel_phoneme_list.shape[0],
+            vowel_phoneme_list=vowel_phoneme_list[numpy.newaxis],
+            consonant_phoneme_list=consonant_phoneme_list[numpy.newaxis],
+            start_accent_list=start_accent_list[numpy.newaxis],
+            end_accent_list=end_accent_list[numpy.newaxis],
+            start_accent_phrase_list=start_accent_phrase_list[numpy.newaxis],
+            end_accent_phrase_list=end_accent_phrase_list[numpy.newaxis],
+            style_id=numpy.array(style_id, dtype=numpy.int64).reshape(-1),
+        )[0]
 
         # 無声母音を含むMoraに関しては、音高(ピッチ)を0にする
         for i, p in enumerate(vowel_phoneme_data_list):
@@ -476,6 +602,106 @@ class SynthesisEngine(SynthesisEngineBase):
 
         return accent_phrases
 
+    def _frame_scale_features(
+        self, query: AudioQuery, style_id: int
+    ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        モデルを読み込み、音声合成クエリからフレームごとの音素onehotベクトル列と音高を生成する
+        """
+        # モデルがロードされていない場合はロードする
+        self.initialize_style_id_synthesis(style_id, skip_reinit=True)
+        # phoneme
+        # AccentPhraseをすべてMoraおよびOjtPhonemeの形に分解し、処理可能な形にする
+        flatten_moras, phoneme_data_list = pre_process(query.accent_phrases)
+
+        return generate_frame_scale_features(query, flatten_moras, phoneme_data_list)
+
+    def _synthesis_stream_impl(
+        self,
+        query: AudioQuery,
+        style_id: int,
+        phoneme: Optional[numpy.ndarray] = None,
+        f0: Optional[numpy.ndarray] = None,
+    ) -> Iterator[numpy.ndarray]:
+        """
+        フレーム列をpauの位置で分割してデコードし、ゲイン・リサンプリング・ステレオ変換をして順に返す
+        decode_segment_framesがNoneの場合は全体を1回でデコードする
+        Parameters
+        ----------
+        query : AudioQuery
+            音声合成クエリ
+        style_id : int
+            スタイルID
+        phoneme : Optional[numpy.ndarray]
+            生成済みのフレームごとの音素onehotベクトル列。Noneの場合はqueryから生成する
+        f0 : Optional[numpy.ndarray]
+            生成済みのフレームごとの音高
+        Returns
+        -------
+        waves : Iterator[numpy.ndarray]
+            音声合成結果を先頭から分割したもの
+        """
+        if phoneme is None or f0 is None:
+            phoneme, f0 = self._frame_scale_features(query, style_id)
+
+        resampler = StreamingResampler(
+            self.default_sampling_rate, query.outputSamplingRate
+        )
+        for wave in self._decode_segments(phoneme, f0, style_id):
+            if query.volumeScale != 1:
+                wave *= query.volumeScale
+            wave = resampler.process(wave)
+            if len(wave) == 0:
+                continue
+            yield to_stereo(wave) if query.outputStereo else wave
+
+        # リサンプリングのフィルタに残っている末尾
+        wave = resampler.flush()
+        if len(wave) != 0:
+            yield to_stereo(wave) if query.outputStereo else wave
+
+    def _decode_segments(
+        self, phoneme: numpy.ndarray, f0: numpy.ndarray, style_id: int
+    ) -> Iterator[numpy.ndarray]:
+        """
+        分割ごとのデコードをまとめてスケジューラに投入し、終わったものから順に24kHzの波形を返す
+        各分割は前後にoverlap_framesずつ広げてデコードし、区切りの前後2 * overlap_framesを
+        線形のクロスフェードでつなぐ。区切りはpauの中央なので、重なる部分はほぼ無音になる
+        """
+        overlap = self.decode_overlap_frames
+        segments = split_frames_at_pauses(phoneme, self.decode_segment_frames, overlap)
+        style_id_array = numpy.array(style_id, dtype=numpy.int64).reshape(-1)
+
+        futures = []
+        for i, (start, end) in enumerate(segments):
+            decode_start = start - overlap if i > 0 else start
+            decode_end = end + overlap if i < len(segments) - 1 else end
+            futures.append(
+                self.scheduler.submit(
+                    "decode_forward",
+                    length=decode_end - decode_start,
+                    phoneme_size=phoneme.shape[1],
+                    f0=f0[decode_start:decode_end, numpy.newaxis],
+                    phoneme=phoneme[decode_start:decode_end],
+                    style_id=style_id_array,
+                )
+            )
+
+        crossfade_length = 2 * overlap * 256
+        fade_in = (numpy.arange(crossfade_length, dtype=numpy.float32) + 0.5) / (
+            crossfade_length
+        )
+        tail: Optional[numpy.ndarray] = None
+        for i, future in enumerate(futures):
+            wave = future.result()
+            if tail is not None:
+                wave[:crossfade_length] *= fade_in
+                wave[:crossfade_length] += tail * (1 - fade_in)
+            if i < len(futures) - 1 and crossfade_length > 0:
+                tail = wave[-crossfade_length:]
+                wave = wave[:-crossfade_length]
+            yield wave
+
     def _synthesis_impl(self, query: AudioQuery, style_id: int):
         """
         音声合成クエリから音声合成に必要な情報を構成し、実際に音声合成を行う
@@ -490,39 +716,44 @@ class SynthesisEngine(SynthesisEngineBase):
         wave : numpy.ndarray
             音声合成結果
         """
-        # モデルがロードされていない場合はロードする
-        self.initialize_style_id_synthesis(style_id, skip_reinit=True)
-        # phoneme
-        # AccentPhraseをすべてMoraおよびOjtPhonemeの形に分解し、処理可能な形にする
-        flatten_moras, phoneme_data_list = pre_process(query.accent_phrases)
+        phoneme, f0 = self._frame_scale_features(query, style_id)
 
-        phoneme, f0 = generate_frame_scale_features(
-            query, flatten_moras, phoneme_data_list
+        segments = split_frames_at_pauses(
+            phoneme, self.decode_segment_frames, self.decode_overlap_frames
         )
+        if len(segments) > 1:
+            return numpy.concatenate(
+                list(self._synthesis_stream_impl(query, style_id, phoneme, f0))
+            )
+
+        # デコード結果は使い回すバッファに書き込み、関数を抜けるときに必ずプールに戻す
+        # 返す配列は、ゲイン・リサンプリング・ステレオ変換で新しく作ったものにする
+        buffer = None
+        try:
+            buffer = self.core.output_buffers.acquire(phoneme.shape[0] * 256)
 
-        # 今まで生成された情報をdecode_forwardにかけ、推論器によって音声波形を生成する
-        with self.mutex:
-            wave = self.core.decode_forward(
+            # 今まで生成された情報をdecode_forwardにかけ、推論器によって音声波形を生成する
+            wave = self.scheduler.decode_forward(
                 length=phoneme.shape[0],
                 phoneme_size=phoneme.shape[1],
                 f0=f0[:, numpy.newaxis],
                 phoneme=phoneme,
                 style_id=numpy.array(style_id, dtype=numpy.int64).reshape(-1),
+                out=buffer,
             )
 
-        # volume: ゲイン適用
-        wave *= query.volumeScale
-
-        # 出力サンプリングレートがデフォルト(decode forwarderによるもの、24kHz)でなければ、それを適用する
-        if query.outputSamplingRate != self.default_sampling_rate:
-            wave = resample(
-                wave,
-                query.outputSamplingRate * len(wave) // self.default_sampling_rate,
-            )
-
-        # ステレオ変換
-        # 出力設定がステレオなのであれば、ステレオ化する
-        if query.outputStereo:
-            wave = numpy.array([wave, wave]).T
-
-        return wave
+            # 出力サンプリングレートがデフォルト(decode forwarderによるもの、24kHz)でなければ、それを適用する
+            if query.outputSamplingRate != self.default_sampling_rate:
+                # volume: ゲイン適用
+                if query.volumeScale != 1:
+                    wave *= query.volumeScale
+                wave = resample_wave(
+                    wave, self.default_sampling_rate, query.outputSamplingRate
+                )
+                return to_stereo(wave) if query.outputStereo else wave
+
+            # 24kHzのまま返す場合は、ゲインを掛けながらバッファから出力の配列に1回で書き込む
+            return write_output(wave, query.volumeScale, query.outputStereo)
+        finally:
+            if buffer is not None:
+                self.core.output_buffers.release(buffer)
@@ -1,23 +1,18 @@
 import copy
+import time
 from abc import ABCMeta, abstractmethod
-from typing import List, Optional
+from itertools import tee
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional, Tuple
 
 import numpy as np
 
-from .. import full_context_label
-from ..full_context_label import extract_full_context_label
+from ..accent_phrase_extractor import text_to_accent_phrases
 from ..model import AccentPhrase, AudioQuery, Mora
 from ..mora_list import openjtalk_mora2text
+from .accent_phrase_cache import AccentPhraseCache
 
-
-def mora_to_text(mora: str) -> str:
-    if mora[-1:] in ["A", "I", "U", "E", "O"]:
-        # 無声化母音を小文字に
-        mora = mora[:-1] + mora[-1].lower()
-    if mora in openjtalk_mora2text:
-        return openjtalk_mora2text[mora]
-    else:
-        return mora
+if TYPE_CHECKING:
+    from .accent_phrase_extractor_pool import AccentPhraseExtractorPool
 
 
 def adjust_interrogative_accent_phrases(
@@ -63,23 +58,41 @@ def make_interrogative_mora(last_mora: Mora) -> Mora:
     )
 
 
-def full_context_label_moras_to_moras(
-    full_context_moras: List[full_context_label.Mora],
-) -> List[Mora]:
-    return [
-        Mora(
-            text=mora_to_text("".join([p.phoneme for p in mora.phonemes])),
-            consonant=(mora.consonant.phoneme if mora.consonant is not None else None),
-            consonant_length=0 if mora.consonant is not None else None,
-            vowel=mora.vowel.phoneme,
-            vowel_length=0,
-            pitch=0,
-        )
-        for mora in full_context_moras
-    ]
+def apply_intonation(
+    f0: np.ndarray, intonation_scale: float, pitch_ratio: float = 1.0
+) -> np.ndarray:
+    """
+    有声部分(f0が0より大きい部分)の平均値を中心に抑揚を適用する
+    有声部分は 平均値 * pitch_ratio + (f0 - 平均値) * intonation_scale に置き換えられる
+    有声部分が存在しない場合は何もしない
+    Parameters
+    ----------
+    f0 : numpy.ndarray
+        基本周波数系列。この配列自体が書き換えられる
+    intonation_scale : float
+        抑揚
+    pitch_ratio : float
+        平均値に掛ける倍率
+    Returns
+    -------
+    f0 : numpy.ndarray
+        抑揚が適用された基本周波数系列
+    """
+    voiced = f0 > 0
+    if not voiced.any():
+        return f0
+    voiced_f0 = f0[voiced]
+    mean_f0 = voiced_f0.mean()
+    f0[voiced] = mean_f0 * pitch_ratio + (voiced_f0 - mean_f0) * intonation_scale
+    return f0
 
 
 class SynthesisEngineBase(metaclass=ABCMeta):
+    # create_accent_phrasesの結果のキャッシュ。Noneの場合はキャッシュしない
+    accent_phrase_cache: Optional[AccentPhraseCache] = None
+    # キャッシュのキーに使うエンジンのバージョン
+    engine_version: Optional[str] = None
+
     # FIXME: jsonではなくModelを返すようにする
     @property
     @abstractmethod
@@ -176,44 +189,70 @@ class SynthesisEngineBase(metaclass=ABCMeta):
         )
 
     def create_accent_phrases(self, text: str, style_id: int) -> List[AccentPhrase]:
-        if len(text.strip()) == 0:
-            return []
+        cache = self.accent_phrase_cache
+        if cache is not None:
+            cached = cache.get(text, style_id, self.engine_version)
+            if cached is not None:
+                return cached
 
-        utterance = extract_full_context_label(text)
-        if len(utterance.breath_groups) == 0:
-            return []
+        accent_phrases = text_to_accent_phrases(text)
+        if len(accent_phrases) != 0:
+            accent_phrases = self.replace_mora_data(
+                accent_phrases=accent_phrases,
+                style_id=style_id,
+            )
 
-        accent_phrases = self.replace_mora_data(
-            accent_phrases=[
-                AccentPhrase(
-                    moras=full_context_label_moras_to_moras(accent_phrase.moras),
-                    accent=accent_phrase.accent,
-                    pause_mora=(
-                        Mora(
-                            text="、",
-                            consonant=None,
-                            consonant_length=None,
-                            vowel="pau",
-                            vowel_length=0,
-                            pitch=0,
-                        )
-                        if (
-                            i_accent_phrase == len(breath_group.accent_phrases) - 1
-                            and i_breath_group != len(utterance.breath_groups) - 1
-                        )
-                        else None
-                    ),
-                    is_interrogative=accent_phrase.is_interrogative,
-                )
-                for i_breath_group, breath_group in enumerate(utterance.breath_groups)
-                for i_accent_phrase, accent_phrase in enumerate(
-                    breath_group.accent_phrases
-                )
-            ],
-            style_id=style_id,
-        )
+        if cache is not None:
+            cache.put(text, style_id, self.engine_version, accent_phrases)
         return accent_phrases
 
+    def create_accent_phrases_batch(
+        self,
+        items: Iterable[Tuple[str, int]],
+        pool: Optional["AccentPhraseExtractorPool"] = None,
+        timings: Optional[List[float]] = None,
+    ) -> Iterator[List[AccentPhrase]]:
+        """
+        (text, style_id)の組ごとにアクセント句を作成し、入力と同じ順番で返す
+        poolが指定された場合、テキストの解析はpoolのワーカープロセスで並列に行われ、
+        音素長・音高の設定のみこのプロセスで行う(この場合accent_phrase_cacheは使われない)
+        Parameters
+        ----------
+        items : Iterable[Tuple[str, int]]
+            テキストとスタイルIDの組
+        pool : Optional[AccentPhraseExtractorPool]
+            テキスト解析用のプロセスプール
+        timings : Optional[List[float]]
+            指定された場合、各要素の処理時間(秒)を、要素を返す前に追加する
+            poolを使う場合はワーカーでの解析時間と音素長・音高の設定時間の合計で、
+            ワーカーの空きを待った時間は含まない
+        Returns
+        -------
+        accent_phrases : Iterator[List[AccentPhrase]]
+            アクセント句モデルのリスト
+        """
+        if pool is None:
+            for text, style_id in items:
+                start = time.perf_counter()
+                accent_phrases = self.create_accent_phrases(text, style_id=style_id)
+                if timings is not None:
+                    timings.append(time.perf_counter() - start)
+                yield accent_phrases
+            return
+
+        items, items_for_pool = tee(items)
+        for (_, style_id), (accent_phrases, elapsed) in zip(
+            items, pool.map_timed(text for text, _ in items_for_pool)
+        ):
+            start = time.perf_counter()
+            if len(accent_phrases) != 0:
+                accent_phrases = self.replace_mora_data(
+                    accent_phrases=accent_phrases, style_id=style_id
+                )
+            if timings is not None:
+                timings.append(elapsed + time.perf_counter() - start)
+            yield accent_phrases
+
     def synthesis(
         self,
         query: AudioQuery,
@@ -236,13 +275,60 @@ class SynthesisEngineBase(metaclass=ABCMeta):
         wave : numpy.ndarray
             音声合成結果
         """
+        query = self._prepare_query(query, enable_interrogative_upspeak)
+        return self._synthesis_impl(query, style_id)
+
+    def synthesis_stream(
+        self,
+        query: AudioQuery,
+        style_id: int,
+        enable_interrogative_upspeak: bool = True,
+    ) -> Iterator[np.ndarray]:
+        """
+        音声合成を行い、合成できた部分から順に波形を返す
+        継承先の実装`_synthesis_stream_impl`によっては長い文章を分割して合成するため、
+        全体を合成し終わる前に最初の波形を受け取れる
+        分割して合成する実装では、連結した波形の長さと内容は`synthesis`の結果と一致しない
+        Parameters
+        ----------
+        query : AudioQuery
+            音声合成クエリ
+        style_id : int
+            スタイルID
+        enable_interrogative_upspeak : bool
+            疑問系のテキストの語尾を自動調整する機能を有効にするか
+        Returns
+        -------
+        waves : Iterator[numpy.ndarray]
+            音声合成結果を先頭から分割したもの。連結すると文章全体の波形になる
+        """
+        query = self._prepare_query(query, enable_interrogative_upspeak)
+        return self._synthesis_stream_impl(query, style_id)
+
+    def _synthesis_stream_impl(
+        self,
+        query: AudioQuery,
+        style_id: int,
+    ) -> Iterator[np.ndarray]:
+        """
+        音声合成を行い、波形を分割して返す
+        未実装の場合は全体を一度に合成して返す
+        """
+        yield self._synthesis_impl(query, style_id)
+
+    def _prepare_query(
+        self, query: AudioQuery, enable_interrogative_upspeak: bool
+    ) -> AudioQuery:
+        """
+        音声合成クエリを複製し、必要であれば疑問文指定されたMoraを変形する
+        """
         # モーフィング時などに同一参照のqueryで複数回呼ばれる可能性があるので、元の引数のqueryに破壊的変更を行わない
         query = copy.deepcopy(query)
         if enable_interrogative_upspeak:
             query.accent_phrases = adjust_interrogative_accent_phrases(
                 query.accent_phrases
             )
-        return self._synthesis_impl(query, style_id)
+        return query
 
     @abstractmethod
     def _synthesis_impl(
@@ -1,7 +1,24 @@
 import json
 import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from itertools import chain
 from pathlib import Path
-from typing import List, Optional
+from types import MappingProxyType
+from typing import (
+    Any,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
 
 import librosa.effects
 import numpy as np
@@ -10,11 +27,20 @@ import torch
 from espnet2.bin.tts_inference import Text2Speech
 from espnet2.text.token_id_converter import TokenIDConverter
 from fastapi import HTTPException
-from scipy.signal import resample
 
 from ..bridge_config import BridgeConfigLoader
+from ..bridge_config.BridgeConfig import (
+    BridgeConfig,
+    StyleConfig,
+    TokenIDConverterInitArgs,
+    TTSInferenceInitArgs,
+    WorldAnalysisConfig,
+)
 from ..model import AccentPhrase, AudioQuery
-from .synthesis_engine_base import SynthesisEngineBase
+from ..utility import StreamingResampler, resample_wave
+from .model_residency_manager import ModelResidencyManager
+from .synthesis_engine_base import SynthesisEngineBase, apply_intonation
+from .text2speech_batcher import Text2SpeechBatcher
 
 
 def query2tokens(query: AudioQuery, g2p_type: str):
@@ -72,6 +98,98 @@ def query2tokens(query: AudioQuery, g2p_type: str):
         raise RuntimeError(f"不明なG2Pの種類です。: {g2p_type}")
 
 
+@contextmanager
+def measure_stage(stage_timings: Dict[str, float], name: str) -> Iterator[None]:
+    """
+    withブロックの実行時間(秒)をstage_timings[name]に加算する
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_timings[name] = stage_timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def trim_silence(
+    wave: np.ndarray, trim_start: bool = True, trim_end: bool = True
+) -> np.ndarray:
+    """
+    閾値30dbで波形の先頭・末尾の無音をトリミングする
+    """
+    if not trim_start and not trim_end:
+        return wave
+    _, (start, end) = librosa.effects.trim(wave, top_db=30)
+    return wave[(start if trim_start else 0) : (end if trim_end else len(wave))]
+
+
+def split_accent_phrases(
+    accent_phrases: List[AccentPhrase], max_chunk_moras: int
+) -> List[List[AccentPhrase]]:
+    """
+    アクセント句の列を、pause_moraを持つアクセント句の直後で分割する
+    ポーズの無いまま1つの分割がmax_chunk_morasモーラを超える場合は、アクセント句の境界で分割する
+    """
+    chunks: List[List[AccentPhrase]] = []
+    chunk: List[AccentPhrase] = []
+    n_moras = 0
+    for accent_phrase in accent_phrases:
+        if len(chunk) != 0 and n_moras + len(accent_phrase.moras) > max_chunk_moras:
+            chunks.append(chunk)
+            chunk, n_moras = [], 0
+        chunk.append(accent_phrase)
+        n_moras += len(accent_phrase.moras)
+        if accent_phrase.pause_mora is not None:
+            chunks.append(chunk)
+            chunk, n_moras = [], 0
+    if len(chunk) != 0:
+        chunks.append(chunk)
+    return chunks
+
+
+def world_analysis(
+    wave: np.ndarray, fs: int, config: WorldAnalysisConfig
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    WORLDで波形を分析し、基本周波数・スペクトル包絡・非周期性指標を求める
+    Parameters
+    ----------
+    wave : numpy.ndarray
+        分析する波形(float64)
+    fs : int
+        サンプリングレート
+    config : WorldAnalysisConfig
+        分析のパラメータ
+    Returns
+    -------
+    f0 : numpy.ndarray
+        基本周波数
+    sp : numpy.ndarray
+        スペクトル包絡
+    ap : numpy.ndarray
+        非周期性指標
+    """
+    if config.f0_method == "harvest":
+        f0, t = pyworld.harvest(wave, fs, frame_period=config.frame_period)
+    else:
+        f0, t = pyworld.dio(wave, fs, frame_period=config.frame_period)
+        if config.refine_f0:
+            f0 = pyworld.stonemask(wave, f0, t, fs)
+
+    fft_size = config.fft_size
+    if fft_size is None:
+        fft_size = pyworld.get_cheaptrick_fft_size(fs)
+    sp = pyworld.cheaptrick(wave, f0, t, fs, fft_size=fft_size)
+    ap = pyworld.d4c(
+        wave,
+        f0,
+        t,
+        fs,
+        # threshold=0.50   # voiced/unvoiced threshold
+        fft_size=fft_size,
+    )
+    return f0, sp, ap
+
+
 def get_abs_path(_path: Optional[str], config_path: Path) -> Path:
     if _path is None:
         return None
@@ -82,12 +200,85 @@ def get_abs_path(_path: Optional[str], config_path: Path) -> Path:
         return _path.resolve(strict=True)
 
 
+class StyleModels(NamedTuple):
+    """
+    スタイルの音声合成に使うモデル
+    """
+
+    text2speech: Text2Speech
+    token_id_converter: TokenIDConverter
+
+
+class ConfigSnapshot(NamedTuple):
+    """
+    読み込んだ設定と、そこから作ったスタイルの索引
+    設定の読み込み直しではこれを丸ごと作り直して1回の代入で差し替えるので、
+    リクエストは索引どうしが食い違った途中の状態を見ることがない
+    """
+
+    bridge_config: BridgeConfig
+    # スタイルIDからスタイルの設定
+    styles: Mapping[int, StyleConfig]
+    # スタイルIDからそのスタイルのモデルのキー
+    model_keys: Mapping[int, Hashable]
+    # モデルのキーからそのモデルを共有するスタイルの一覧
+    styles_by_model_key: Mapping[Hashable, Tuple[StyleConfig, ...]]
+    # max_concurrencyが設定されたスタイルの同時推論数の制限
+    style_semaphores: Mapping[int, threading.BoundedSemaphore]
+
+
+# モデルのファイルパスとして解決するTTSInferenceInitArgsのフィールド
+_MODEL_PATH_FIELDS = ("train_config", "model_file", "vocoder_config", "vocoder_file")
+
+
+def text2speech_key(init_args: TTSInferenceInitArgs) -> Hashable:
+    """
+    Text2Speechの初期化時の引数から、同じモデルを表すキーを作る
+    相対パスは解決してから比較するので、書き方が違っても同じファイルを指していれば同じキーになる
+    """
+    args = init_args.dict()
+    for field in _MODEL_PATH_FIELDS:
+        if args[field] is not None:
+            args[field] = str(Path(args[field]).resolve())
+    return tuple(sorted(args.items()))
+
+
+def token_id_converter_key(init_args: TokenIDConverterInitArgs) -> Hashable:
+    """
+    TokenIDConverterの初期化時の引数から、同じ変換を表すキーを作る
+    """
+    token_list = init_args.token_list
+    if isinstance(token_list, (str, Path)):
+        token_list = str(Path(token_list).resolve())
+    else:
+        token_list = tuple(token_list)
+    return token_list, init_args.unk_symbol
+
+
+def estimate_model_bytes(text2speech: Text2Speech) -> int:
+    """
+    Text2Speechのパラメータとバッファのバイト数の合計を返す
+    """
+    model = text2speech.model
+    return sum(
+        tensor.numel() * tensor.element_size()
+        for tensor in chain(model.parameters(), model.buffers())
+    )
+
+
 class SynthesisEngineESPNet(SynthesisEngineBase):
     def __init__(
         self,
         bridge_config_loader: BridgeConfigLoader,
         use_gpu: bool,
         load_all_models: bool,
+        stream_max_chunk_moras: int = 100,
+        tts_batch_window: float = 0.0,
+        tts_max_batch_size: int = 1,
+        tts_batch_workers: Optional[int] = None,
+        max_loaded_models: Optional[int] = None,
+        model_memory_budget: Optional[int] = None,
+        pinned_style_ids: Iterable[int] = (),
     ):
 
         # if use_gpu:
@@ -95,28 +286,132 @@ class SynthesisEngineESPNet(SynthesisEngineBase):
         # else:
         self.device = "cpu"
 
-        self.bridge_config = bridge_config_loader.load_config_file()
-
-        self.engine_version = self.bridge_config.engine_version
-        self.default_sampling_rate = self.bridge_config.sampling_rate
+        self._bridge_config_loader = bridge_config_loader
+        self._load_all_models = load_all_models
+        # synthesis_streamで1度に合成するモーラ数の上限(アクセント句の途中では分割しない)
+        self.stream_max_chunk_moras = stream_max_chunk_moras
 
         os.chdir(bridge_config_loader.config_file_path.parent)
 
+        # tts_max_batch_sizeが2以上の場合、同じスタイル・話速のリクエストをまとめて推論する
+        self._text2speech_batcher: Optional[Text2SpeechBatcher] = None
+        if tts_max_batch_size > 1:
+            # 異なるスタイル・話速のバッチはtts_batch_workers個まで並行して推論する
+            self._text2speech_batcher = Text2SpeechBatcher(
+                batch_window=tts_batch_window,
+                max_batch_size=tts_max_batch_size,
+                num_workers=tts_batch_workers,
+            )
+
+        # 読み込んだText2Speechをモデルごとに保持し、上限を超えた場合は使われていないものから破棄する
+        # 同じモデルファイル・初期化時の引数を指定したスタイルは1つのインスタンスを共有する
+        self._model_manager = ModelResidencyManager(
+            max_models=max_loaded_models,
+            max_bytes=model_memory_budget,
+            size_of=estimate_model_bytes,
+            on_evict=self._on_model_evicted,
+        )
+        self._pinned_style_ids = set(pinned_style_ids)
+        # TokenIDConverterは小さいので、破棄せずに初期化時の引数ごとに共有する
+        self._token_id_converters: Dict[Hashable, TokenIDConverter] = {}
+        self._token_id_converters_lock = threading.Lock()
+
+        # 設定の読み込み直しが複数のスレッドから同時に行われないようにする
+        self._reload_lock = threading.Lock()
+
+        self._apply_config(bridge_config_loader.load_config_file())
+
+    def _apply_config(self, bridge_config: BridgeConfig) -> None:
+        """
+        設定を読み込み、スタイルIDからスタイルの設定を引く索引を作り直す
+        ピン留めされたスタイルのモデルを読み込み、load_all_models指定時は
+        読み込むモデル数・メモリ使用量の上限に達するまで残りのスタイルのモデルも読み込む
+        """
         # use_gpuの引数で上書きする
-        # text2speechとtoken_id_converterを作成する
-        for speaker in self.bridge_config.speakers:
+        styles: Dict[int, StyleConfig] = {}
+        for speaker in bridge_config.speakers:
             for style in speaker.styles:
                 style.tts_inference_init_args.device = self.device
-                if load_all_models:
-                    style.text2speech = Text2Speech(
-                        **style.tts_inference_init_args.dict()
-                    )
-                    style.token_id_converter = TokenIDConverter(
-                        **style.token_id_converter_init_args.dict()
-                    )
-                else:
-                    style.text2speech = None
-                    style.token_id_converter = None
+                style.text2speech = None
+                style.token_id_converter = None
+                # 従来の線形探索と同じく、IDが重複した場合は最初のスタイルを使う
+                styles.setdefault(style.id, style)
+
+        # 各スタイルのモデルのキーと、モデルを共有するスタイルの一覧
+        model_keys: Dict[int, Hashable] = {}
+        styles_by_model_key: Dict[Hashable, List[StyleConfig]] = {}
+        for style in styles.values():
+            key = text2speech_key(style.tts_inference_init_args)
+            model_keys[style.id] = key
+            styles_by_model_key.setdefault(key, []).append(style)
+
+        config = ConfigSnapshot(
+            bridge_config=bridge_config,
+            styles=MappingProxyType(styles),
+            model_keys=MappingProxyType(model_keys),
+            styles_by_model_key=MappingProxyType(
+                {key: tuple(value) for key, value in styles_by_model_key.items()}
+            ),
+            style_semaphores=MappingProxyType(
+                {
+                    style.id: threading.BoundedSemaphore(style.max_concurrency)
+                    for style in styles.values()
+                    if style.max_concurrency is not None
+                }
+            ),
+        )
+        self._config = config
+
+        # text2speechとtoken_id_converterを作成する
+        self._model_manager.clear()
+        self._model_manager.pinned = {
+            config.model_keys[style_id]
+            for style_id in self._pinned_style_ids
+            if style_id in config.model_keys
+        }
+        with self._token_id_converters_lock:
+            self._token_id_converters.clear()
+        for style in styles.values():
+            if style.id in self._pinned_style_ids:
+                self._initialize_style(style, skip_reinit=True)
+        if self._load_all_models:
+            # 上限を超えて読み込むと先に読み込んだモデルを破棄することになるので、上限に達したら止める
+            # 読み込み済みのモデルを共有するスタイルは、上限に関係なくそのモデルを使う
+            for style in styles.values():
+                if (
+                    config.model_keys[style.id] in self._model_manager
+                    or self._model_manager.has_room()
+                ):
+                    self._initialize_style(style, skip_reinit=True)
+
+    def reload_config(self) -> None:
+        """
+        設定ファイルを読み込み直し、スタイルの索引・同時推論数の制限を更新する
+        読み込み済みのモデルは破棄され、アクセント句のキャッシュも消去される
+        """
+        bridge_config = self._bridge_config_loader.load_config_file()
+        with self._reload_lock:
+            self._apply_config(bridge_config)
+        if self.accent_phrase_cache is not None:
+            self.accent_phrase_cache.clear()
+
+    @property
+    def bridge_config(self) -> BridgeConfig:
+        return self._config.bridge_config
+
+    @property
+    def engine_version(self) -> str:
+        return self._config.bridge_config.engine_version
+
+    @property
+    def default_sampling_rate(self) -> int:
+        return self._config.bridge_config.sampling_rate
+
+    def model_stats(self) -> Dict[str, Any]:
+        """
+        読み込み済みのモデル数・メモリ使用量・読み込みと破棄の回数・読み込み時間のヒストグラムを返す
+        """
+        return self._model_manager.stats()
 
     @property
     def speakers(self) -> str:
@@ -144,34 +439,69 @@ class SynthesisEngineESPNet(SynthesisEngineBase):
             }
         )
 
-    def _get_style(self, style_id):
-        for speaker in self.bridge_config.speakers:
-            for style in speaker.styles:
-                if style.id == style_id:
-                    _speaker = style
-                    break
-            else:
-                continue
-            break
-        else:
+    def _get_style(self, style_id: int) -> StyleConfig:
+        style = self._config.styles.get(style_id)
+        if style is None:
             raise HTTPException(status_code=404, detail="該当する話者が見つかりません")
-        return _speaker
+        return style
 
     def initialize_style_id_synthesis(self, style_id: int, skip_reinit: bool):
-        speaker = self._get_style(style_id)
-        if speaker.text2speech is None or not skip_reinit:
-            speaker.text2speech = Text2Speech(**speaker.tts_inference_init_args.dict())
-        if speaker.token_id_converter is None or not skip_reinit:
-            speaker.token_id_converter = TokenIDConverter(
-                **speaker.token_id_converter_init_args.dict()
-            )
-            assert speaker.token_id_converter is not None
+        self._initialize_style(self._get_style(style_id), skip_reinit)
+
+    def _initialize_style(self, speaker: StyleConfig, skip_reinit: bool) -> StyleModels:
+        """
+        スタイルのモデルを返す。読み込まれていない場合やskip_reinitがFalseの場合は読み込む
+        同じモデルを指す他のスタイルで読み込み済みの場合は、そのインスタンスを使う
+        """
+
+        text2speech = self._model_manager.get(
+            self._model_key(speaker),
+            lambda: Text2Speech(**speaker.tts_inference_init_args.dict()),
+            reload=not skip_reinit,
+        )
+        models = StyleModels(
+            text2speech=text2speech,
+            token_id_converter=self._get_token_id_converter(speaker, skip_reinit),
+        )
+        speaker.text2speech = models.text2speech
+        speaker.token_id_converter = models.token_id_converter
+        return models
+
+    def _model_key(self, speaker: StyleConfig) -> Hashable:
+        """
+        スタイルのモデルのキーを返す
+        読み込み直す前の設定のスタイルでは、同じIDのスタイルが別のモデルを指していることがあるので、
+        初期化時の引数からキーを作り直す
+        """
+        config = self._config
+        if config.styles.get(speaker.id) is speaker:
+            return config.model_keys[speaker.id]
+        return text2speech_key(speaker.tts_inference_init_args)
+
+    def _get_token_id_converter(
+        self, speaker: StyleConfig, skip_reinit: bool
+    ) -> TokenIDConverter:
+        key = token_id_converter_key(speaker.token_id_converter_init_args)
+        with self._token_id_converters_lock:
+            token_id_converter = self._token_id_converters.get(key)
+            if token_id_converter is None or not skip_reinit:
+                token_id_converter = TokenIDConverter(
+                    **speaker.token_id_converter_init_args.dict()
+                )
+                self._token_id_converters[key] = token_id_converter
+            return token_id_converter
+
+    def _on_model_evicted(self, model_key: Hashable, text2speech: Text2Speech) -> None:
+        # モデルを共有する全てのスタイルから参照を外す
+        # 破棄された後に読み込み直されている場合はそのままにする
+        for style in self._config.styles_by_model_key.get(model_key, ()):
+            if style.text2speech is text2speech:
+                style.text2speech = None
+                style.token_id_converter = None
 
     def is_initialized_style_id_synthesis(self, style_id: int) -> bool:
         speaker = self._get_style(style_id)
-        return (
-            speaker.text2speech is not None and speaker.token_id_converter is not None
-        )
+        return self._model_key(speaker) in self._model_manager
 
     def replace_phoneme_length(
         self, accent_phrases: List[AccentPhrase], style_id: int
@@ -211,7 +541,40 @@ class SynthesisEngineESPNet(SynthesisEngineBase):
         # 音高を設定するのは不可能なのでそのまま返す
         return accent_phrases
 
-    def _synthesis_impl(self, query: AudioQuery, style_id: int):
+    def synthesis_with_stage_timings(
+        self,
+        query: AudioQuery,
+        style_id: int,
+        enable_interrogative_upspeak: bool = True,
+    ) -> Tuple[np.ndarray, Dict[str, float]]:
+        """
+        synthesisと同じく音声合成を行い、実行された処理段階ごとの実行時間(秒)も返す
+        Parameters
+        ----------
+        query : AudioQuery
+            音声合成クエリ
+        style_id : int
+            スタイルID
+        enable_interrogative_upspeak : bool
+            疑問系のテキストの語尾を自動調整する機能を有効にするか
+        Returns
+        -------
+        wave : numpy.ndarray
+            音声合成結果
+        stage_timings : Dict[str, float]
+            実行された処理段階の名前と実行時間。実行されなかった処理段階は含まれない
+        """
+        query = self._prepare_query(query, enable_interrogative_upspeak)
+        stage_timings: Dict[str, float] = {}
+        wave = self._synthesis_impl(query, style_id, stage_timings=stage_timings)
+        return wave, stage_timings
+
+    def _synthesis_impl(
+        self,
+        query: AudioQuery,
+        style_id: int,
+        stage_timings: Optional[Dict[str, float]] = None,
+    ):
         """
         音声合成クエリから音声合成に必要な情報を構成し、実際に音声合成を行う
         Parameters
@@ -220,50 +583,188 @@ class SynthesisEngineESPNet(SynthesisEngineBase):
             音声合成クエリ
         style_id : int
             スタイルID
+        stage_timings : Optional[Dict[str, float]]
+            指定された場合、実行された処理段階ごとの実行時間(秒)が追加される
         Returns
         -------
         wave : numpy.ndarray
             音声合成結果
         """
-        self.initialize_style_id_synthesis(style_id, skip_reinit=True)
-        _speaker = self._get_style(style_id)
+        if stage_timings is None:
+            stage_timings = {}
 
-        assert _speaker.text2speech is not None
-        assert _speaker.token_id_converter is not None
+        _speaker = self._get_style(style_id)
+        models = self._initialize_style(_speaker, skip_reinit=True)
 
         if len(query.accent_phrases) == 0:
             return np.array([], dtype=np.float64)
 
-        with torch.no_grad():
-            tokens = query2tokens(query, _speaker.g2p)
-            ids = np.array(_speaker.token_id_converter.tokens2ids(tokens))
-            _speaker.text2speech.decode_conf.update({"alpha": 1 / query.speedScale})
-            wave = _speaker.text2speech(ids, **_speaker.tts_inference_call_args.dict())
-            wave = wave["wav"].view(-1).cpu().numpy()
+        wave = self._text2speech(query, _speaker, models, stage_timings)
+        return self._post_process(wave, query, _speaker.world_analysis, stage_timings)
+
+    def _synthesis_stream_impl(
+        self,
+        query: AudioQuery,
+        style_id: int,
+        stage_timings: Optional[Dict[str, float]] = None,
+    ) -> Iterator[np.ndarray]:
+        """
+        アクセント句の列をポーズの位置(最大stream_max_chunk_morasモーラ)で分割し、
+        分割ごとに音声合成と後処理を行って順に返す
+        前後の無音のトリミングと開始無音・終了無音の付加は全体の先頭と末尾にのみ行い、
+        リサンプリングは分割をまたいで連続するように行う
+        分割ごとにモデルで推論するため、連結した波形はsynthesisの結果と長さも内容も一致しない
+        音素長は分割の前後の文脈なしで推論され、WORLDの分析・合成のフレームへの丸めも分割ごとに行われる
+        また、抑揚は分割ごとのf0の平均値を中心に適用される
+        Parameters
+        ----------
+        query : AudioQuery
+            音声合成クエリ
+        style_id : int
+            スタイルID
+        stage_timings : Optional[Dict[str, float]]
+            指定された場合、実行された処理段階ごとの実行時間(秒)が全ての分割の合計で追加される
+        Returns
+        -------
+        waves : Iterator[numpy.ndarray]
+            音声合成結果を先頭から分割したもの
+        """
+        if stage_timings is None:
+            stage_timings = {}
+
+        _speaker = self._get_style(style_id)
+        models = self._initialize_style(_speaker, skip_reinit=True)
+
+        chunks = split_accent_phrases(query.accent_phrases, self.stream_max_chunk_moras)
+        resampler = StreamingResampler(
+            self.default_sampling_rate, query.outputSamplingRate
+        )
+        for i, accent_phrases in enumerate(chunks):
+            is_first = i == 0
+            is_last = i == len(chunks) - 1
+            chunk_query = query.copy(
+                update={
+                    "accent_phrases": accent_phrases,
+                    "prePhonemeLength": query.prePhonemeLength if is_first else 0,
+                    "postPhonemeLength": query.postPhonemeLength if is_last else 0,
+                }
+            )
+            wave = self._text2speech(chunk_query, _speaker, models, stage_timings)
+            wave = self._post_process(
+                wave,
+                chunk_query,
+                _speaker.world_analysis,
+                stage_timings,
+                trim_start=is_first,
+                trim_end=is_last,
+                resampler=resampler,
+            )
+            if len(wave) != 0:
+                yield wave
+
+        # リサンプリングのフィルタに残っている末尾
+        wave = resampler.flush()
+        if len(wave) != 0:
+            if query.outputStereo:
+                wave = np.array([wave, wave]).T
+            yield wave
 
+    def _text2speech(
+        self,
+        query: AudioQuery,
+        _speaker: StyleConfig,
+        models: StyleModels,
+        stage_timings: Dict[str, float],
+    ) -> np.ndarray:
+        """
+        Text2Speechで音声合成クエリから波形を生成する
+        Text2Speechのインスタンスはスレッド間で共有されるため、
+        話速はインスタンスのdecode_confを書き換えずにリクエストごとに渡す
+        """
+        tokens = query2tokens(query, _speaker.g2p)
+        ids = np.array(models.token_id_converter.tokens2ids(tokens))
+        call_args = _speaker.tts_inference_call_args.dict()
+        call_args["decode_conf"] = {
+            **(call_args["decode_conf"] or {}),
+            "alpha": 1 / query.speedScale,
+        }
+        if self._text2speech_batcher is not None:
+            with measure_stage(stage_timings, "text2speech"):
+                return self._text2speech_batcher.infer_ids(
+                    (_speaker.id, query.speedScale),
+                    models.text2speech,
+                    ids,
+                    call_args,
+                    partial(self._inference_slot, _speaker),
+                )
+
+        with self._inference_slot(_speaker):
+            with measure_stage(stage_timings, "text2speech"), torch.no_grad():
+                wave = models.text2speech(ids, **call_args)
+                return wave["wav"].view(-1).cpu().numpy()
+
+    @contextmanager
+    def _inference_slot(self, speaker: StyleConfig) -> Iterator[None]:
+        """
+        スタイルにmax_concurrencyが設定されている場合、同時推論数が上限を下回るまで待つ
+        読み込み直す前の設定のスタイルは、同じIDの新しいスタイルの上限には数えない
+        """
+        config = self._config
+        semaphore = None
+        if config.styles.get(speaker.id) is speaker:
+            semaphore = config.style_semaphores.get(speaker.id)
+        if semaphore is None:
+            yield
+            return
+        with semaphore:
+            yield
+
+    def _post_process(
+        self,
+        wave: np.ndarray,
+        query: AudioQuery,
+        world_config: WorldAnalysisConfig,
+        stage_timings: Dict[str, float],
+        trim_start: bool = True,
+        trim_end: bool = True,
+        resampler: Optional[StreamingResampler] = None,
+    ) -> np.ndarray:
+        """
+        Text2Speechの出力波形に無音の付加・WORLDによる音高と抑揚の加工・音量・リサンプリングを適用する
+        各処理は必要な場合のみ実行し、実行した処理の時間をstage_timingsに記録する
+        trim_start・trim_endがFalseの場合は先頭・末尾の無音を残す
+        resamplerが指定された場合はresamplerでリサンプリングし、確定した部分のみを返す
+        """
         # 閾値30dbで前後の無音をトリミング
-        wave, _ = librosa.effects.trim(wave, top_db=30)
-        wave = wave.astype(np.float64)
+        with measure_stage(stage_timings, "trim"):
+            wave = trim_silence(wave, trim_start=trim_start, trim_end=trim_end)
+            wave = wave.astype(np.float64)
 
         # 開始無音
         if query.prePhonemeLength != 0:
-            wave = np.concatenate(
-                [
-                    np.zeros(int(self.default_sampling_rate * query.prePhonemeLength)),
-                    wave,
-                ],
-                0,
-            )
+            with measure_stage(stage_timings, "padding"):
+                wave = np.concatenate(
+                    [
+                        np.zeros(
+                            int(self.default_sampling_rate * query.prePhonemeLength)
+                        ),
+                        wave,
+                    ],
+                    0,
+                )
 
         # 終了無音
         if query.postPhonemeLength != 0:
-            wave = np.concatenate(
-                [
-                    wave,
-                    np.zeros(int(self.default_sampling_rate * query.postPhonemeLength)),
-                ],
-                0,
-            )
+            with measure_stage(stage_timings, "padding"):
+                wave = np.concatenate(
+                    [
+                        wave,
+                        np.zeros(
+                            int(self.default_sampling_rate * query.postPhonemeLength)
+                        ),
+                    ],
+                    0,
+                )
 
         # WORLDで加工する
         fs = query.outputSamplingRate
@@ -271,57 +772,45 @@ class SynthesisEngineESPNet(SynthesisEngineBase):
         # 音高
         onkou = (query.pitchScale * 3) + 1
 
-        # 基本周波数の抽出
-        _f0, t = pyworld.dio(wave, fs)
-        f0 = pyworld.stonemask(wave, _f0, t, fs)
-        sp = pyworld.cheaptrick(wave, f0, t, fs)
-        ap = pyworld.d4c(
-            wave,
-            f0,
-            t,
-            fs,
-            # threshold=0.50   # voiced/unvoiced threshold
-        )
-
-        # f0 の平均値を求め、中央からどれだけ離れているかで、抑揚を表現する
-        total = 0
-        index = 0
-        for f in f0:
-            if f != 0:
-                total += f
-                index += 1
-
-        ave = total / index
-
-        pos = 0
-        for f in f0:
-            if f != 0:
-                f0[pos] = ave * onkou + (f - ave) * query.intonationScale
-            pos += 1
-
-        # 合成する
-
-        # 音高と抑揚のスライダーがデフォルト時は加工しない
+        # 音高と抑揚のスライダーがデフォルト時は加工しないので、WORLDによる分析自体を省略する
         if query.intonationScale != 1 or onkou != 1:
-            synthesized = pyworld.synthesize(
-                f0,
-                sp,
-                ap,
-                fs,
-            )
-            wave = synthesized.astype(np.float)
+            # 基本周波数の抽出
+            with measure_stage(stage_timings, "world_analysis"):
+                f0, sp, ap = world_analysis(wave, fs, world_config)
+
+            # f0 の平均値を求め、中央からどれだけ離れているかで、抑揚を表現する
+            # 有声部分が無い場合はそのまま
+            with measure_stage(stage_timings, "f0_transform"):
+                f0 = apply_intonation(f0, query.intonationScale, pitch_ratio=onkou)
+
+            # 合成する
+            with measure_stage(stage_timings, "world_synthesis"):
+                synthesized = pyworld.synthesize(
+                    f0,
+                    sp,
+                    ap,
+                    fs,
+                    frame_period=world_config.frame_period,
+                )
+                wave = synthesized.astype(np.float64)
 
         # 音量
         if query.volumeScale != 1:
-            wave *= query.volumeScale
+            with measure_stage(stage_timings, "volume"):
+                wave *= query.volumeScale
 
         # サンプリングレート変更
-        wave = resample(
-            wave,
-            query.outputSamplingRate * len(wave) // self.default_sampling_rate,
-        )
+        if resampler is not None:
+            with measure_stage(stage_timings, "resample"):
+                wave = resampler.process(wave)
+        elif query.outputSamplingRate != self.default_sampling_rate:
+            with measure_stage(stage_timings, "resample"):
+                wave = resample_wave(
+                    wave, self.default_sampling_rate, query.outputSamplingRate
+                )
         # ステレオ化
         if query.outputStereo:
-            wave = np.array([wave, wave]).T
+            with measure_stage(stage_timings, "stereo"):
+                wave = np.array([wave, wave]).T
 
         return wave
@@ -0,0 +1,229 @@
+import os
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import torch
+from espnet.nets.pytorch_backend.conformer.convolution import ConvolutionModule
+from espnet.nets.pytorch_backend.nets_utils import make_non_pad_mask
+from espnet2.bin.tts_inference import Text2Speech
+
+from .request_batcher import RequestBatcher
+
+# 一括推論で利用するVITSGenerator.inferenceの引数
+_GENERATOR_DECODE_KEYS = ("noise_scale", "noise_scale_dur", "alpha", "max_len")
+
+
+def supports_batch_inference(text2speech: Text2Speech, call_args: Dict[str, Any]):
+    """
+    複数のトークン列をパディングして一度に推論できるかどうかを返す
+    VITS系のモデルで、話者埋め込み・言語ID・教師データを使わない場合のみ対応する
+    一括推論ではText2Speech.__call__を通らないので、
+    呼び出しごとに乱数のシードを固定する設定(always_fix_seed)の場合も対応しない
+    """
+    if getattr(text2speech, "always_fix_seed", False):
+        return False
+    tts = getattr(text2speech.model, "tts", None)
+    generator = getattr(tts, "generator", None)
+    if generator is None or not hasattr(generator, "upsample_factor"):
+        return False
+    return all(
+        call_args.get(key) is None for key in ("speech", "durations", "spembs", "lids")
+    )
+
+
+def text2speech_batch(
+    text2speech: Text2Speech, ids_list: List[np.ndarray], call_args: Dict[str, Any]
+) -> List[np.ndarray]:
+    """
+    複数のトークンID列から波形を生成する
+    モデルが対応していれば、パディングしてまとめて推論する
+    (デコーダは入力ごとに行うため、結果は1件ずつText2Speechを呼び出した場合と一致する)
+    対応していない場合は1件ずつText2Speechを呼び出す
+    Parameters
+    ----------
+    text2speech : Text2Speech
+        推論に使うインスタンス
+    ids_list : List[numpy.ndarray]
+        トークンID列のリスト
+    call_args : Dict[str, Any]
+        Text2Speechの呼び出し時に渡すパラメータ(decode_confを含む)
+    Returns
+    -------
+    waves : List[numpy.ndarray]
+        ids_listと同じ順番の波形
+    """
+    with torch.no_grad():
+        if len(ids_list) == 1 or not supports_batch_inference(text2speech, call_args):
+            return [
+                text2speech(ids, **call_args)["wav"].view(-1).cpu().numpy()
+                for ids in ids_list
+            ]
+
+        decode_conf = dict(text2speech.decode_conf)
+        decode_conf.update(call_args.get("decode_conf") or {})
+
+        lengths = [len(ids) for ids in ids_list]
+        # 0番目のトークン(<blank>)でパディングする。パディング部分は長さのマスクで無視される
+        text = torch.zeros((len(ids_list), max(lengths)), dtype=torch.long)
+        for i, ids in enumerate(ids_list):
+            text[i, : len(ids)] = torch.as_tensor(ids, dtype=torch.long)
+        sids = call_args.get("sids")
+        if sids is not None:
+            sids = torch.as_tensor(sids, dtype=torch.long).view(1).repeat(len(ids_list))
+            sids = sids.to(text2speech.device)
+
+        waves = _generator_inference(
+            text2speech.model.tts.generator,
+            text=text.to(text2speech.device),
+            text_lengths=torch.tensor(lengths, dtype=torch.long).to(text2speech.device),
+            sids=sids,
+            **{
+                key: decode_conf[key]
+                for key in _GENERATOR_DECODE_KEYS
+                if key in decode_conf
+            },
+        )
+        return [wave.cpu().numpy() for wave in waves]
+
+
+def _encode_text(
+    generator, text: torch.Tensor, text_lengths: torch.Tensor
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    テキストエンコーダの出力(x, m_p, logs_p, x_mask)を返す
+    Conformerの畳み込みモジュールはマスクを使わず、パディング部分が有効な区間に混ざるため、
+    それを含むエンコーダでは1件ずつ計算してからパディングする
+    """
+    if not any(
+        isinstance(module, ConvolutionModule)
+        for module in generator.text_encoder.modules()
+    ):
+        return generator.text_encoder(text, text_lengths)
+
+    outputs = [
+        generator.text_encoder(text[i : i + 1, :length], text_lengths[i : i + 1])[:3]
+        for i, length in enumerate(text_lengths.tolist())
+    ]
+    x, m_p, logs_p = (
+        torch.nn.utils.rnn.pad_sequence(
+            [output[k][0].transpose(0, 1) for output in outputs], batch_first=True
+        ).transpose(1, 2)
+        for k in range(3)
+    )
+    x_mask = make_non_pad_mask(text_lengths).unsqueeze(1).to(text.device, x.dtype)
+    return x, m_p, logs_p, x_mask
+
+
+def _generator_inference(
+    generator,
+    text: torch.Tensor,
+    text_lengths: torch.Tensor,
+    sids: Optional[torch.Tensor] = None,
+    noise_scale: float = 0.667,
+    noise_scale_dur: float = 0.8,
+    alpha: float = 1.0,
+    max_len: Optional[int] = None,
+) -> List[torch.Tensor]:
+    """
+    VITSGenerator.inference(教師データを使わない場合)を、パディングした入力で行う
+    継続長の予測とflowはバッチのまま計算し、HiFiGANのデコーダだけは入力ごとに行う
+    デコーダの畳み込みにはマスクが無く、パディング部分の0もバイアスを通って
+    有効な区間の末尾に影響するため、有効な長さだけを切り出して1件ずつデコードする
+    Returns
+    -------
+    waves : List[torch.Tensor]
+        入力と同じ順番の1次元の波形
+    """
+    x, m_p, logs_p, x_mask = _encode_text(generator, text, text_lengths)
+    g = None
+    if generator.spks is not None:
+        # (B, global_channels, 1)
+        g = generator.global_emb(sids.view(-1)).unsqueeze(-1)
+
+    logw = generator.duration_predictor(
+        x, x_mask, g=g, inverse=True, noise_scale=noise_scale_dur
+    )
+    dur = torch.ceil(torch.exp(logw) * x_mask * alpha)
+    y_lengths = torch.clamp_min(torch.sum(dur, [1, 2]), 1).long()
+    y_mask = make_non_pad_mask(y_lengths).unsqueeze(1).to(text.device)
+    attn_mask = torch.unsqueeze(x_mask, 2) * torch.unsqueeze(y_mask, -1)
+    attn = generator._generate_path(dur, attn_mask).squeeze(1)
+
+    # (B, T_feats, T_text) x (B, T_text, H) -> (B, H, T_feats)
+    m_p = torch.matmul(attn, m_p.transpose(1, 2)).transpose(1, 2)
+    logs_p = torch.matmul(attn, logs_p.transpose(1, 2)).transpose(1, 2)
+    z_p = m_p + torch.randn_like(m_p) * torch.exp(logs_p) * noise_scale
+    z = generator.flow(z_p, y_mask, g=g, inverse=True) * y_mask
+
+    return [
+        generator.decoder(
+            z[i : i + 1, :, :y_length][:, :, :max_len],
+            g=None if g is None else g[i : i + 1],
+        ).view(-1)
+        for i, y_length in enumerate(y_lengths.tolist())
+    ]
+
+
+class Text2SpeechBatcher(RequestBatcher):
+    """
+    同じキー(スタイルと話速)のトークンID列をまとめて、text2speech_batchで一括推論する
+    キーの異なるバッチ(別のスタイルなど)はnum_workers個まで並行して推論する
+    """
+
+    def __init__(
+        self,
+        batch_window: float,
+        max_batch_size: int,
+        num_workers: Optional[int] = None,
+    ):
+        """
+        Parameters
+        ----------
+        batch_window : float
+            最初のリクエストが届いてから一括推論を始めるまでに待つ最大の時間(秒)
+        max_batch_size : int
+            1回の一括推論で処理するリクエスト数の上限。上限に達した場合は待たずに推論する
+        num_workers : Optional[int]
+            一括推論を並行して行うスレッド数。Noneの場合はCPUコア数
+        """
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        if num_workers < 1:
+            raise ValueError("num_workersは1以上である必要があります")
+        super().__init__(batch_window, max_batch_size, num_workers=num_workers)
+
+    def infer_ids(
+        self,
+        key: Hashable,
+        text2speech: Text2Speech,
+        ids: np.ndarray,
+        call_args: Dict[str, Any],
+        inference_slot: Callable[[], ContextManager] = nullcontext,
+    ) -> np.ndarray:
+        """
+        トークンID列をキューに入れ、同じキーのトークンID列とまとめて推論した波形を返す
+        Parameters
+        ----------
+        key : Hashable
+            一緒に推論できるリクエストを表すキー。同じキーのリクエストは
+            同じtext2speechとcall_argsで推論できる必要がある
+        text2speech : Text2Speech
+            推論に使うインスタンス
+        ids : numpy.ndarray
+            トークンID列
+        call_args : Dict[str, Any]
+            Text2Speechの呼び出し時に渡すパラメータ(decode_confを含む)
+        inference_slot : Callable[[], ContextManager]
+            一括推論の間だけ保持するコンテキストを返す関数(スタイルの同時推論数の制限など)
+        Returns
+        -------
+        wave : numpy.ndarray
+            idsから生成した波形
+        """
+
+        def run_batch(ids_list: List[np.ndarray]) -> List[np.ndarray]:
+            with inference_slot():
+                return text2speech_batch(text2speech, ids_list, call_args)
+
+        return self.infer(key, ids, run_batch)
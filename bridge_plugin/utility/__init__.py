@@ -6,6 +6,7 @@ from .connect_base64_waves import (
 from .core_version_utility import get_latest_core_version, parse_core_version
 from .mutex_utility import mutex_wrapper
 from .path_utility import delete_file, engine_root
+from .resample_utility import StreamingResampler, resample_wave
 
 __all__ = [
     "ConnectBase64WavesException",
@@ -16,4 +17,6 @@ __all__ = [
     "delete_file",
     "engine_root",
     "mutex_wrapper",
+    "StreamingResampler",
+    "resample_wave",
 ]
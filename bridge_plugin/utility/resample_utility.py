@@ -0,0 +1,177 @@
+from functools import lru_cache
+from math import gcd
+from typing import NamedTuple
+
+import numpy as np
+from scipy.signal import firwin, resample_poly, upfirdn
+
+
+class PolyphaseFilter(NamedTuple):
+    """
+    有理数比のポリフェーズリサンプリングに使うフィルタ
+    """
+
+    up: int
+    down: int
+    # scipy.signal.resample_polyのデフォルトと同じ設計のFIRフィルタ(ゲイン補正前)
+    window: np.ndarray
+    # 出力位置を中央に合わせるため先頭をゼロ埋めし、ゲインを補正したフィルタ
+    padded: np.ndarray
+    # paddedで畳み込んだ結果の先頭から取り除くサンプル数
+    n_pre_remove: int
+
+
+@lru_cache(maxsize=None)
+def get_polyphase_filter(src_rate: int, dst_rate: int) -> PolyphaseFilter:
+    """
+    サンプリングレートの組に対するフィルタを設計する。結果はキャッシュされる
+    """
+    if src_rate <= 0 or dst_rate <= 0:
+        raise ValueError("サンプリングレートは正の整数である必要があります")
+    g = gcd(src_rate, dst_rate)
+    up = dst_rate // g
+    down = src_rate // g
+
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    window = firwin(2 * half_len + 1, 1.0 / max_rate, window=("kaiser", 5.0))
+    window.setflags(write=False)
+
+    n_pre_pad = down - half_len % down
+    padded = np.concatenate([np.zeros(n_pre_pad), window * up])
+    padded.setflags(write=False)
+    return PolyphaseFilter(
+        up=up,
+        down=down,
+        window=window,
+        padded=padded,
+        n_pre_remove=(half_len + n_pre_pad) // down,
+    )
+
+
+def resampled_length(length: int, src_rate: int, dst_rate: int) -> int:
+    """
+    リサンプリング後のサンプル数。従来のscipy.signal.resampleの呼び出しと同じく切り捨てる
+    """
+    return dst_rate * length // src_rate
+
+
+def resample_wave(wave: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    """
+    波形を有理数比のポリフェーズフィルタでリサンプリングする
+    FFTによるリサンプリングと異なり、計算量は波形の長さに比例し、長さの素因数に依存しない
+    Parameters
+    ----------
+    wave : numpy.ndarray
+        波形。多チャンネルの場合は(サンプル数, チャンネル数)の形
+    src_rate : int
+        元のサンプリングレート
+    dst_rate : int
+        変換後のサンプリングレート
+    Returns
+    -------
+    wave : numpy.ndarray
+        リサンプリングされた波形。サンプリングレートが同じ場合は入力をそのまま返す
+    """
+    if src_rate == dst_rate:
+        return wave
+
+    n_out = resampled_length(len(wave), src_rate, dst_rate)
+    if n_out == 0:
+        return np.zeros((0,) + wave.shape[1:], dtype=wave.dtype)
+
+    poly = get_polyphase_filter(src_rate, dst_rate)
+    resampled = resample_poly(wave, poly.up, poly.down, axis=0, window=poly.window)
+    return _cast_like(resampled[:n_out], wave.dtype)
+
+
+def _cast_like(resampled: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    # 浮動小数点数の入力はその精度のまま返す
+    if np.issubdtype(dtype, np.floating):
+        return resampled.astype(dtype, copy=False)
+    return resampled
+
+
+class StreamingResampler:
+    """
+    波形を分割して与えながらリサンプリングする
+    全てのチャンクをprocessに与えた後にflushを呼ぶと、
+    出力を連結したものはresample_waveで一度に変換した結果と一致する
+    """
+
+    def __init__(self, src_rate: int, dst_rate: int):
+        self.src_rate = src_rate
+        self.dst_rate = dst_rate
+        self._poly = (
+            get_polyphase_filter(src_rate, dst_rate) if src_rate != dst_rate else None
+        )
+        # 保持している入力の先頭の(全体での)サンプル位置。常にdownの倍数にする
+        self._buffer_start = 0
+        self._buffer: np.ndarray = None
+        self._n_input = 0
+        # 次に出力するサンプルの位置
+        self._n_output = 0
+        self._dtype = None
+        # チャンネル数などサンプル数以外の形
+        self._trailing_shape = ()
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+        """
+        チャンクを追加し、確定したリサンプリング結果を返す
+        """
+        if self._dtype is None:
+            self._dtype = chunk.dtype
+            self._trailing_shape = chunk.shape[1:]
+        if self.src_rate == self.dst_rate:
+            self._n_input += len(chunk)
+            return chunk
+
+        if self._buffer is None:
+            self._buffer = np.asarray(chunk, dtype=np.float64)
+        else:
+            self._buffer = np.concatenate([self._buffer, chunk], axis=0)
+        self._n_input += len(chunk)
+
+        # 出力kが依存する入力の最大位置は floor((k + n_pre_remove) * down / up)
+        poly = self._poly
+        n_ready = (self._n_input * poly.up - 1) // poly.down + 1 - poly.n_pre_remove
+        return self._emit(max(n_ready, self._n_output))
+
+    def flush(self) -> np.ndarray:
+        """
+        残りの入力の後ろを無音とみなして、最後までのリサンプリング結果を返す
+        """
+        if self.src_rate == self.dst_rate or self._buffer is None:
+            dtype = np.float64 if self._dtype is None else self._dtype
+            return np.zeros((0,) + self._trailing_shape, dtype=dtype)
+
+        n_final = resampled_length(self._n_input, self.src_rate, self.dst_rate)
+        # 畳み込みが最後の出力まで届くように入力の後ろをゼロ埋めする
+        n_tail = len(self._poly.padded) // self._poly.up + 1
+        self._buffer = np.concatenate(
+            [self._buffer, np.zeros((n_tail,) + self._buffer.shape[1:])], axis=0
+        )
+        return self._emit(max(n_final, self._n_output))
+
+    def _emit(self, n_end: int) -> np.ndarray:
+        poly = self._poly
+        if n_end == self._n_output:
+            return np.zeros((0,) + self._buffer.shape[1:], dtype=self._dtype)
+
+        # バッファの先頭がdownの倍数なので、畳み込み結果の位置は出力位置と整数でずれる
+        shift = poly.n_pre_remove - self._buffer_start // poly.down * poly.up
+        convolved = upfirdn(poly.padded, self._buffer, poly.up, poly.down, axis=0)
+        out = convolved[self._n_output + shift : n_end + shift]
+        self._n_output = n_end
+
+        # 次の出力に不要になった入力を捨てる
+        first_needed = max(
+            ((n_end + poly.n_pre_remove) * poly.down - len(poly.padded) + 1) // poly.up,
+            0,
+        )
+        drop = (first_needed // poly.down * poly.down) - self._buffer_start
+        if drop > 0:
+            self._buffer = self._buffer[drop:]
+            self._buffer_start += drop
+
+        return _cast_like(out, self._dtype)
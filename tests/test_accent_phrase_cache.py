@@ -0,0 +1,127 @@
+import gc
+import tracemalloc
+
+import pytest
+
+from bridge_plugin.model import AccentPhrase, Mora
+from bridge_plugin.synthesis_engine.accent_phrase_cache import (
+    AccentPhraseCache,
+    _copy_accent_phrases,
+    _estimate_bytes,
+)
+
+
+def _accent_phrases(num_moras: int, pause: bool = False):
+    mora = Mora(
+        text="カ",
+        consonant="k",
+        consonant_length=0.05,
+        vowel="a",
+        vowel_length=0.1,
+        pitch=5.5,
+    )
+    return [
+        AccentPhrase(
+            moras=[mora.copy() for _ in range(num_moras)],
+            accent=1,
+            pause_mora=mora.copy() if pause else None,
+        )
+    ]
+
+
+def _put(cache, text, num_moras=2):
+    cache.put(text, 1, "0.0.1", _accent_phrases(num_moras))
+
+
+def _keys(cache):
+    return [key[0] for key in cache._entries]
+
+
+def test_evicts_least_recently_used():
+    cache = AccentPhraseCache(max_entries=2)
+    _put(cache, "a")
+    _put(cache, "b")
+    # aを参照したので、次に追加した時に破棄されるのはb
+    assert cache.get("a", 1, "0.0.1") is not None
+    _put(cache, "c")
+
+    assert _keys(cache) == ["a", "c"]
+    assert cache.get("b", 1, "0.0.1") is None
+
+
+def test_counters():
+    cache = AccentPhraseCache(max_entries=1)
+    assert cache.get("a", 1, "0.0.1") is None
+    _put(cache, "a")
+    assert cache.get(" a ", 1, "0.0.1") is not None
+    # スタイルやエンジンのバージョンが違う場合は別のキーになる
+    assert cache.get("a", 2, "0.0.1") is None
+    assert cache.get("a", 1, "0.0.2") is None
+    _put(cache, "b")
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 3
+    assert stats["evictions"] == 1
+    assert stats["entries"] == 1
+    assert stats["bytes"] == _estimate_bytes("b", _accent_phrases(2))
+
+    cache.clear()
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["bytes"] == 0
+    assert cache.stats()["hits"] == 1
+
+
+def test_zero_entries_disables_cache():
+    cache = AccentPhraseCache(max_entries=0)
+    _put(cache, "a")
+
+    assert cache.get("a", 1, "0.0.1") is None
+    assert len(cache) == 0
+    assert cache.stats()["misses"] == 0
+
+
+def test_returns_copies():
+    cache = AccentPhraseCache()
+    accent_phrases = _accent_phrases(2)
+    cache.put("a", 1, "0.0.1", accent_phrases)
+    # 追加した後に呼び出し側で書き換えても、キャッシュには影響しない
+    accent_phrases[0].moras[0].pitch = 0
+
+    first = cache.get("a", 1, "0.0.1")
+    assert first[0].moras[0].pitch == 5.5
+    first[0].moras[0].pitch = 1
+    first[0].moras.append(first[0].moras[0])
+
+    second = cache.get("a", 1, "0.0.1")
+    assert second[0].moras[0].pitch == 5.5
+    assert len(second[0].moras) == 2
+
+
+def test_byte_budget_evicts_and_skips_oversized():
+    size = _estimate_bytes("a", _accent_phrases(2))
+    cache = AccentPhraseCache(max_entries=100, max_bytes=size * 2)
+    _put(cache, "a")
+    _put(cache, "b")
+    _put(cache, "c")
+    assert _keys(cache) == ["b", "c"]
+    assert cache.stats()["bytes"] <= size * 2
+
+    # 上限を1件で超えるものはキャッシュしない
+    _put(cache, "d", num_moras=100)
+    assert _keys(cache) == ["b", "c"]
+
+
+@pytest.mark.parametrize("num_moras,pause", [(1, False), (4, True), (30, True)])
+def test_estimate_is_close_to_measured_size(num_moras, pause):
+    accent_phrases = _accent_phrases(num_moras, pause) * 3
+    gc.collect()
+    tracemalloc.start()
+    try:
+        copies = [_copy_accent_phrases(accent_phrases) for _ in range(50)]
+        measured = tracemalloc.get_traced_memory()[0] / len(copies)
+    finally:
+        tracemalloc.stop()
+
+    estimated = _estimate_bytes("", accent_phrases)
+    assert measured * 0.7 < estimated < measured * 1.5
@@ -0,0 +1,180 @@
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from bridge_plugin.synthesis_engine import accent_phrase_extractor_pool
+from bridge_plugin.synthesis_engine.accent_phrase_extractor_pool import (
+    AccentPhraseExtractorPool,
+)
+
+
+def _reversed_texts_to_accent_phrases_timed(texts):
+    # 後に投入されたチャンクほど先に終わるようにして、完了順と出力順を食い違わせる
+    time.sleep(0.02 / (1 + int(texts[0])))
+    return [(f"phrases-{text}", float(text)) for text in texts]
+
+
+class _CountingTexts:
+    """
+    取り出されたテキストの件数を数えるイテレータ
+    """
+
+    def __init__(self, total: int):
+        self.total = total
+        self.consumed = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.consumed == self.total:
+            raise StopIteration
+        self.consumed += 1
+        return str(self.consumed - 1)
+
+
+@pytest.fixture
+def make_pool(monkeypatch):
+    """
+    ワーカープロセスの代わりにスレッドでスタブの解析を行うプールを作る
+    """
+    monkeypatch.setattr(
+        accent_phrase_extractor_pool,
+        "texts_to_accent_phrases_timed",
+        _reversed_texts_to_accent_phrases_timed,
+    )
+    pools = []
+
+    def make(num_workers, chunk_size):
+        pool = AccentPhraseExtractorPool(num_workers=num_workers, chunk_size=chunk_size)
+        # ProcessPoolExecutorは最初の投入までプロセスを起動しないので、そのまま差し替えられる
+        pool._executor.shutdown()
+        pool._executor = ThreadPoolExecutor(max_workers=num_workers)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.shutdown()
+
+
+@pytest.mark.parametrize("num_workers,chunk_size", [(1, 1), (2, 3), (4, 2)])
+def test_map_keeps_input_order(make_pool, num_workers, chunk_size):
+    pool = make_pool(num_workers, chunk_size)
+    texts = [str(i) for i in range(23)]
+
+    assert list(pool.map(texts)) == [f"phrases-{text}" for text in texts]
+
+
+def test_map_timed_returns_worker_timings(make_pool):
+    pool = make_pool(2, 4)
+    texts = [str(i) for i in range(10)]
+
+    assert list(pool.map_timed(texts)) == [
+        (f"phrases-{text}", float(text)) for text in texts
+    ]
+
+
+@pytest.mark.parametrize("num_workers,chunk_size", [(1, 2), (2, 3)])
+def test_map_timed_bounds_submitted_chunks(make_pool, num_workers, chunk_size):
+    pool = make_pool(num_workers, chunk_size)
+    texts = _CountingTexts(1000)
+    max_in_flight = num_workers * 2 * chunk_size
+
+    results = pool.map_timed(texts)
+    next(results)
+    # 最初の結果を返すまでに読み込むのは、処理中にできるチャンクの分だけ
+    assert texts.consumed == max_in_flight
+
+    received = 1
+    for _ in results:
+        received += 1
+        assert texts.consumed - received <= max_in_flight
+    assert received == 1000
+
+
+def test_map_handles_empty_input(make_pool):
+    pool = make_pool(2, 2)
+
+    assert list(pool.map([])) == []
+
+
+@pytest.mark.parametrize(
+    "kwargs", [{"num_workers": 0}, {"num_workers": 1, "chunk_size": 0}]
+)
+def test_rejects_invalid_arguments(kwargs):
+    with pytest.raises(ValueError):
+        AccentPhraseExtractorPool(**kwargs)
+
+
+def test_worker_module_does_not_import_synthesis_engines():
+    # spawnで起動したワーカーが読み込むモジュールだけを新しいインタプリタで読み込む
+    code = (
+        "import sys\n"
+        "import bridge_plugin.accent_phrase_extractor\n"
+        "heavy = ['torch', 'espnet2', 'bridge_plugin.synthesis_engine']\n"
+        "print([name for name in heavy if name in sys.modules])\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=Path(__file__).resolve().parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "[]"
+
+
+_CLI_POOL_SCRIPT = """
+import sys
+from unittest import mock
+
+import audioQueryGenerator  # noqa: F401
+
+HEAVY = ["torch", "espnet2", "fastapi", "bridge_plugin.synthesis_engine"]
+
+
+def skip_initialize():
+    pass
+
+
+def loaded_heavy_modules():
+    return [name for name in HEAVY if name in sys.modules]
+
+
+if __name__ == "__main__":
+    from bridge_plugin.synthesis_engine import accent_phrase_extractor_pool
+
+    # OpenJTalkの辞書の読み込み(初回はダウンロード)は省く
+    with mock.patch.object(
+        accent_phrase_extractor_pool, "initialize_worker", skip_initialize
+    ):
+        pool = accent_phrase_extractor_pool.AccentPhraseExtractorPool(num_workers=1)
+    try:
+        print(pool._executor.submit(loaded_heavy_modules).result())
+    finally:
+        pool.shutdown()
+"""
+
+
+def test_cli_workers_do_not_import_synthesis_engines(tmp_path):
+    # spawnのワーカーは親の__main__スクリプトを読み直すので、
+    # audioQueryGeneratorを読み込むスクリプトから実際にプールを起動して確かめる
+    script = tmp_path / "start_pool.py"
+    script.write_text(_CLI_POOL_SCRIPT, encoding="utf-8")
+    root = Path(__file__).resolve().parent.parent
+    result = subprocess.run(
+        [sys.executable, str(script)],
+        cwd=root,
+        env={**os.environ, "PYTHONPATH": str(root)},
+        capture_output=True,
+        text=True,
+        check=True,
+        timeout=120,
+    )
+    assert result.stdout.strip().splitlines()[-1] == "[]"
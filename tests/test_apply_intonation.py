@@ -0,0 +1,87 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from bridge_plugin.synthesis_engine.synthesis_engine_base import apply_intonation
+
+
+def _reference_espnet(f0, intonation_scale, onkou):
+    """
+    SynthesisEngineESPNetで使っていた、1要素ずつ処理する以前の実装
+    """
+    total = 0
+    index = 0
+    for f in f0:
+        if f != 0:
+            total += f
+            index += 1
+
+    ave = total / index
+
+    pos = 0
+    for f in f0:
+        if f != 0:
+            f0[pos] = ave * onkou + (f - ave) * intonation_scale
+        pos += 1
+    return f0
+
+
+def _reference_core(f0, intonation_scale):
+    """
+    SynthesisEngineで使っていた以前の実装
+    """
+    voiced = f0 > 0
+    mean_f0 = f0[voiced].mean()
+    if not np.isnan(mean_f0):
+        f0[voiced] = (f0[voiced] - mean_f0) * intonation_scale + mean_f0
+    return f0
+
+
+def _f0(seed, length=2000, unvoiced_ratio=0.3):
+    rng = np.random.default_rng(seed)
+    f0 = rng.uniform(80, 400, length)
+    f0[rng.random(length) < unvoiced_ratio] = 0
+    return f0
+
+
+@pytest.mark.parametrize("intonation_scale", [0.0, 0.5, 1.0, 1.7])
+@pytest.mark.parametrize("pitch_scale", [-0.15, 0.0, 0.1])
+def test_matches_espnet_loop(intonation_scale, pitch_scale):
+    onkou = pitch_scale * 3 + 1
+    for seed in range(5):
+        f0 = _f0(seed)
+        expected = _reference_espnet(f0.copy(), intonation_scale, onkou)
+        actual = apply_intonation(f0, intonation_scale, pitch_ratio=onkou)
+        # 平均値の総和の順番が違うので、丸め誤差の分だけ異なる
+        np.testing.assert_allclose(actual, expected, rtol=1e-9)
+        # 入力の配列自体が書き換えられる
+        assert actual is f0
+
+
+@pytest.mark.parametrize("intonation_scale", [0.0, 0.5, 1.7])
+def test_matches_core_implementation(intonation_scale):
+    for seed in range(5):
+        f0 = _f0(seed).astype(np.float32)
+        expected = _reference_core(f0.copy(), intonation_scale)
+        actual = apply_intonation(f0, intonation_scale)
+        np.testing.assert_allclose(actual, expected, rtol=1e-6)
+        assert actual.dtype == np.float32
+
+
+@pytest.mark.parametrize("length", [0, 1, 100])
+def test_fully_unvoiced_is_unchanged(length):
+    f0 = np.zeros(length)
+    with warnings.catch_warnings():
+        # 有声部分の無い平均を求めると出るRuntimeWarningも出さない
+        warnings.simplefilter("error")
+        result = apply_intonation(f0, 1.5, pitch_ratio=1.3)
+    assert result is f0
+    np.testing.assert_array_equal(result, np.zeros(length))
+
+
+def test_single_voiced_frame():
+    f0 = np.array([0.0, 200.0, 0.0])
+    np.testing.assert_allclose(
+        apply_intonation(f0, 2.0, pitch_ratio=1.5), [0.0, 300.0, 0.0]
+    )
@@ -0,0 +1,147 @@
+import io
+import json
+import threading
+import time
+
+import pytest
+
+from audioQueryGenerator import iter_prefetched, parse_input_lines, stream_audio_queries
+
+
+class _CountingItems:
+    """
+    取り出された件数を数えるイテレータ。fail_atを指定するとその件数目で例外を送出する
+    """
+
+    def __init__(self, total, fail_at=None):
+        self.total = total
+        self.fail_at = fail_at
+        self.consumed = 0
+        self.reader_threads = set()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self.reader_threads.add(threading.get_ident())
+        if self.consumed == self.fail_at:
+            raise ValueError("broken input")
+        if self.consumed == self.total:
+            raise StopIteration
+        self.consumed += 1
+        return self.consumed - 1
+
+
+def test_parse_input_lines_accepts_text_and_jsonl():
+    lines = [
+        "こんにちは\n",
+        '{"text": "JSON", "style_id": 3}\n',
+        '{"text": "既定のスタイル"}\n',
+        '{"text": 12, "style_id": "4"}\n',
+        "  前後の空白  \n",
+    ]
+
+    assert list(parse_input_lines(lines, default_style_id=7)) == [
+        ("こんにちは", 7),
+        ("JSON", 3),
+        ("既定のスタイル", 7),
+        ("12", 4),
+        ("前後の空白", 7),
+    ]
+
+
+def test_parse_input_lines_skips_blank_and_invalid_lines(capsys):
+    lines = [
+        "最初\n",
+        "\n",
+        "   \n",
+        "{broken\n",
+        '{"style_id": 1}\n',
+        '{"text": "a", "style_id": "x"}\n',
+        "最後\n",
+    ]
+
+    assert list(parse_input_lines(lines, default_style_id=0)) == [
+        ("最初", 0),
+        ("最後", 0),
+    ]
+    warnings = capsys.readouterr().err.splitlines()
+    assert len(warnings) == 3
+    for line_number, warning in zip([4, 5, 6], warnings):
+        assert f"line {line_number}:" in warning
+
+
+def test_iter_prefetched_returns_items_in_order():
+    items = _CountingItems(100)
+
+    assert list(iter_prefetched(items, buffer_size=4)) == list(range(100))
+    # 先読みは呼び出し元とは別のスレッドで行う
+    assert items.reader_threads and threading.get_ident() not in items.reader_threads
+
+
+@pytest.mark.parametrize("buffer_size", [1, 4])
+def test_iter_prefetched_reads_ahead_at_most_buffer_size(buffer_size):
+    items = _CountingItems(1000)
+    prefetched = iter_prefetched(items, buffer_size)
+
+    assert next(prefetched) == 0
+    deadline = time.monotonic() + 5
+    while items.consumed < buffer_size + 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.1)
+
+    # キューにbuffer_size件、読み込みスレッドが入れようとしている1件、返した1件
+    assert items.consumed == buffer_size + 2
+
+
+def test_iter_prefetched_raises_reader_errors():
+    prefetched = iter_prefetched(_CountingItems(10, fail_at=3), buffer_size=2)
+
+    assert [next(prefetched) for _ in range(3)] == [0, 1, 2]
+    with pytest.raises(ValueError, match="broken input"):
+        next(prefetched)
+
+
+class _Query:
+    def __init__(self, text, style_id):
+        self.text = text
+        self.style_id = style_id
+
+    def json(self, ensure_ascii=True):
+        return json.dumps(
+            {"text": self.text, "style_id": self.style_id}, ensure_ascii=ensure_ascii
+        )
+
+
+class _SpeechSynthesis:
+    """
+    SpeechSynthesisの代わりに、受け取ったテキストとスタイルIDをそのまま返す
+    """
+
+    def __init__(self):
+        self.items = []
+
+    def audio_query_batch(self, items):
+        for text, style_id in items:
+            self.items.append((text, style_id))
+            yield _Query(text, style_id)
+
+
+def test_stream_audio_queries_writes_jsonl(capsys):
+    input_stream = io.StringIO('テキスト\n{"text": "JSON", "style_id": 2}\n{broken\n\n最後\n')
+    output_stream = io.StringIO()
+    speech_synthesis = _SpeechSynthesis()
+
+    stream_audio_queries(
+        speech_synthesis, input_stream, output_stream, default_style_id=5, buffer_size=2
+    )
+
+    assert speech_synthesis.items == [("テキスト", 5), ("JSON", 2), ("最後", 5)]
+    assert [json.loads(line) for line in output_stream.getvalue().splitlines()] == [
+        {"text": "テキスト", "style_id": 5},
+        {"text": "JSON", "style_id": 2},
+        {"text": "最後", "style_id": 5},
+    ]
+    # 日本語はエスケープせずに書き出す
+    assert "テキスト" in output_stream.getvalue()
+    assert "line 3:" in capsys.readouterr().err
@@ -0,0 +1,240 @@
+import contextlib
+import os
+import platform
+import shutil
+import subprocess
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from bridge_plugin.synthesis_engine.core_process_pool import CoreProcessPool
+from bridge_plugin.synthesis_engine.core_wrapper import (
+    CORENAME_DICT,
+    CoreError,
+    CoreWrapper,
+    OldCoreError,
+)
+
+_STUB_SOURCE = (
+    Path(__file__).resolve().parent.parent / "benchmarks" / "stub_core" / "stub_core.c"
+)
+_PHONEME_SIZE = 45
+
+
+@pytest.fixture(scope="module")
+def core_dir(tmp_path_factory):
+    """
+    ベンチマーク用のスタブをコアライブラリとしてビルドする。Cコンパイラが無い場合はスキップする
+    """
+    compiler = os.environ.get("CC", "cc")
+    if shutil.which(compiler) is None:
+        pytest.skip(f"Cコンパイラ({compiler})がありません")
+    core_dir = tmp_path_factory.mktemp("core")
+    output = core_dir / CORENAME_DICT[platform.system()][0]
+    subprocess.run(
+        [compiler, "-O1", "-shared", "-fPIC", "-o", str(output), str(_STUB_SOURCE)],
+        check=True,
+    )
+    return core_dir
+
+
+@pytest.fixture(scope="module")
+def core(core_dir):
+    return CoreWrapper(False, core_dir)
+
+
+@pytest.fixture(scope="module")
+def pool(core_dir):
+    # ワーカーの起動は遅いので、終了を確かめるテスト以外では使い回す
+    with CoreProcessPool(False, core_dir, num_workers=1) as pool:
+        yield pool
+
+
+def _yukarin_s_args(length):
+    return dict(
+        length=length,
+        phoneme_list=np.arange(length, dtype=np.int64),
+        style_id=np.array([0], dtype=np.int64),
+    )
+
+
+def _yukarin_sa_args(length):
+    phonemes = np.arange(length, dtype=np.int64)
+    return dict(
+        length=length,
+        vowel_phoneme_list=phonemes[np.newaxis],
+        consonant_phoneme_list=phonemes[np.newaxis],
+        start_accent_list=phonemes[np.newaxis],
+        end_accent_list=phonemes[np.newaxis],
+        start_accent_phrase_list=phonemes[np.newaxis],
+        end_accent_phrase_list=phonemes[np.newaxis],
+        style_id=np.array([0], dtype=np.int64),
+    )
+
+
+def _decode_args(length, style_id=0):
+    rng = np.random.default_rng(length)
+    return dict(
+        length=length,
+        phoneme_size=_PHONEME_SIZE,
+        f0=rng.uniform(100, 200, (length, 1)).astype(np.float32),
+        phoneme=rng.random((length, _PHONEME_SIZE), dtype=np.float32),
+        style_id=np.array([style_id], dtype=np.int64),
+    )
+
+
+_FORWARD_ARGS = {
+    "yukarin_s_forward": _yukarin_s_args,
+    "yukarin_sa_forward": _yukarin_sa_args,
+    "decode_forward": _decode_args,
+}
+
+
+def _exists(name):
+    try:
+        shm = SharedMemory(name=name)
+    except FileNotFoundError:
+        return False
+    shm.close()
+    return True
+
+
+@pytest.mark.parametrize("method", list(_FORWARD_ARGS))
+@pytest.mark.parametrize("length", [1, 37])
+def test_forward_matches_in_process_core(pool, core, method, length):
+    session = pool.sessions[0]
+
+    result = getattr(session, method)(**_FORWARD_ARGS[method](length))
+
+    expected = getattr(core, method)(**_FORWARD_ARGS[method](length))
+    assert result.dtype == np.float32
+    assert result.shape == expected.shape
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_yukarin_sa_output_has_a_row_per_style(pool):
+    result = pool.sessions[0].yukarin_sa_forward(**_yukarin_sa_args(7))
+
+    assert result.shape == (1, 7)
+
+
+def test_results_are_not_overwritten_by_later_calls(pool, core):
+    session = pool.sessions[0]
+
+    first = session.decode_forward(**_decode_args(8))
+    session.decode_forward(**_decode_args(8, style_id=1))
+
+    np.testing.assert_array_equal(first, core.decode_forward(**_decode_args(8)))
+
+
+def test_out_receives_the_result(pool, core):
+    out = np.full(16 * 256, np.nan, dtype=np.float32)
+
+    result = pool.sessions[0].decode_forward(**_decode_args(16), out=out)
+
+    assert result is out
+    np.testing.assert_array_equal(out, core.decode_forward(**_decode_args(16)))
+
+
+@pytest.mark.parametrize(
+    "out",
+    [
+        np.empty(15 * 256, dtype=np.float32),
+        np.empty(16 * 256, dtype=np.float64),
+        np.empty(16 * 256 * 2, dtype=np.float32)[::2],
+    ],
+    ids=["shape", "dtype", "non_contiguous"],
+)
+def test_out_is_checked_like_core_wrapper(pool, core, out):
+    with pytest.raises(ValueError):
+        core.decode_forward(**_decode_args(16), out=out)
+    with pytest.raises(ValueError):
+        pool.sessions[0].decode_forward(**_decode_args(16), out=out)
+
+    # 失敗した呼び出しの後も使える
+    assert pool.sessions[0].decode_forward(**_decode_args(1)).shape == (256,)
+
+
+def test_buffers_grow_and_retired_buffers_are_unlinked_on_close(core_dir, core):
+    pool = CoreProcessPool(False, core_dir, num_workers=1)
+    session = pool.sessions[0]
+    try:
+        session.decode_forward(**_decode_args(1))
+        small_input, small_output = session._input, session._output
+        session.decode_forward(**_decode_args(1))
+        # 足りている間は作り直さない
+        assert session._input is small_input
+        assert session._output is small_output
+
+        result = session.decode_forward(**_decode_args(64))
+
+        assert session._output.size >= 64 * 256 * 4
+        assert session._input.size > small_input.size
+        assert {small_input.name, small_output.name} == {
+            shm.name for shm in session._retired
+        }
+        np.testing.assert_array_equal(result, core.decode_forward(**_decode_args(64)))
+        names = [shm.name for shm in [session._input, session._output]]
+        names += [shm.name for shm in session._retired]
+        assert all(_exists(name) for name in names)
+    finally:
+        pool.close()
+
+    assert not session._process.is_alive()
+    assert not any(_exists(name) for name in names)
+    assert session._retired == []
+
+
+def test_core_error_is_forwarded(pool, core):
+    session = pool.sessions[0]
+
+    with pytest.raises(CoreError) as expected:
+        core.decode_forward(**_decode_args(4, style_id=-1))
+    with pytest.raises(CoreError) as actual:
+        session.decode_forward(**_decode_args(4, style_id=-1))
+
+    assert str(actual.value) == str(expected.value)
+    # エラーの後もワーカーは呼び出しを受け付ける
+    assert session.decode_forward(**_decode_args(4)).shape == (4 * 256,)
+
+
+def test_other_exceptions_are_forwarded_as_runtime_error(pool):
+    session = pool.sessions[0]
+
+    with pytest.raises(RuntimeError, match="^TypeError: "):
+        session.yukarin_s_forward(**_yukarin_s_args(4), unknown=1)
+
+    assert session.yukarin_s_forward(**_yukarin_s_args(4)).shape == (4,)
+
+
+def test_non_forward_methods_match_in_process_core(pool, core):
+    session = pool.sessions[0]
+
+    assert session.metas() == core.metas()
+    assert session.supported_devices() == core.supported_devices()
+    assert session.is_model_loaded(3) is False
+    # CoreWrapper.load_modelは読み込みに成功してもOldCoreErrorを送出する
+    with pytest.raises(OldCoreError):
+        session.load_model(3)
+    assert session.is_model_loaded(3) is True
+    with contextlib.suppress(OldCoreError):
+        core.load_model(3)
+    assert core.is_model_loaded(3) is True
+
+
+def test_close_stops_workers(core_dir):
+    pool = CoreProcessPool(False, core_dir, num_workers=2)
+    processes = [session._process for session in pool.sessions]
+
+    pool.close()
+
+    assert not any(process.is_alive() for process in processes)
+    with pytest.raises((OSError, ValueError)):
+        pool.sessions[0].metas()
+
+
+def test_rejects_invalid_num_workers(core_dir):
+    with pytest.raises(ValueError):
+        CoreProcessPool(False, core_dir, num_workers=0)
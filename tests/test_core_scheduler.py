@@ -0,0 +1,331 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from bridge_plugin.synthesis_engine.core_scheduler import CoreScheduler
+from bridge_plugin.synthesis_engine.core_wrapper import OldCoreError
+
+
+class _BlockingSession:
+    """
+    releaseがセットされるまで推論を止め、入力を記録するセッションのスタブ
+    """
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _run(self, method, phoneme_list, style_id):
+        with self._lock:
+            self.calls.append((method, phoneme_list.tolist()))
+        self.started.set()
+        self.release.wait(5)
+        if style_id[0] < 0:
+            raise ValueError("invalid style_id")
+        return (phoneme_list * 0.5 + style_id[0]).astype(np.float32)
+
+    def yukarin_s_forward(self, length, phoneme_list, style_id):
+        return self._run("yukarin_s_forward", phoneme_list, style_id)
+
+
+def _yukarin_s_args(phoneme_list, style_id=0):
+    return dict(
+        length=len(phoneme_list),
+        phoneme_list=np.array(phoneme_list, dtype=np.int64),
+        style_id=np.array([style_id], dtype=np.int64),
+    )
+
+
+@pytest.fixture
+def session():
+    session = _BlockingSession()
+    yield session
+    session.release.set()
+
+
+def test_identical_requests_share_one_inference(session):
+    scheduler = CoreScheduler([session], coalesce=True)
+    try:
+        running = scheduler.submit("yukarin_s_forward", **_yukarin_s_args([1, 2]))
+        assert session.started.wait(5)
+        # 実行中のタスクと同じ入力は結果を共有し、異なる入力は新しく実行される
+        followers = [
+            scheduler.submit("yukarin_s_forward", **_yukarin_s_args([1, 2]))
+            for _ in range(3)
+        ]
+        other = scheduler.submit("yukarin_s_forward", **_yukarin_s_args([1, 2], 1))
+        session.release.set()
+
+        results = [future.result(5) for future in [running, *followers]]
+        np.testing.assert_allclose(other.result(5), [1.5, 2.0])
+    finally:
+        scheduler.shutdown()
+
+    assert session.calls == [
+        ("yukarin_s_forward", [1, 2]),
+        ("yukarin_s_forward", [1, 2]),
+    ]
+    for result in results:
+        np.testing.assert_allclose(result, [0.5, 1.0])
+    # 呼び出し元が書き換えても他の結果に影響しないように、別々の配列が返される
+    assert len({id(result) for result in results}) == len(results)
+    assert scheduler.stats()["coalesced"]["yukarin_s_forward"] == 3
+
+
+def test_finished_task_is_not_shared(session):
+    session.release.set()
+    scheduler = CoreScheduler([session], coalesce=True)
+    try:
+        for _ in range(2):
+            scheduler.submit("yukarin_s_forward", **_yukarin_s_args([3])).result(5)
+    finally:
+        scheduler.shutdown()
+
+    assert len(session.calls) == 2
+    assert scheduler.stats()["coalesced"]["yukarin_s_forward"] == 0
+
+
+def test_no_coalescing_by_default(session):
+    scheduler = CoreScheduler([session])
+    try:
+        futures = [
+            scheduler.submit("yukarin_s_forward", **_yukarin_s_args([1, 2]))
+            for _ in range(2)
+        ]
+        session.release.set()
+        for future in futures:
+            future.result(5)
+    finally:
+        scheduler.shutdown()
+
+    assert len(session.calls) == 2
+
+
+def test_shared_exception(session):
+    scheduler = CoreScheduler([session], coalesce=True)
+    try:
+        futures = [
+            scheduler.submit("yukarin_s_forward", **_yukarin_s_args([1], -1))
+            for _ in range(2)
+        ]
+        session.release.set()
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result(5)
+    finally:
+        scheduler.shutdown()
+
+    assert len(session.calls) == 1
+
+
+class _Session:
+    """
+    gateがセットされるまで推論を止め、呼び出された順番を記録するセッションのスタブ
+    barrierを渡すと、全てのセッションで同時に推論している間だけ先に進む
+    """
+
+    def __init__(self, gate, calls, barrier=None, load_error=None):
+        self.gate = gate
+        self.calls = calls
+        self.barrier = barrier
+        self.load_error = load_error
+        self.loaded = []
+        self.started = threading.Event()
+
+    def _run(self, method, tag):
+        self.calls.append((method, tag))
+        self.started.set()
+        if self.barrier is not None:
+            self.barrier.wait(5)
+        self.gate.wait(5)
+        if tag == "error":
+            raise ValueError(tag)
+        return np.array([len(self.calls)], dtype=np.float32)
+
+    def yukarin_s_forward(self, phoneme_list, **kwargs):
+        return self._run("yukarin_s_forward", phoneme_list)
+
+    def yukarin_sa_forward(self, vowel_phoneme_list, **kwargs):
+        return self._run("yukarin_sa_forward", vowel_phoneme_list)
+
+    def decode_forward(self, phoneme, **kwargs):
+        return self._run("decode_forward", phoneme)
+
+    def load_model(self, style_id):
+        self.loaded.append(style_id)
+        if self.load_error is not None:
+            raise self.load_error
+
+
+def _submit(scheduler, method, tag):
+    # 引数の中身はスタブでは使わないので、呼び出し順を確かめるための目印を渡す
+    arg = {
+        "yukarin_s_forward": "phoneme_list",
+        "yukarin_sa_forward": "vowel_phoneme_list",
+        "decode_forward": "phoneme",
+    }[method]
+    return scheduler.submit(method, **{arg: tag, "length": 1, "style_id": 0})
+
+
+def test_yukarin_runs_before_queued_decode():
+    gate = threading.Event()
+    calls = []
+    session = _Session(gate, calls)
+    scheduler = CoreScheduler([session])
+    try:
+        running = _submit(scheduler, "decode_forward", "running")
+        assert session.started.wait(5)
+        futures = [
+            _submit(scheduler, "decode_forward", "decode1"),
+            _submit(scheduler, "yukarin_s_forward", "s"),
+            _submit(scheduler, "decode_forward", "decode2"),
+            _submit(scheduler, "yukarin_sa_forward", "sa"),
+        ]
+        gate.set()
+        for future in [running, *futures]:
+            future.result(5)
+    finally:
+        gate.set()
+        scheduler.shutdown()
+
+    # 実行中の推論は中断せず、待機中の波形生成より音素長・音高の推論を先に、同じ優先度では到着順に実行する
+    assert [tag for _, tag in calls] == ["running", "s", "sa", "decode1", "decode2"]
+
+
+def test_sessions_run_concurrently():
+    gate = threading.Event()
+    gate.set()
+    calls = []
+    # 3つのセッションが同時に推論しなければ、barrierが壊れて例外になる
+    barrier = threading.Barrier(3)
+    sessions = [_Session(gate, calls, barrier) for _ in range(3)]
+    scheduler = CoreScheduler(sessions)
+    try:
+        futures = [_submit(scheduler, "decode_forward", f"decode{i}") for i in range(3)]
+        for future in futures:
+            future.result(5)
+    finally:
+        scheduler.shutdown()
+
+    assert all(session.started.is_set() for session in sessions)
+    assert scheduler.stats()["executed"]["decode_forward"] == 3
+
+
+def test_session_exception_is_set_on_future():
+    gate = threading.Event()
+    gate.set()
+    scheduler = CoreScheduler([_Session(gate, [])])
+    try:
+        failed = _submit(scheduler, "decode_forward", "error")
+        with pytest.raises(ValueError):
+            failed.result(5)
+        # 例外の後もワーカーは動き続ける
+        assert _submit(scheduler, "decode_forward", "ok").result(5) is not None
+    finally:
+        scheduler.shutdown()
+
+
+def test_load_model_continues_after_old_core_error():
+    gate = threading.Event()
+    sessions = [
+        _Session(gate, []),
+        _Session(gate, [], load_error=OldCoreError()),
+        _Session(gate, []),
+    ]
+    scheduler = CoreScheduler(sessions)
+    try:
+        with pytest.raises(OldCoreError):
+            scheduler.load_model(3)
+    finally:
+        scheduler.shutdown()
+
+    assert [session.loaded for session in sessions] == [[3], [3], [3]]
+
+
+def test_load_model_propagates_other_errors_immediately():
+    gate = threading.Event()
+    sessions = [_Session(gate, [], load_error=RuntimeError()), _Session(gate, [])]
+    scheduler = CoreScheduler(sessions)
+    try:
+        with pytest.raises(RuntimeError):
+            scheduler.load_model(3)
+    finally:
+        scheduler.shutdown()
+
+    assert [session.loaded for session in sessions] == [[3], []]
+
+
+def test_stats_queue_depth_and_wait():
+    gate = threading.Event()
+    session = _Session(gate, [])
+    scheduler = CoreScheduler([session])
+    try:
+        running = _submit(scheduler, "decode_forward", "running")
+        assert session.started.wait(5)
+        futures = [
+            _submit(scheduler, "decode_forward", "decode1"),
+            _submit(scheduler, "decode_forward", "decode2"),
+            _submit(scheduler, "yukarin_s_forward", "s"),
+        ]
+        stats = scheduler.stats()
+        assert stats["sessions"] == 1
+        assert stats["queue_depth"] == {
+            "yukarin_s_forward": 1,
+            "yukarin_sa_forward": 0,
+            "decode_forward": 2,
+        }
+        assert stats["executed"]["decode_forward"] == 1
+
+        wait = 0.1
+        time.sleep(wait)
+        gate.set()
+        for future in [running, *futures]:
+            future.result(5)
+    finally:
+        gate.set()
+        scheduler.shutdown()
+
+    stats = scheduler.stats()
+    assert stats["queue_depth"] == {
+        "yukarin_s_forward": 0,
+        "yukarin_sa_forward": 0,
+        "decode_forward": 0,
+    }
+    assert stats["executed"] == {
+        "yukarin_s_forward": 1,
+        "yukarin_sa_forward": 0,
+        "decode_forward": 3,
+    }
+    # 最初の波形生成はすぐに実行され、残りの2件はgateが開くまで待つ
+    assert stats["max_wait"]["decode_forward"] >= wait
+    assert wait * 2 / 3 <= stats["mean_wait"]["decode_forward"] < wait + 1
+    assert stats["mean_wait"]["yukarin_s_forward"] >= wait
+    assert stats["mean_wait"]["yukarin_sa_forward"] == 0.0
+
+
+def test_shutdown_drains_queue():
+    gate = threading.Event()
+    calls = []
+    session = _Session(gate, calls)
+    scheduler = CoreScheduler([session])
+    running = _submit(scheduler, "decode_forward", "running")
+    assert session.started.wait(5)
+    queued = [_submit(scheduler, "decode_forward", f"decode{i}") for i in range(4)]
+
+    shutdown = threading.Thread(target=scheduler.shutdown)
+    shutdown.start()
+    # shutdownは実行中・待機中のタスクが終わるまで戻らず、新しいタスクは受け付けない
+    shutdown.join(0.1)
+    assert shutdown.is_alive()
+    with pytest.raises(RuntimeError):
+        _submit(scheduler, "decode_forward", "late")
+    gate.set()
+    shutdown.join(5)
+
+    assert not shutdown.is_alive()
+    assert all(future.done() for future in [running, *queued])
+    assert [tag for _, tag in calls] == ["running"] + [f"decode{i}" for i in range(4)]
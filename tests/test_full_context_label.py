@@ -0,0 +1,230 @@
+import random
+import re
+from typing import Dict, List
+
+import pytest
+
+from bridge_plugin.full_context_label import Phoneme, Utterance
+
+# 固定の区切り文字で解析する前の実装が使っていた正規表現。新しい実装の基準として使う
+_REFERENCE_PATTERN = re.compile(
+    r"^(?P<p1>.+?)\^(?P<p2>.+?)\-(?P<p3>.+?)\+(?P<p4>.+?)\=(?P<p5>.+?)"
+    r"/A\:(?P<a1>.+?)\+(?P<a2>.+?)\+(?P<a3>.+?)"
+    r"/B\:(?P<b1>.+?)\-(?P<b2>.+?)\_(?P<b3>.+?)"
+    r"/C\:(?P<c1>.+?)\_(?P<c2>.+?)\+(?P<c3>.+?)"
+    r"/D\:(?P<d1>.+?)\+(?P<d2>.+?)\_(?P<d3>.+?)"
+    r"/E\:(?P<e1>.+?)\_(?P<e2>.+?)\!(?P<e3>.+?)\_(?P<e4>.+?)\-(?P<e5>.+?)"
+    r"/F\:(?P<f1>.+?)\_(?P<f2>.+?)\#(?P<f3>.+?)\_(?P<f4>.+?)\@(?P<f5>.+?)\_(?P<f6>.+?)\|(?P<f7>.+?)\_(?P<f8>.+?)"  # noqa
+    r"/G\:(?P<g1>.+?)\_(?P<g2>.+?)\%(?P<g3>.+?)\_(?P<g4>.+?)\_(?P<g5>.+?)"
+    r"/H\:(?P<h1>.+?)\_(?P<h2>.+?)"
+    r"/I\:(?P<i1>.+?)\-(?P<i2>.+?)\@(?P<i3>.+?)\+(?P<i4>.+?)\&(?P<i5>.+?)\-(?P<i6>.+?)\|(?P<i7>.+?)\+(?P<i8>.+?)"  # noqa
+    r"/J\:(?P<j1>.+?)\_(?P<j2>.+?)"
+    r"/K\:(?P<k1>.+?)\+(?P<k2>.+?)\-(?P<k3>.+?)$"
+)
+
+_LABEL_FORMAT = (
+    "{p1}^{p2}-{p3}+{p4}={p5}"
+    "/A:{a1}+{a2}+{a3}"
+    "/B:{b1}-{b2}_{b3}"
+    "/C:{c1}_{c2}+{c3}"
+    "/D:{d1}+{d2}_{d3}"
+    "/E:{e1}_{e2}!{e3}_{e4}-{e5}"
+    "/F:{f1}_{f2}#{f3}_{f4}@{f5}_{f6}|{f7}_{f8}"
+    "/G:{g1}_{g2}%{g3}_{g4}_{g5}"
+    "/H:{h1}_{h2}"
+    "/I:{i1}-{i2}@{i3}+{i4}&{i5}-{i6}|{i7}+{i8}"
+    "/J:{j1}_{j2}"
+    "/K:{k1}+{k2}-{k3}"
+)
+
+_PHONEMES = ["xx", "sil", "pau", "a", "i", "u", "e", "o", "N", "cl", "k", "ky", "sh"]
+_KEYS = re.findall(r"\{(\w+)\}", _LABEL_FORMAT)
+
+
+def _random_label(rng: random.Random) -> str:
+    contexts: Dict[str, str] = {}
+    for key in _KEYS:
+        if key.startswith("p"):
+            contexts[key] = rng.choice(_PHONEMES)
+        elif rng.random() < 0.2:
+            contexts[key] = "xx"
+        elif key == "a1":
+            # アクセント核との相対位置は負の値をとる
+            contexts[key] = str(rng.randint(-20, 20))
+        else:
+            contexts[key] = str(rng.randint(0, 120))
+    return _LABEL_FORMAT.format(**contexts)
+
+
+def _reference_contexts(label: str) -> Dict[str, str]:
+    return _REFERENCE_PATTERN.search(label).groupdict()
+
+
+@pytest.fixture(scope="module")
+def labels():
+    rng = random.Random(0)
+    return [_random_label(rng) for _ in range(20000)]
+
+
+def test_contexts_match_regex_reference(labels):
+    for label in labels:
+        assert Phoneme.from_label(label).contexts == _reference_contexts(label)
+
+
+def test_eager_fields_match_regex_reference(labels):
+    for label in labels:
+        phoneme = Phoneme.from_label(label)
+        reference = _reference_contexts(label)
+        for key in ("p3", "a2", "f1", "f2", "f3", "f5", "i3"):
+            assert getattr(phoneme, key) == reference[key], (key, label)
+
+
+def test_label_round_trip(labels):
+    for label in labels[:1000]:
+        phoneme = Phoneme.from_label(label)
+        assert phoneme.label == label
+        # 全てのcontextを解析した後も同じラベルに戻る
+        phoneme.contexts
+        assert phoneme.label == label
+
+
+def test_pause_phoneme():
+    label = _LABEL_FORMAT.format(**{key: "xx" for key in _KEYS})
+    phoneme = Phoneme.from_label(label)
+    assert phoneme.is_pause()
+    assert phoneme.contexts == _reference_contexts(label)
+
+
+def test_set_context_updates_eager_field_and_label(labels):
+    phoneme = Phoneme.from_label(labels[0])
+    phoneme.set_context("f2", "7")
+    assert phoneme.f2 == "7"
+    assert phoneme.contexts["f2"] == "7"
+    assert _reference_contexts(phoneme.label)["f2"] == "7"
+
+    phoneme.set_contexts({"a2": "3", "k1": "9"})
+    assert phoneme.a2 == "3"
+    assert _reference_contexts(phoneme.label)["k1"] == "9"
+
+
+def test_malformed_label_raises():
+    phoneme = Phoneme.from_label(_random_label(random.Random(1)))
+    phoneme._label = phoneme._label.split("/K:")[0]
+    with pytest.raises(ValueError):
+        phoneme.contexts
+
+
+def _utterance_labels(rng: random.Random, structure: List[List[int]]) -> List[str]:
+    """
+    structureの各要素を呼気段落、その要素をアクセント句のモーラ数として、発話全体のラベルを作る
+    区切りに使うcontext以外はランダムな値のままなので、Utterance.phonemesで書き換えられる
+    """
+    pause = _LABEL_FORMAT.format(**{key: "xx" for key in _KEYS})
+    labels = [pause]
+    for i_breath_group, mora_nums in enumerate(structure):
+        for i_accent_phrase, mora_num in enumerate(mora_nums):
+            accent = rng.randint(1, mora_num)
+            for i_mora in range(mora_num):
+                for phoneme in rng.choice([["k", "a"], ["i"], ["sh", "o"]]):
+                    label = _random_label(rng)
+                    contexts = _reference_contexts(label)
+                    contexts.update(
+                        p3=phoneme,
+                        a2=str(i_mora + 1),
+                        f1=str(mora_num),
+                        f2=str(accent),
+                        f3="0",
+                        f5=str(i_accent_phrase + 1),
+                        i3=str(i_breath_group + 1),
+                    )
+                    labels.append(_LABEL_FORMAT.format(**contexts))
+        labels.append(pause)
+    return labels
+
+
+def _reference_phonemes(utterance: Utterance) -> List[Phoneme]:
+    """
+    1つずつcontextを書き換えていた以前のUtterance.phonemesの実装
+    """
+    accent_phrases = [
+        accent_phrase
+        for breath_group in utterance.breath_groups
+        for accent_phrase in breath_group.accent_phrases
+    ]
+    for prev, cent, post in zip(
+        [None] + accent_phrases[:-1], accent_phrases, accent_phrases[1:] + [None]
+    ):
+        mora_num = len(cent.moras)
+        accent = cent.accent
+        if prev is not None:
+            prev.set_context("g1", str(mora_num))
+            prev.set_context("g2", str(accent))
+        if post is not None:
+            post.set_context("e1", str(mora_num))
+            post.set_context("e2", str(accent))
+        cent.set_context("f1", str(mora_num))
+        cent.set_context("f2", str(accent))
+        for i_mora, mora in enumerate(cent.moras):
+            mora.set_context("a1", str(i_mora - accent + 1))
+            mora.set_context("a2", str(i_mora + 1))
+            mora.set_context("a3", str(mora_num - i_mora))
+
+    breath_groups = utterance.breath_groups
+    for prev, cent, post in zip(
+        [None] + breath_groups[:-1], breath_groups, breath_groups[1:] + [None]
+    ):
+        accent_phrase_num = len(cent.accent_phrases)
+        if prev is not None:
+            prev.set_context("j1", str(accent_phrase_num))
+        if post is not None:
+            post.set_context("h1", str(accent_phrase_num))
+        cent.set_context("i1", str(accent_phrase_num))
+        cent.set_context("i5", str(accent_phrases.index(cent.accent_phrases[0]) + 1))
+        cent.set_context(
+            "i6",
+            str(len(accent_phrases) - accent_phrases.index(cent.accent_phrases[0])),
+        )
+    utterance.set_context("k2", str(len(accent_phrases)))
+
+    phonemes: List[Phoneme] = []
+    for i in range(len(utterance.pauses)):
+        if utterance.pauses[i] is not None:
+            phonemes += [utterance.pauses[i]]
+        if i < len(utterance.pauses) - 1:
+            phonemes += breath_groups[i].phonemes
+    return phonemes
+
+
+def _parse(labels: List[str]) -> Utterance:
+    return Utterance.from_phonemes([Phoneme.from_label(label) for label in labels])
+
+
+@pytest.mark.parametrize(
+    "structure",
+    [
+        [[3]],
+        [[2, 4, 1]],
+        [[3, 2], [1], [4, 2, 5], [2, 2]],
+        [[1]] * 5,
+    ],
+)
+def test_utterance_phonemes_match_reference(structure):
+    labels = _utterance_labels(random.Random(len(structure)), structure)
+    expected = [p.label for p in _reference_phonemes(_parse(labels))]
+    actual = [p.label for p in _parse(labels).phonemes]
+
+    assert actual == expected
+    # e1/e2, g1/g2, h1/j1, i5/i6, k2などが実際に書き換えられていること
+    assert actual != labels
+
+
+def test_utterance_phonemes_match_reference_after_editing():
+    # アクセント句の削除・アクセント位置の変更の後に、contextを作り直す場合
+    labels = _utterance_labels(random.Random(0), [[3, 2, 4], [2], [1, 3]])
+    utterances = [_parse(labels), _parse(labels)]
+    for utterance in utterances:
+        del utterance.breath_groups[0].accent_phrases[1]
+        utterance.breath_groups[2].accent_phrases[1].accent = 2
+
+    expected = [p.label for p in _reference_phonemes(utterances[0])]
+    assert [p.label for p in utterances[1].phonemes] == expected
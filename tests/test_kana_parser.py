@@ -0,0 +1,167 @@
+import random
+from typing import List
+
+import pytest
+
+from bridge_plugin.kana_parser import (
+    IncrementalKanaSerializer,
+    create_kana,
+    create_kana_batch,
+    parse_kana,
+    text2mora_with_unvoice,
+)
+from bridge_plugin.model import Mora, ParseKanaError, ParseKanaErrorCode
+
+_KANAS = list(text2mora_with_unvoice)
+
+
+def _reference_moras(phrase: str) -> List[str]:
+    """
+    トライ木に置き換える前と同じく、残りの文字列全体から最長一致する仮名を探す
+    """
+    result = []
+    base_index = 0
+    while base_index < len(phrase):
+        matched = None
+        stack = ""
+        for char in phrase[base_index:]:
+            stack += char
+            if stack in text2mora_with_unvoice:
+                matched = stack
+        assert matched is not None
+        result.append(matched)
+        base_index += len(matched)
+    return result
+
+
+def _random_phrase(rng: random.Random, n: int) -> str:
+    return "".join(rng.choice(_KANAS) for _ in range(n))
+
+
+def test_longest_match_matches_reference():
+    rng = random.Random(0)
+    for _ in range(500):
+        phrase = _random_phrase(rng, rng.randint(1, 12))
+        moras = parse_kana(phrase + "'")[0].moras
+        expected = _reference_moras(phrase)
+        assert len(moras) == len(expected)
+        for mora, text in zip(moras, expected):
+            assert mora == text2mora_with_unvoice[text]
+
+
+def test_prefers_longer_kana():
+    moras = parse_kana("キャ'ンディ")[0].moras
+    assert [mora.text for mora in moras] == ["キャ", "ン", "ディ"]
+
+
+def test_unvoiced_mora():
+    moras = parse_kana("_シ'タ")[0].moras
+    assert moras[0].text == "シ"
+    assert moras[0].vowel == "I"
+    assert moras[1].vowel == "a"
+
+
+def test_moras_are_independent():
+    first = parse_kana("ア'ア")[0]
+    first.moras[0].pitch = 5.0
+    second = parse_kana("ア'ア")[0]
+    assert second.moras[0].pitch == 0
+    assert first.moras[1].pitch == 0
+
+
+def test_moras_match_validated_model():
+    for accent_phrase in parse_kana("コ'ンニチワ、_キョ'ウワ/イ'イ？"):
+        for mora in accent_phrase.moras:
+            assert mora == Mora(**mora.dict())
+        if accent_phrase.pause_mora is not None:
+            pause_mora = accent_phrase.pause_mora
+            assert pause_mora == Mora(**pause_mora.dict())
+
+
+@pytest.mark.parametrize(
+    "kana",
+    [
+        "ア'",
+        "コ'ンニチワ",
+        "コ'ンニチワ、_キョ'ウワ/イ'イ？",
+        "ファ'/ヴォ'、ア'ア？",
+    ],
+)
+def test_round_trip(kana):
+    accent_phrases = parse_kana(kana)
+    assert create_kana(accent_phrases) == kana
+    assert create_kana_batch([accent_phrases, accent_phrases]) == [kana, kana]
+
+
+def test_incremental_serializer():
+    accent_phrases = parse_kana("コ'ンニチワ、_キョ'ウワ/イ'イ")
+    serializer = IncrementalKanaSerializer(accent_phrases)
+    assert serializer.kana == create_kana(accent_phrases)
+
+    replaced = parse_kana("ア'シタ")[0]
+    replaced.pause_mora = accent_phrases[1].pause_mora
+    assert serializer.replace(1, replaced) == "コ'ンニチワ、ア'シタ/イ'イ"
+
+
+def test_incremental_serializer_pause_boundaries():
+    accent_phrases = parse_kana("コ'ンニチワ/キョ'ウワ、イ'イ")
+    serializer = IncrementalKanaSerializer(accent_phrases)
+
+    # 置き換えたアクセント句のpause_moraに合わせて、後ろの区切り文字が変わる
+    with_pause = parse_kana("ア'シタ、イ'イ")[0]
+    assert serializer.replace(0, with_pause) == "ア'シタ、キョ'ウワ、イ'イ"
+    without_pause = parse_kana("ア'シタ")[0]
+    assert serializer.replace(1, without_pause) == "ア'シタ、ア'シタ/イ'イ"
+    # 最後のアクセント句の後ろには、pause_moraがあっても区切り文字を付けない
+    assert serializer.replace(2, with_pause) == "ア'シタ、ア'シタ/ア'シタ"
+
+
+def test_incremental_serializer_interrogative():
+    accent_phrases = parse_kana("コ'ンニチワ、キョ'ウワ/イ'イ")
+    serializer = IncrementalKanaSerializer(accent_phrases)
+
+    interrogative = parse_kana("ホ'ント？、イ'イ")[0]
+    assert serializer.replace(1, interrogative) == "コ'ンニチワ、ホ'ント？、イ'イ"
+    assert serializer.replace(2, parse_kana("イ'イ？")[0]) == ("コ'ンニチワ、ホ'ント？、イ'イ？")
+    assert parse_kana(serializer.kana)[2].is_interrogative
+
+
+def test_incremental_append_matches_create_kana():
+    rng = random.Random(0)
+    kana = "/".join(
+        "".join(rng.choice(["ア", "_キ", "シャ", "ン", "ッ"]) for _ in range(3))
+        + "'"
+        + ("？" if i % 7 == 6 else "")
+        for i in range(50)
+    )
+    kana = kana.replace("/", "、", 10)
+    accent_phrases = parse_kana(kana)
+
+    serializer = IncrementalKanaSerializer([])
+    assert serializer.kana == ""
+    for i, accent_phrase in enumerate(accent_phrases):
+        assert serializer.append(accent_phrase) == create_kana(accent_phrases[: i + 1])
+    assert serializer.kana == create_kana(accent_phrases) == kana
+
+
+def test_long_phrase():
+    kana = "ア'" + "イ" * 400
+    moras = parse_kana(kana)[0].moras
+    assert len(moras) == 401
+
+
+@pytest.mark.parametrize(
+    "kana, errcode",
+    [
+        ("'ア", ParseKanaErrorCode.ACCENT_TOP),
+        ("ア'イ'", ParseKanaErrorCode.ACCENT_TWICE),
+        ("アイ", ParseKanaErrorCode.ACCENT_NOTFOUND),
+        ("ア'x", ParseKanaErrorCode.UNKNOWN_TEXT),
+        ("ア'//イ'", ParseKanaErrorCode.EMPTY_PHRASE),
+        ("ア？'イ", ParseKanaErrorCode.INTERROGATION_MARK_NOT_AT_END),
+    ],
+)
+def test_errors(kana, errcode):
+    with pytest.raises(ParseKanaError) as e:
+        parse_kana(kana)
+    assert e.value.errcode == errcode
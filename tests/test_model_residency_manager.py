@@ -0,0 +1,138 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from bridge_plugin.synthesis_engine.model_residency_manager import (
+    ModelResidencyManager,
+)
+
+
+def _loader(model):
+    return lambda: model
+
+
+def test_lru_eviction():
+    evicted = []
+    manager = ModelResidencyManager(
+        max_models=2, on_evict=lambda key, model: evicted.append((key, model))
+    )
+    manager.get("a", _loader("model_a"))
+    manager.get("b", _loader("model_b"))
+    # aを使うとbが最も長く使われていないものになる
+    assert manager.get("a", _loader("unused")) == "model_a"
+    manager.get("c", _loader("model_c"))
+
+    assert evicted == [("b", "model_b")]
+    assert "a" in manager and "c" in manager and "b" not in manager
+    assert len(manager) == 2
+
+
+def test_pinned_key_is_not_evicted():
+    manager = ModelResidencyManager(max_models=1, pinned=["a"])
+    manager.get("a", _loader("model_a"))
+    manager.get("b", _loader("model_b"))
+    manager.get("c", _loader("model_c"))
+
+    assert "a" in manager
+    assert "b" not in manager
+    # ピン留めされたものと読み込んだばかりのものだけで上限を超える
+    assert len(manager) == 2
+
+    # 明示的に破棄する場合はピン留めされていても破棄する
+    assert manager.evict("a")
+    assert "a" not in manager
+    assert not manager.evict("a")
+
+
+def test_byte_budget():
+    manager = ModelResidencyManager(max_bytes=10, size_of=len)
+    manager.get("a", _loader("x" * 4))
+    manager.get("b", _loader("x" * 4))
+    assert manager.stats()["bytes"] == 8
+
+    manager.get("c", _loader("x" * 4))
+    assert "a" not in manager
+    assert manager.stats()["bytes"] == 8
+
+
+def test_concurrent_get_loads_once():
+    calls = []
+
+    def load():
+        calls.append(None)
+        time.sleep(0.05)
+        return object()
+
+    manager = ModelResidencyManager()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        models = list(executor.map(lambda _: manager.get("a", load), range(8)))
+
+    assert len(calls) == 1
+    assert all(model is models[0] for model in models)
+    stats = manager.stats()
+    assert stats["loads"] == 1
+    assert stats["hits"] == 7
+
+
+def test_reload():
+    manager = ModelResidencyManager(size_of=len)
+    manager.get("a", _loader("old"))
+    assert manager.get("a", _loader("newer"), reload=True) == "newer"
+    assert manager.get("a", _loader("unused")) == "newer"
+    assert manager.stats()["bytes"] == len("newer")
+    assert len(manager) == 1
+
+
+def test_clear_keeps_counters():
+    evicted = []
+    manager = ModelResidencyManager(on_evict=lambda key, model: evicted.append(key))
+    manager.get("a", _loader("model_a"))
+    manager.clear()
+
+    assert len(manager) == 0
+    assert evicted == []
+    assert manager.stats()["loads"] == 1
+
+
+def test_stats():
+    manager = ModelResidencyManager(max_models=1, size_of=len, pinned=["a"])
+    manager.get("a", _loader("xx"))
+    manager.get("a", _loader("unused"))
+    manager.get("b", _loader("xxx"))
+    manager.get("c", _loader("x"))
+
+    stats = manager.stats()
+    assert stats["models"] == 2
+    assert stats["bytes"] == 3
+    assert stats["pinned"] == 1
+    assert stats["hits"] == 1
+    assert stats["loads"] == 3
+    assert stats["evictions"] == 1
+    assert sum(stats["load_time_histogram"].values()) == 3
+    assert stats["load_time_histogram"]["<=0.1s"] == 3
+
+
+def test_load_error_does_not_store_model():
+    def fail():
+        raise RuntimeError("failed")
+
+    manager = ModelResidencyManager()
+    with pytest.raises(RuntimeError):
+        manager.get("a", fail)
+    assert "a" not in manager
+    assert manager.get("a", _loader("model_a")) == "model_a"
+
+
+def test_has_room():
+    manager = ModelResidencyManager(max_models=2, max_bytes=10, size_of=len)
+    assert manager.has_room()
+    manager.get("a", _loader("x" * 4))
+    assert manager.has_room()
+    manager.get("b", _loader("x" * 4))
+    assert not manager.has_room()
+
+    manager = ModelResidencyManager(max_bytes=10, size_of=len)
+    manager.get("a", _loader("x" * 10))
+    assert not manager.has_room()
+    assert ModelResidencyManager().has_room()
@@ -0,0 +1,115 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from bridge_plugin.synthesis_engine.request_batcher import RequestBatcher
+
+
+class _Recorder:
+    """
+    一括推論に渡された入力を記録し、入力を2倍した結果を返す
+    """
+
+    def __init__(self):
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def __call__(self, items):
+        with self._lock:
+            self.batches.append(list(items))
+        return [item * 2 for item in items]
+
+
+def _infer_all(batcher, requests):
+    with ThreadPoolExecutor(max_workers=len(requests)) as executor:
+        futures = [
+            executor.submit(batcher.infer, key, item, run_batch)
+            for key, item, run_batch in requests
+        ]
+        return [future.result() for future in futures]
+
+
+def test_groups_requests_by_key():
+    batcher = RequestBatcher(batch_window=0.2, max_batch_size=8)
+    recorder_a = _Recorder()
+    recorder_b = _Recorder()
+    requests = [("a", i, recorder_a) for i in range(4)]
+    requests += [("b", i, recorder_b) for i in range(10, 13)]
+    try:
+        results = _infer_all(batcher, requests)
+    finally:
+        batcher.shutdown()
+
+    assert results == [item * 2 for _, item, _ in requests]
+    assert len(recorder_a.batches) == 1
+    assert sorted(recorder_a.batches[0]) == [0, 1, 2, 3]
+    assert len(recorder_b.batches) == 1
+    assert sorted(recorder_b.batches[0]) == [10, 11, 12]
+    assert batcher.stats() == {"batches": 2, "requests": 7, "mean_batch_size": 3.5}
+
+
+def test_max_batch_size():
+    # 上限に達したバッチは待ち時間の経過を待たずに推論される
+    batcher = RequestBatcher(batch_window=10.0, max_batch_size=3)
+    recorder = _Recorder()
+    try:
+        start = time.monotonic()
+        results = _infer_all(batcher, [("a", i, recorder) for i in range(6)])
+        elapsed = time.monotonic() - start
+    finally:
+        batcher.shutdown()
+
+    assert results == [i * 2 for i in range(6)]
+    assert elapsed < 5.0
+    assert [len(batch) for batch in recorder.batches] == [3, 3]
+    assert sorted(sum(recorder.batches, [])) == list(range(6))
+
+
+def test_batch_window():
+    batcher = RequestBatcher(batch_window=0.1, max_batch_size=8)
+    recorder = _Recorder()
+    try:
+        start = time.monotonic()
+        assert batcher.infer("a", 1, recorder) == 2
+        elapsed = time.monotonic() - start
+    finally:
+        batcher.shutdown()
+
+    assert elapsed >= 0.1
+    assert recorder.batches == [[1]]
+
+
+def test_exception_is_propagated_to_all_requests():
+    def fail(items):
+        raise ValueError("failed")
+
+    batcher = RequestBatcher(batch_window=0.1, max_batch_size=2)
+    try:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(batcher.infer, "a", i, fail) for i in range(2)]
+            for future in futures:
+                with pytest.raises(ValueError):
+                    future.result()
+    finally:
+        batcher.shutdown()
+
+
+def test_shutdown_processes_pending_requests():
+    batcher = RequestBatcher(batch_window=0.5, max_batch_size=8)
+    recorder = _Recorder()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(batcher.infer, "a", 1, recorder)
+        while batcher.stats()["requests"] == 0 and len(batcher._pending) == 0:
+            time.sleep(0.01)
+        batcher.shutdown()
+        assert future.result() == 2
+
+    with pytest.raises(RuntimeError):
+        batcher.infer("a", 1, recorder)
+
+
+def test_invalid_max_batch_size():
+    with pytest.raises(ValueError):
+        RequestBatcher(batch_window=0.1, max_batch_size=0)
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from scipy.signal import resample_poly
+
+from bridge_plugin.utility.resample_utility import (
+    StreamingResampler,
+    get_polyphase_filter,
+    resample_wave,
+    resampled_length,
+)
+
+_RATE_PAIRS = [(24000, 48000), (24000, 44100), (24000, 16000), (24000, 24000)]
+
+
+def _wave(length: int, channels: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    shape = (length,) if channels == 0 else (length, channels)
+    return rng.uniform(-1, 1, size=shape).astype(np.float32)
+
+
+def _stream(wave: np.ndarray, src_rate: int, dst_rate: int, chunk_size: int):
+    resampler = StreamingResampler(src_rate, dst_rate)
+    outputs = [
+        resampler.process(wave[i : i + chunk_size])
+        for i in range(0, len(wave), chunk_size)
+    ]
+    outputs.append(resampler.flush())
+    return np.concatenate(outputs, axis=0)
+
+
+@pytest.mark.parametrize("src_rate, dst_rate", _RATE_PAIRS)
+def test_resample_wave_length(src_rate, dst_rate):
+    for length in [0, 1, 7, 1000, 24001]:
+        resampled = resample_wave(_wave(length), src_rate, dst_rate)
+        assert len(resampled) == resampled_length(length, src_rate, dst_rate)
+        assert resampled.dtype == np.float32
+
+
+@pytest.mark.parametrize("src_rate, dst_rate", _RATE_PAIRS[:-1])
+def test_resample_wave_matches_resample_poly(src_rate, dst_rate):
+    wave = _wave(5000)
+    poly = get_polyphase_filter(src_rate, dst_rate)
+    expected = resample_poly(
+        wave.astype(np.float64), poly.up, poly.down, window=poly.window
+    )
+    n_out = resampled_length(len(wave), src_rate, dst_rate)
+    np.testing.assert_allclose(
+        resample_wave(wave, src_rate, dst_rate), expected[:n_out], atol=1e-6
+    )
+
+
+@pytest.mark.parametrize("src_rate, dst_rate", _RATE_PAIRS)
+@pytest.mark.parametrize("chunk_size", [1, 37, 256, 4096, 100000])
+def test_streaming_matches_one_shot(src_rate, dst_rate, chunk_size):
+    wave = _wave(12345)
+    expected = resample_wave(wave, src_rate, dst_rate)
+    streamed = _stream(wave, src_rate, dst_rate, chunk_size)
+    assert streamed.shape == expected.shape
+    np.testing.assert_allclose(streamed, expected, atol=1e-6)
+
+
+@pytest.mark.parametrize("src_rate, dst_rate", _RATE_PAIRS)
+def test_streaming_stereo(src_rate, dst_rate):
+    wave = _wave(3000, channels=2)
+    expected = resample_wave(wave, src_rate, dst_rate)
+    streamed = _stream(wave, src_rate, dst_rate, 500)
+    assert streamed.shape == expected.shape
+    np.testing.assert_allclose(streamed, expected, atol=1e-6)
+
+
+def test_streaming_without_input():
+    resampler = StreamingResampler(24000, 48000)
+    assert len(resampler.flush()) == 0
@@ -0,0 +1,604 @@
+import copy
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch
+from fastapi import HTTPException
+
+from bridge_plugin.bridge_config.BridgeConfig import (
+    BridgeConfig,
+    TokenIDConverterInitArgs,
+)
+from bridge_plugin.model import AccentPhrase, AudioQuery, Mora
+from bridge_plugin.synthesis_engine import synthesis_engine_espnet
+from bridge_plugin.synthesis_engine.synthesis_engine_espnet import (
+    SynthesisEngineESPNet,
+    measure_stage,
+    token_id_converter_key,
+)
+
+_SAMPLING_RATE = 24000
+# 1トークンあたりの波形の長さ(話速1の場合)
+_TOKEN_SAMPLES = 240
+_TOKEN_LIST = [
+    "<blank>",
+    "<unk>",
+    "a",
+    "i",
+    "u",
+    "e",
+    "o",
+    "k",
+    "s",
+    "t",
+    "n",
+    "pau",
+    "0",
+    "1",
+    "2",
+    "3",
+    "4",
+    "-1",
+    "-2",
+    "-3",
+    "-4",
+    "<sos/eos>",
+]
+_PAU = _TOKEN_LIST.index("pau")
+
+
+class _FakeText2Speech:
+    """
+    各トークンの波形がそのトークンだけで決まる、Text2Speechのスタブ
+    pauは無音、それ以外はトークンIDごとに振幅の異なる200Hzの正弦波になる
+    """
+
+    def __init__(self, **init_args):
+        self.init_args = init_args
+        self.always_fix_seed = init_args.get("always_fix_seed", False)
+        self.decode_conf = {"alpha": 1.0}
+        self.model = torch.nn.Linear(4, 4)
+        self.calls = []
+
+    def __call__(self, text, decode_conf=None, **kwargs):
+        decode_conf = decode_conf or {}
+        self.calls.append(decode_conf)
+        length = int(round(_TOKEN_SAMPLES * decode_conf.get("alpha", 1.0)))
+        t = np.arange(length) / _SAMPLING_RATE
+        segments = [
+            np.zeros(length)
+            if token == _PAU
+            else (0.1 + 0.02 * (token % 10)) * np.sin(2 * np.pi * 200 * t)
+            for token in np.asarray(text)
+        ]
+        return {"wav": torch.from_numpy(np.concatenate(segments).astype(np.float32))}
+
+
+class _ConfigLoader:
+    """
+    BridgeConfigLoaderの代わりに、辞書からBridgeConfigを作る
+    """
+
+    def __init__(self, config_dir, config):
+        self.config_file_path = config_dir / "bridge_config.yaml"
+        self.config = config
+
+    def load_config_file(self) -> BridgeConfig:
+        return BridgeConfig(**copy.deepcopy(self.config))
+
+
+def _style(style_id, model_file="model.pth", **kwargs):
+    return {
+        "name": f"style{style_id}",
+        "id": style_id,
+        "g2p": "pyopenjtalk_accent_with_pause",
+        "tts_inference_init_args": {"model_file": model_file},
+        "token_id_converter_init_args": {"token_list": _TOKEN_LIST},
+        **kwargs,
+    }
+
+
+@pytest.fixture
+def make_engine(tmp_path, monkeypatch):
+    """
+    スタブのText2Speechを使うエンジンを作る
+    エンジンは設定ファイルのディレクトリに移動するので、テスト後に元に戻す
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(synthesis_engine_espnet, "Text2Speech", _FakeText2Speech)
+
+    def make(styles=None, **kwargs):
+        config = {
+            "speakers": [
+                {
+                    "name": "speaker",
+                    "speaker_uuid": "00000000-0000-0000-0000-000000000000",
+                    "version": "0.0.1",
+                    "styles": styles or [_style(1)],
+                }
+            ],
+            "engine_version": "0.0.1",
+            "sampling_rate": _SAMPLING_RATE,
+        }
+        kwargs.setdefault("use_gpu", False)
+        kwargs.setdefault("load_all_models", False)
+        return SynthesisEngineESPNet(_ConfigLoader(tmp_path, config), **kwargs)
+
+    return make
+
+
+def _mora(consonant, vowel):
+    return Mora(
+        text=vowel,
+        consonant=consonant,
+        consonant_length=0 if consonant is not None else None,
+        vowel=vowel,
+        vowel_length=0,
+        pitch=0,
+    )
+
+
+def _pause_mora():
+    return Mora(
+        text="、",
+        consonant=None,
+        consonant_length=None,
+        vowel="pau",
+        vowel_length=0,
+        pitch=0,
+    )
+
+
+def _query(n_phrases=4, **kwargs):
+    """
+    2つ目ごとのアクセント句の後にポーズを入れたクエリを作る
+    """
+    moras = [_mora("k", "a"), _mora(None, "i"), _mora("s", "u"), _mora("t", "o")]
+    accent_phrases = [
+        AccentPhrase(
+            moras=moras[: 2 + i % 3],
+            accent=1 + i % 2,
+            pause_mora=_pause_mora() if i % 2 == 1 and i != n_phrases - 1 else None,
+        )
+        for i in range(n_phrases)
+    ]
+    values = dict(
+        accent_phrases=accent_phrases,
+        speedScale=1,
+        pitchScale=0,
+        intonationScale=1,
+        volumeScale=1,
+        prePhonemeLength=0.1,
+        postPhonemeLength=0.1,
+        outputSamplingRate=_SAMPLING_RATE,
+        outputStereo=False,
+    )
+    values.update(kwargs)
+    return AudioQuery(**values)
+
+
+def test_token_list_can_be_read_repeatedly():
+    # 共有のキーを作った後でも、TokenIDConverterの初期化に同じトークンを渡せる
+    init_args = TokenIDConverterInitArgs(token_list=["<blank>", "<unk>", "a"])
+
+    assert token_id_converter_key(init_args) == token_id_converter_key(init_args)
+    assert list(init_args.dict()["token_list"]) == ["<blank>", "<unk>", "a"]
+
+
+def test_measure_stage_accumulates_and_records_on_error():
+    stage_timings = {}
+    with measure_stage(stage_timings, "a"):
+        pass
+    first = stage_timings["a"]
+    with pytest.raises(ValueError):
+        with measure_stage(stage_timings, "a"):
+            raise ValueError()
+    assert stage_timings["a"] >= first
+    assert list(stage_timings) == ["a"]
+
+
+@pytest.mark.parametrize(
+    "query_args,stages",
+    [
+        ({}, {"text2speech", "trim", "padding"}),
+        ({"prePhonemeLength": 0, "postPhonemeLength": 0}, {"text2speech", "trim"}),
+        (
+            {"pitchScale": 0.1},
+            {
+                "text2speech",
+                "trim",
+                "padding",
+                "world_analysis",
+                "f0_transform",
+                "world_synthesis",
+            },
+        ),
+        (
+            {"volumeScale": 0.5, "outputSamplingRate": 48000, "outputStereo": True},
+            {"text2speech", "trim", "padding", "volume", "resample", "stereo"},
+        ),
+    ],
+)
+def test_stage_timings_contain_only_executed_stages(make_engine, query_args, stages):
+    engine = make_engine()
+    query = _query(**query_args)
+
+    wave, stage_timings = engine.synthesis_with_stage_timings(query, style_id=1)
+
+    assert set(stage_timings) == stages
+    assert all(elapsed >= 0 for elapsed in stage_timings.values())
+    np.testing.assert_array_equal(wave, engine.synthesis(query, style_id=1))
+
+
+@pytest.mark.parametrize(
+    "query_args",
+    [
+        {},
+        {"speedScale": 1.5, "volumeScale": 0.5},
+        {"outputSamplingRate": 48000, "outputStereo": True},
+        {"outputSamplingRate": 44100},
+    ],
+)
+def test_stream_matches_synthesis_with_context_free_model(make_engine, query_args):
+    # トークンごとに波形が決まるスタブでは、分割して推論しても合成結果は変わらない
+    # (実際のモデルでは分割の前後の文脈が失われるので一致しない)
+    engine = make_engine(stream_max_chunk_moras=4)
+    query = _query(n_phrases=8, **query_args)
+
+    expected = engine.synthesis(query, style_id=1)
+    chunks = list(engine.synthesis_stream(query, style_id=1))
+
+    assert len(chunks) > 2
+    np.testing.assert_allclose(np.concatenate(chunks), expected, atol=1e-6)
+
+
+@pytest.fixture
+def world_analysis_calls(monkeypatch):
+    """
+    world_analysisの呼び出しを記録する
+    """
+    calls = []
+    world_analysis = synthesis_engine_espnet.world_analysis
+
+    def recording_world_analysis(wave, fs, config):
+        calls.append((len(wave), fs, config))
+        return world_analysis(wave, fs, config)
+
+    monkeypatch.setattr(
+        synthesis_engine_espnet, "world_analysis", recording_world_analysis
+    )
+    return calls
+
+
+def test_world_analysis_skipped_at_default_pitch_and_intonation(
+    make_engine, world_analysis_calls
+):
+    engine = make_engine()
+    query = _query()
+
+    wave = engine.synthesis(query, style_id=1)
+
+    assert world_analysis_calls == []
+    # Text2Speechの出力に開始無音・終了無音を付けただけの波形になる
+    style = engine._get_style(1)
+    tokens = synthesis_engine_espnet.query2tokens(
+        engine._prepare_query(query, True), style.g2p
+    )
+    ids = style.token_id_converter.tokens2ids(tokens)
+    raw = _FakeText2Speech()(ids)["wav"].numpy().astype(np.float64)
+    silence = np.zeros(int(_SAMPLING_RATE * 0.1))
+    np.testing.assert_array_equal(wave, np.concatenate([silence, raw, silence]))
+
+
+@pytest.mark.parametrize("query_args", [{"pitchScale": 0.05}, {"intonationScale": 1.2}])
+def test_world_analysis_runs_when_pitch_or_intonation_changes(
+    make_engine, world_analysis_calls, query_args
+):
+    engine = make_engine()
+
+    wave = engine.synthesis(_query(**query_args), style_id=1)
+
+    assert len(world_analysis_calls) == 1
+    assert len(wave) > 0
+
+
+def test_removed_world_analysis_options_are_ignored(make_engine, world_analysis_calls):
+    # 以前の設定ファイルに残っているcoded_spectral_envelope_dimsは無視する
+    engine = make_engine(
+        styles=[_style(1, world_analysis={"coded_spectral_envelope_dims": 60})]
+    )
+
+    wave = engine.synthesis(_query(intonationScale=1.2), style_id=1)
+
+    config = world_analysis_calls[0][2]
+    assert not hasattr(config, "coded_spectral_envelope_dims")
+    assert len(wave) > 0
+
+
+class _SlowText2Speech(_FakeText2Speech):
+    """
+    推論に時間がかかるスタブ。同時に推論しているリクエスト数の最大値を記録する
+    """
+
+    delay = 0.05
+
+    def __init__(self, **init_args):
+        super().__init__(**init_args)
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, text, decode_conf=None, **kwargs):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            return super().__call__(text, decode_conf=decode_conf, **kwargs)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def _synthesize_concurrently(engine, requests):
+    with ThreadPoolExecutor(max_workers=len(requests)) as executor:
+        futures = [
+            executor.submit(engine.synthesis, query, style_id)
+            for query, style_id in requests
+        ]
+        return [future.result() for future in futures]
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 2, 3])
+def test_max_concurrency_limits_inference_per_style(
+    make_engine, monkeypatch, max_concurrency
+):
+    monkeypatch.setattr(synthesis_engine_espnet, "Text2Speech", _SlowText2Speech)
+    engine = make_engine(
+        styles=[
+            _style(1, model_file="limited.pth", max_concurrency=max_concurrency),
+            _style(2, model_file="unlimited.pth"),
+        ]
+    )
+    query = _query()
+
+    _synthesize_concurrently(engine, [(query, 1)] * 8 + [(query, 2)] * 8)
+
+    assert engine._get_style(1).text2speech.max_active == max_concurrency
+    # 上限の無いスタイルは制限されない
+    assert engine._get_style(2).text2speech.max_active > max_concurrency
+
+
+def test_max_concurrency_is_shared_by_requests_not_models(make_engine, monkeypatch):
+    # 同じモデルを使うスタイルでも、上限はスタイルごとに数える
+    monkeypatch.setattr(synthesis_engine_espnet, "Text2Speech", _SlowText2Speech)
+    engine = make_engine(
+        styles=[_style(1, max_concurrency=1), _style(2, max_concurrency=1)]
+    )
+    query = _query()
+
+    _synthesize_concurrently(engine, [(query, 1)] * 4 + [(query, 2)] * 4)
+
+    text2speech = engine._get_style(1).text2speech
+    assert text2speech is engine._get_style(2).text2speech
+    assert text2speech.max_active == 2
+
+
+@pytest.mark.parametrize("tts_batch_workers", [1, 2])
+def test_batches_of_different_styles_run_in_parallel(
+    make_engine, monkeypatch, tts_batch_workers
+):
+    monkeypatch.setattr(synthesis_engine_espnet, "Text2Speech", _SlowText2Speech)
+    monkeypatch.setattr(_SlowText2Speech, "delay", 0.2)
+    engine = make_engine(
+        styles=[_style(1), _style(2)],
+        tts_batch_window=0.01,
+        tts_max_batch_size=4,
+        tts_batch_workers=tts_batch_workers,
+    )
+    query = _query()
+
+    _synthesize_concurrently(engine, [(query, 1), (query, 2)])
+
+    # 2つのスタイルは同じモデルを共有しているので、同時に推論した数を数えられる
+    assert engine._get_style(1).text2speech.max_active == tts_batch_workers
+
+
+def test_max_concurrency_limits_batched_inference(make_engine, monkeypatch):
+    monkeypatch.setattr(synthesis_engine_espnet, "Text2Speech", _SlowText2Speech)
+    engine = make_engine(
+        styles=[_style(1, max_concurrency=1)],
+        tts_batch_window=0.01,
+        tts_max_batch_size=4,
+        tts_batch_workers=4,
+    )
+    # 話速が異なるリクエストは別のバッチになり、並行して推論されうる
+    requests = [(_query(speedScale=1 + i / 4), 1) for i in range(4)]
+
+    _synthesize_concurrently(engine, requests)
+
+    assert engine._get_style(1).text2speech.max_active == 1
+
+
+def test_concurrent_speed_scales_do_not_interfere(make_engine, monkeypatch):
+    monkeypatch.setattr(synthesis_engine_espnet, "Text2Speech", _SlowText2Speech)
+    monkeypatch.setattr(_SlowText2Speech, "delay", 0.01)
+    engine = make_engine(
+        styles=[
+            _style(
+                1,
+                tts_inference_call_args={"decode_conf": {"noise_scale": 0.5}},
+            )
+        ]
+    )
+    speed_scales = [1.0, 0.5, 2.0, 1.25] * 6
+    queries = [
+        _query(speedScale=speed_scale, prePhonemeLength=0, postPhonemeLength=0)
+        for speed_scale in speed_scales
+    ]
+    expected = [engine.synthesis(query, style_id=1) for query in queries[:4]]
+
+    waves = _synthesize_concurrently(engine, [(query, 1) for query in queries])
+
+    for i, wave in enumerate(waves):
+        np.testing.assert_array_equal(wave, expected[i % 4])
+    text2speech = engine._get_style(1).text2speech
+    # 話速はリクエストごとのdecode_confで渡され、共有の設定は書き換えられない
+    assert text2speech.decode_conf == {"alpha": 1.0}
+    assert engine._get_style(1).tts_inference_call_args.decode_conf == {
+        "noise_scale": 0.5
+    }
+    assert {(call["alpha"], call["noise_scale"]) for call in text2speech.calls} == {
+        (1 / speed_scale, 0.5) for speed_scale in speed_scales
+    }
+
+
+def test_load_all_models_stops_at_max_loaded_models(make_engine):
+    engine = make_engine(
+        styles=[
+            _style(1, model_file="a.pth"),
+            _style(2, model_file="b.pth"),
+            _style(3, model_file="a.pth"),
+            _style(4, model_file="c.pth"),
+            _style(5, model_file="d.pth"),
+        ],
+        load_all_models=True,
+        max_loaded_models=2,
+        pinned_style_ids=[5],
+    )
+
+    stats = engine.model_stats()
+    # 上限まで読み込んだら止めるので、読み込んでから破棄するモデルは無い
+    assert stats["loads"] == 2
+    assert stats["evictions"] == 0
+    # ピン留めされたスタイルが先に読み込まれ、残りの1枠を最初のスタイルが使う
+    assert [
+        engine.is_initialized_style_id_synthesis(style_id) for style_id in range(1, 6)
+    ] == [True, False, True, False, True]
+    # 上限に達していても、読み込まれていないモデルは使うときに読み込まれる
+    engine.synthesis(_query(), style_id=4)
+    assert engine.is_initialized_style_id_synthesis(4)
+
+
+def test_load_all_models_without_budget_loads_every_model(make_engine):
+    engine = make_engine(
+        styles=[_style(1, model_file="a.pth"), _style(2, model_file="b.pth")],
+        load_all_models=True,
+    )
+
+    assert engine.model_stats()["loads"] == 2
+    assert engine.is_initialized_style_id_synthesis(1)
+    assert engine.is_initialized_style_id_synthesis(2)
+
+
+def _set_styles(engine, styles):
+    engine._bridge_config_loader.config["speakers"][0]["styles"] = styles
+
+
+def test_reload_adds_removes_and_renumbers_styles(make_engine):
+    engine = make_engine(
+        styles=[_style(1, model_file="a.pth"), _style(2, model_file="b.pth")]
+    )
+    query = _query()
+    engine.synthesis(query, style_id=1)
+    engine.synthesis(query, style_id=2)
+
+    # スタイル1を削除し、スタイル2をスタイル1に付け替え、スタイル3を追加する
+    _set_styles(
+        engine,
+        [
+            _style(1, model_file="b.pth", max_concurrency=1),
+            _style(3, model_file="c.pth"),
+        ],
+    )
+    engine.reload_config()
+
+    with pytest.raises(HTTPException):
+        engine.synthesis(query, style_id=2)
+    assert [style["id"] for style in json.loads(engine.speakers)[0]["styles"]] == [
+        1,
+        3,
+    ]
+    engine.synthesis(query, style_id=1)
+    engine.synthesis(query, style_id=3)
+    assert engine._get_style(1).text2speech.init_args["model_file"] == Path("b.pth")
+    assert engine._get_style(3).text2speech.init_args["model_file"] == Path("c.pth")
+    config = engine._config
+    assert set(config.styles) == set(config.model_keys) == {1, 3}
+    assert set(config.style_semaphores) == {1}
+    assert [
+        [style.id for style in styles] for styles in config.styles_by_model_key.values()
+    ] == [[1], [3]]
+
+
+def test_reload_replaces_the_whole_snapshot(make_engine):
+    engine = make_engine(styles=[_style(1, max_concurrency=1)])
+    before = engine._config
+
+    _set_styles(engine, [_style(1, max_concurrency=2)])
+    engine.reload_config()
+
+    after = engine._config
+    assert after is not before
+    # 古い索引は書き換えられず、読み込み直しの途中で読んでいたリクエストから見て変わらない
+    assert before.styles[1] is not after.styles[1]
+    assert before.style_semaphores[1] is not after.style_semaphores[1]
+    with pytest.raises(TypeError):
+        after.styles[2] = after.styles[1]
+
+
+def test_style_from_before_reload_keeps_its_own_model(make_engine):
+    engine = make_engine(styles=[_style(1, model_file="a.pth", max_concurrency=1)])
+    old_style = engine._get_style(1)
+
+    # 合成の途中で読み込み直され、同じIDが別のモデルを指すようになった場合
+    _set_styles(engine, [_style(1, model_file="b.pth", max_concurrency=1)])
+    engine.reload_config()
+    engine.initialize_style_id_synthesis(1, skip_reinit=True)
+
+    models = engine._initialize_style(old_style, skip_reinit=True)
+    assert models.text2speech.init_args["model_file"] == Path("a.pth")
+    new_style = engine._get_style(1)
+    assert new_style.text2speech.init_args["model_file"] == Path("b.pth")
+    # 古いスタイルの推論は、新しいスタイルの同時推論数に数えない
+    with engine._inference_slot(old_style):
+        with engine._inference_slot(new_style):
+            pass
+
+
+def test_synthesis_during_repeated_reloads(make_engine):
+    configs = [
+        [_style(1, model_file="a.pth"), _style(2, model_file="b.pth")],
+        [_style(2, model_file="a.pth", max_concurrency=1), _style(3)],
+    ]
+    engine = make_engine(styles=configs[0])
+    query = _query()
+    stop = threading.Event()
+
+    def reload_repeatedly():
+        for i in range(50):
+            engine._bridge_config_loader.config["speakers"][0]["styles"] = configs[
+                i % 2
+            ]
+            engine.reload_config()
+        stop.set()
+
+    def synthesize_repeatedly():
+        count = 0
+        while not stop.is_set():
+            # スタイル2はどちらの設定にもある
+            assert engine.is_initialized_style_id_synthesis(2) in (True, False)
+            assert len(engine.synthesis(query, style_id=2)) > 0
+            count += 1
+        return count
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(synthesize_repeatedly) for _ in range(2)]
+        executor.submit(reload_repeatedly).result()
+        counts = [future.result() for future in futures]
+    assert all(count > 0 for count in counts)
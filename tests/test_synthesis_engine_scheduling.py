@@ -0,0 +1,118 @@
+import threading
+
+import numpy as np
+
+from bridge_plugin.model import AccentPhrase, Mora
+from bridge_plugin.synthesis_engine.core_wrapper import OutputBufferPool
+from bridge_plugin.synthesis_engine.synthesis_engine import SynthesisEngine
+
+
+class _GatedCore:
+    """
+    decode_forwardがgateの開くまで止まるコアのスタブ
+    モデルの読み込み状態の問い合わせと読み込みの回数を記録する
+    """
+
+    def __init__(self, gate, decoding=None):
+        self.gate = gate
+        self.decoding = decoding if decoding is not None else threading.Event()
+        self.output_buffers = OutputBufferPool()
+        self.loaded = set()
+        self.is_model_loaded_calls = 0
+        self.load_model_calls = 0
+
+    def metas(self):
+        return "[]"
+
+    def supported_devices(self):
+        return "{}"
+
+    def is_model_loaded(self, style_id):
+        self.is_model_loaded_calls += 1
+        return style_id in self.loaded
+
+    def load_model(self, style_id):
+        self.load_model_calls += 1
+        self.loaded.add(style_id)
+
+    def yukarin_s_forward(self, length, phoneme_list, style_id):
+        return np.full(length, 0.1, dtype=np.float32)
+
+    def yukarin_sa_forward(self, length, vowel_phoneme_list, style_id, **kwargs):
+        return np.full((len(style_id), length), 5.5, dtype=np.float32)
+
+    def decode_forward(self, length, phoneme_size, f0, phoneme, style_id, out=None):
+        self.decoding.set()
+        self.gate.wait(5)
+        return np.zeros(length * 256, dtype=np.float32)
+
+
+def _accent_phrases():
+    moras = [
+        Mora(
+            text="カ",
+            consonant="k",
+            consonant_length=0,
+            vowel="a",
+            vowel_length=0,
+            pitch=0,
+        )
+        for _ in range(3)
+    ]
+    return [AccentPhrase(moras=moras, accent=1)]
+
+
+def test_running_decode_does_not_delay_phoneme_length():
+    gate = threading.Event()
+    decoding = threading.Event()
+    core = _GatedCore(gate, decoding)
+    # 2つ目のセッションが空いているので、音素長の推論は波形生成の終了を待たずに実行できる
+    engine = SynthesisEngine(core, extra_sessions=[_GatedCore(gate, decoding)])
+    try:
+        engine.initialize_style_id_synthesis(0, skip_reinit=True)
+        decode = engine.scheduler.submit(
+            "decode_forward",
+            length=4,
+            phoneme_size=45,
+            f0=np.zeros((4, 1), dtype=np.float32),
+            phoneme=np.zeros((4, 45), dtype=np.float32),
+            style_id=np.array([0], dtype=np.int64),
+        )
+        assert decoding.wait(5)
+
+        done = threading.Event()
+        result = []
+
+        def run():
+            result.append(engine.replace_phoneme_length(_accent_phrases(), 0))
+            done.set()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        assert done.wait(2), "実行中の波形生成が終わるまで音素長の推論が待たされた"
+        assert not decode.done()
+        gate.set()
+        thread.join(5)
+        decode.result(5)
+    finally:
+        gate.set()
+        engine.scheduler.shutdown()
+
+    moras = result[0][0].moras
+    assert all(mora.vowel_length == np.float32(0.1) for mora in moras)
+
+
+def test_loaded_style_is_not_queried_again():
+    core = _GatedCore(threading.Event())
+    engine = SynthesisEngine(core)
+    try:
+        for _ in range(3):
+            engine.initialize_style_id_synthesis(1, skip_reinit=True)
+            assert engine.is_initialized_style_id_synthesis(1)
+        assert (core.load_model_calls, core.is_model_loaded_calls) == (1, 1)
+
+        # skip_reinitがFalseの場合は読み込み直す
+        engine.initialize_style_id_synthesis(1, skip_reinit=False)
+        assert core.load_model_calls == 2
+    finally:
+        engine.scheduler.shutdown()
@@ -0,0 +1,276 @@
+import numpy as np
+import pytest
+
+from bridge_plugin.acoustic_feature_extractor import OjtPhoneme
+from bridge_plugin.model import AccentPhrase, AudioQuery, Mora
+from bridge_plugin.synthesis_engine import synthesis_engine_base
+from bridge_plugin.synthesis_engine.accent_phrase_cache import AccentPhraseCache
+from bridge_plugin.synthesis_engine.core_wrapper import OutputBufferPool
+from bridge_plugin.synthesis_engine.synthesis_engine import (
+    SynthesisEngine,
+    split_frames_at_pauses,
+    write_output,
+)
+
+_PAU = OjtPhoneme.phoneme_list.index(OjtPhoneme.space_phoneme)
+_PHONEME_SIZE = len(OjtPhoneme.phoneme_list)
+
+
+def _frames(pau_runs, length):
+    """
+    pau_runsの(開始, 終了)の区間だけpauで、それ以外は母音aのフレーム列を作る
+    """
+    phoneme = np.zeros((length, _PHONEME_SIZE), dtype=np.float32)
+    phoneme[:, OjtPhoneme.phoneme_list.index("a")] = 1
+    for start, end in pau_runs:
+        phoneme[start:end] = 0
+        phoneme[start:end, _PAU] = 1
+    return phoneme
+
+
+def _assert_covers(segments, length):
+    assert segments[0][0] == 0
+    assert segments[-1][1] == length
+    for (_, end), (start, _) in zip(segments[:-1], segments[1:]):
+        assert end == start
+
+
+def test_no_split_without_limit_or_for_short_input():
+    phoneme = _frames([(0, 10), (50, 70), (110, 120)], 120)
+    assert split_frames_at_pauses(phoneme, None, 4) == [(0, 120)]
+    assert split_frames_at_pauses(phoneme, 120, 4) == [(0, 120)]
+
+
+def test_split_at_middle_of_pause():
+    phoneme = _frames([(0, 10), (50, 70), (110, 130), (170, 180)], 180)
+    segments = split_frames_at_pauses(phoneme, 80, 4)
+    assert segments == [(0, 60), (60, 120), (120, 180)]
+    _assert_covers(segments, 180)
+
+
+def test_picks_latest_cut_within_limit():
+    phoneme = _frames([(0, 10), (30, 40), (60, 70), (90, 100), (140, 150)], 150)
+    # 95で区切れば最初の分割が100フレーム以下に収まるので、35と65では区切らない
+    assert split_frames_at_pauses(phoneme, 100, 4) == [(0, 95), (95, 150)]
+
+
+def test_no_cut_in_leading_or_trailing_pause():
+    phoneme = _frames([(0, 60), (140, 200)], 200)
+    assert split_frames_at_pauses(phoneme, 50, 4) == [(0, 200)]
+
+
+def test_short_pause_is_ignored():
+    # 2 * overlap_framesより短いpauでは区切らない
+    phoneme = _frames([(0, 5), (50, 57), (100, 120), (160, 165)], 165)
+    assert split_frames_at_pauses(phoneme, 60, 4) == [(0, 110), (110, 165)]
+    assert split_frames_at_pauses(phoneme, 60, 3) == [(0, 53), (53, 110), (110, 165)]
+
+
+class _FakeCore:
+    """
+    各フレームの波形がそのフレームの入力だけで決まる、デコードのスタブ
+    分割してデコードしても、重なる部分は同じ波形になる
+    """
+
+    output_buffers = OutputBufferPool()
+
+    def metas(self):
+        return "[]"
+
+    def supported_devices(self):
+        return "{}"
+
+    def is_model_loaded(self, style_id):
+        return True
+
+    def load_model(self, style_id):
+        pass
+
+    def yukarin_s_forward(self, length, phoneme_list, style_id):
+        return np.full(length, 0.1, dtype=np.float32)
+
+    def yukarin_sa_forward(self, length, vowel_phoneme_list, style_id, **kwargs):
+        return np.full((len(style_id), length), 5.5, dtype=np.float32)
+
+    def decode_forward(self, length, phoneme_size, f0, phoneme, style_id, out=None):
+        frame_values = f0[:, 0] + phoneme.argmax(axis=1)
+        wave = np.repeat(frame_values, 256).astype(np.float32)
+        wave *= np.tile(np.cos(np.arange(256, dtype=np.float32)), length)
+        if out is None:
+            return wave
+        out[...] = wave
+        return out
+
+
+def _query(sampling_rate, stereo):
+    def mora(text, consonant, vowel):
+        return Mora(
+            text=text,
+            consonant=consonant,
+            consonant_length=0.05 if consonant else None,
+            vowel=vowel,
+            vowel_length=0.1,
+            pitch=5.5,
+        )
+
+    pause = Mora(text="、", vowel="pau", vowel_length=0.3, pitch=0)
+    accent_phrases = [
+        AccentPhrase(
+            moras=[mora("カ", "k", "a"), mora("キ", "k", "i"), mora("ク", "k", "u")],
+            accent=1,
+            pause_mora=pause,
+        )
+        for _ in range(5)
+    ]
+    return AudioQuery(
+        accent_phrases=accent_phrases,
+        speedScale=1,
+        pitchScale=0,
+        intonationScale=1,
+        volumeScale=0.5,
+        prePhonemeLength=0.1,
+        postPhonemeLength=0.1,
+        outputSamplingRate=sampling_rate,
+        outputStereo=stereo,
+        kana="",
+    )
+
+
+@pytest.fixture
+def engines():
+    single = SynthesisEngine(_FakeCore())
+    segmented = SynthesisEngine(
+        _FakeCore(), decode_segment_frames=60, decode_overlap_frames=4
+    )
+    yield single, segmented
+    single.scheduler.shutdown()
+    segmented.scheduler.shutdown()
+
+
+@pytest.mark.parametrize(
+    "sampling_rate, stereo", [(24000, False), (48000, True), (44100, False)]
+)
+def test_segmented_decode_matches_single_decode(engines, sampling_rate, stereo):
+    single, segmented = engines
+    query = _query(sampling_rate, stereo)
+
+    phoneme, _ = segmented._frame_scale_features(query, 0)
+    assert len(split_frames_at_pauses(phoneme, 60, 4)) > 1
+
+    expected = single.synthesis(query, 0)
+    wave = segmented.synthesis(query, 0)
+    assert wave.shape == expected.shape
+    np.testing.assert_allclose(wave, expected, atol=1e-4)
+
+    streamed = list(segmented.synthesis_stream(query, 0))
+    assert len(streamed) > 1
+    np.testing.assert_allclose(np.concatenate(streamed), expected, atol=1e-4)
+
+    if stereo:
+        assert wave.shape[1] == 2
+        assert wave.flags.writeable and expected.flags.writeable
+        assert all(chunk.flags.writeable for chunk in streamed)
+
+
+class _FailingCore(_FakeCore):
+    def decode_forward(self, *args, **kwargs):
+        raise RuntimeError("decode failed")
+
+
+@pytest.mark.parametrize(
+    "sampling_rate, stereo", [(24000, False), (24000, True), (48000, True)]
+)
+def test_output_buffer_is_reused_and_not_returned(sampling_rate, stereo):
+    core = _FakeCore()
+    core.output_buffers = OutputBufferPool()
+    engine = SynthesisEngine(core)
+    query = _query(sampling_rate, stereo)
+    try:
+        first = engine.synthesis(query, 0)
+        expected = first.copy()
+        second = engine.synthesis(query, 0)
+    finally:
+        engine.scheduler.shutdown()
+
+    # 2回目は1回目に返したバッファを使い回すが、返した出力は書き換えられない
+    stats = core.output_buffers.stats()
+    assert (stats["allocations"], stats["reuses"], stats["free_buffers"]) == (1, 1, 1)
+    np.testing.assert_array_equal(first, expected)
+    np.testing.assert_array_equal(second, expected)
+    for buffer in core.output_buffers._free.values():
+        assert not np.shares_memory(buffer[0], first)
+        assert not np.shares_memory(buffer[0], second)
+    assert second.flags.writeable and second.flags.c_contiguous
+    if stereo:
+        # 片方のチャンネルを書き換えても、もう片方は変わらない
+        second[:, 0] = 0
+        np.testing.assert_array_equal(second[:, 1], expected[:, 1])
+
+
+def test_output_buffer_is_released_when_decode_fails():
+    core = _FailingCore()
+    core.output_buffers = OutputBufferPool()
+    engine = SynthesisEngine(core)
+    try:
+        with pytest.raises(RuntimeError):
+            engine.synthesis(_query(24000, False), 0)
+    finally:
+        engine.scheduler.shutdown()
+
+    stats = core.output_buffers.stats()
+    assert (stats["allocations"], stats["free_buffers"]) == (1, 1)
+
+
+def test_write_output_applies_gain_without_touching_input():
+    wave = np.linspace(-1, 1, 10, dtype=np.float32)
+    original = wave.copy()
+
+    mono = write_output(wave, 0.5, stereo=False)
+    stereo = write_output(wave, 0.5, stereo=True)
+
+    np.testing.assert_array_equal(wave, original)
+    assert mono.dtype == np.float32 and not np.shares_memory(mono, wave)
+    np.testing.assert_array_equal(mono, original * 0.5)
+    assert stereo.shape == (10, 2) and stereo.flags.c_contiguous
+    np.testing.assert_array_equal(stereo, np.stack([original * 0.5] * 2, axis=1))
+
+
+class _PitchCore(_FakeCore):
+    """
+    全てのモーラの音高をpitchにするスタブ
+    """
+
+    def __init__(self, pitch):
+        self.pitch = pitch
+
+    def yukarin_sa_forward(self, length, vowel_phoneme_list, style_id, **kwargs):
+        return np.full((len(style_id), length), self.pitch, dtype=np.float32)
+
+
+def test_engines_sharing_accent_phrase_cache_do_not_mix_results(monkeypatch):
+    accent_phrases = _query(24000, False).accent_phrases
+    monkeypatch.setattr(
+        synthesis_engine_base,
+        "text_to_accent_phrases",
+        lambda text: [phrase.copy(deep=True) for phrase in accent_phrases],
+    )
+    cache = AccentPhraseCache(max_entries=16)
+    engines = [SynthesisEngine(_PitchCore(5.0)), SynthesisEngine(_PitchCore(6.0))]
+    for engine in engines:
+        engine.accent_phrase_cache = cache
+
+    first = engines[0].create_accent_phrases("テキスト", style_id=0)
+    second = engines[1].create_accent_phrases("テキスト", style_id=0)
+
+    assert engines[0].engine_version != engines[1].engine_version
+    assert {mora.pitch for phrase in first for mora in phrase.moras} == {5.0}
+    assert {mora.pitch for phrase in second for mora in phrase.moras} == {6.0}
+    # 同じエンジンの2回目はキャッシュから返す
+    assert engines[0].create_accent_phrases("テキスト", style_id=0) == first
+    assert cache.stats()["hits"] == 1
+
+
+def test_engine_version_can_be_given():
+    assert SynthesisEngine(_FakeCore(), engine_version="0.12.0").engine_version == (
+        "0.12.0"
+    )
@@ -0,0 +1,232 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+import torch
+import yaml
+from espnet2.bin.tts_inference import Text2Speech
+
+from bridge_plugin.synthesis_engine import text2speech_batcher
+from bridge_plugin.synthesis_engine.text2speech_batcher import (
+    Text2SpeechBatcher,
+    supports_batch_inference,
+    text2speech_batch,
+)
+
+_TOKEN_LIST = ["<blank>", "<unk>", "a", "i", "u", "k", "s", "pau", "<sos/eos>"]
+
+# 学習済みモデルの代わりに使う、ごく小さいVITSの設定
+_TRAIN_CONFIG = {
+    "token_list": _TOKEN_LIST,
+    "odim": None,
+    "feats_extract": "linear_spectrogram",
+    "feats_extract_conf": {"n_fft": 64, "hop_length": 16},
+    "normalize": None,
+    "tts": "vits",
+    "tts_conf": {
+        "sampling_rate": 24000,
+        "generator_params": {
+            "hidden_channels": 8,
+            "text_encoder_attention_heads": 2,
+            "text_encoder_ffn_expand": 2,
+            "text_encoder_blocks": 1,
+            "decoder_channels": 8,
+            "decoder_upsample_scales": [4, 4],
+            "decoder_upsample_kernel_sizes": [8, 8],
+            "decoder_resblock_kernel_sizes": [3],
+            "decoder_resblock_dilations": [[1, 3]],
+            "posterior_encoder_layers": 1,
+            "flow_flows": 1,
+            "flow_layers": 1,
+            "stochastic_duration_predictor_flows": 1,
+            "stochastic_duration_predictor_dds_conv_layers": 1,
+        },
+        "discriminator_params": {"scales": 1, "periods": [2]},
+    },
+    "model_conf": {},
+    "use_preprocessor": False,
+    "token_type": "phn",
+    "bpemodel": None,
+    "non_linguistic_symbols": None,
+    "cleaner": None,
+    "g2p": None,
+}
+
+# 長さの異なる入力(パディングの影響を確かめるため、最長のものとの差を大きくする)
+_IDS_LIST = [
+    np.array([5, 2, 6, 3, 7, 4, 2, 5, 3, 6, 2, 4]),
+    np.array([6, 4]),
+    np.array([2, 3, 4, 7, 5, 2]),
+]
+
+# ノイズを0にして、一括推論と1件ずつの推論が決定的に比較できるようにする
+_CALL_ARGS = {"decode_conf": {"noise_scale": 0.0, "noise_scale_dur": 0.0}}
+
+
+@pytest.fixture(scope="module", params=[True, False], ids=["conformer", "no_conv"])
+def text2speech(request, tmp_path_factory):
+    config = {**_TRAIN_CONFIG, "tts_conf": dict(_TRAIN_CONFIG["tts_conf"])}
+    config["tts_conf"]["generator_params"] = {
+        **_TRAIN_CONFIG["tts_conf"]["generator_params"],
+        "use_conformer_conv_in_text_encoder": request.param,
+    }
+    config_path = tmp_path_factory.mktemp("vits") / "config.yaml"
+    config_path.write_text(yaml.safe_dump(config))
+    torch.manual_seed(0)
+    return Text2Speech(train_config=config_path, device="cpu")
+
+
+def _single(text2speech, ids, call_args=_CALL_ARGS):
+    with torch.no_grad():
+        return text2speech(ids, **call_args)["wav"].view(-1).numpy()
+
+
+@pytest.mark.parametrize("alpha", [1.0, 1.7])
+def test_batch_matches_single_inference(text2speech, alpha):
+    call_args = {"decode_conf": {**_CALL_ARGS["decode_conf"], "alpha": alpha}}
+    assert supports_batch_inference(text2speech, call_args)
+
+    waves = text2speech_batch(text2speech, _IDS_LIST, call_args)
+
+    assert len(waves) == len(_IDS_LIST)
+    for ids, wave in zip(_IDS_LIST, waves):
+        expected = _single(text2speech, ids, call_args)
+        assert wave.shape == expected.shape
+        np.testing.assert_allclose(wave, expected, rtol=0, atol=1e-6)
+
+
+def _fail_batch(*args, **kwargs):
+    raise AssertionError("一括推論は行われないはず")
+
+
+@pytest.mark.parametrize(
+    "call_args",
+    [
+        {"spembs": np.zeros(4, dtype=np.float32)},
+        {"lids": np.array([0])},
+        {"durations": np.array([1, 1])},
+    ],
+    ids=["spembs", "lids", "durations"],
+)
+def test_unsupported_call_args_are_not_batched(text2speech, call_args):
+    assert not supports_batch_inference(text2speech, {**_CALL_ARGS, **call_args})
+
+
+def test_always_fix_seed_falls_back_to_single_calls(text2speech, monkeypatch):
+    monkeypatch.setattr(text2speech, "always_fix_seed", True)
+    monkeypatch.setattr(text2speech_batcher, "_generator_inference", _fail_batch)
+    assert not supports_batch_inference(text2speech, _CALL_ARGS)
+
+    waves = text2speech_batch(text2speech, _IDS_LIST, _CALL_ARGS)
+
+    for ids, wave in zip(_IDS_LIST, waves):
+        np.testing.assert_array_equal(wave, _single(text2speech, ids))
+
+
+def test_fallback_calls_text2speech_with_call_args(monkeypatch):
+    class _Recorder:
+        always_fix_seed = False
+        model = None
+
+        def __init__(self):
+            self.calls = []
+
+        def __call__(self, ids, **kwargs):
+            self.calls.append((ids, kwargs))
+            return {"wav": torch.full((len(ids) * 2,), float(len(ids)))}
+
+    recorder = _Recorder()
+    monkeypatch.setattr(text2speech_batcher, "_generator_inference", _fail_batch)
+    call_args = {"durations": np.array([1, 1]), "decode_conf": {"alpha": 2.0}}
+
+    waves = text2speech_batch(recorder, _IDS_LIST, call_args)
+
+    assert len(recorder.calls) == len(_IDS_LIST)
+    for (ids, kwargs), expected_ids in zip(recorder.calls, _IDS_LIST):
+        assert ids is expected_ids
+        assert kwargs["decode_conf"] == {"alpha": 2.0}
+        assert kwargs["durations"] is call_args["durations"]
+    for ids, wave in zip(_IDS_LIST, waves):
+        np.testing.assert_array_equal(wave, np.full(len(ids) * 2, len(ids)))
+
+
+def test_batcher_groups_requests_and_matches_single_inference(text2speech):
+    batcher = Text2SpeechBatcher(batch_window=0.2, max_batch_size=8)
+    ids_list = _IDS_LIST * 2
+    try:
+        with ThreadPoolExecutor(max_workers=len(ids_list)) as executor:
+            futures = [
+                executor.submit(
+                    batcher.infer,
+                    "style",
+                    ids,
+                    lambda items: text2speech_batch(text2speech, items, _CALL_ARGS),
+                )
+                for ids in ids_list
+            ]
+            waves = [future.result() for future in futures]
+    finally:
+        batcher.shutdown()
+
+    assert batcher.stats()["requests"] == len(ids_list)
+    assert batcher.stats()["batches"] < len(ids_list)
+    for ids, wave in zip(ids_list, waves):
+        np.testing.assert_allclose(wave, _single(text2speech, ids), rtol=0, atol=1e-6)
+
+
+def test_infer_ids_matches_single_inference_and_holds_slot(text2speech):
+    batcher = Text2SpeechBatcher(batch_window=0.2, max_batch_size=8)
+    slots = []
+
+    class _Slot:
+        def __enter__(self):
+            slots.append("enter")
+
+        def __exit__(self, *exc_info):
+            slots.append("exit")
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(_IDS_LIST)) as executor:
+            futures = [
+                executor.submit(
+                    batcher.infer_ids, "style", text2speech, ids, _CALL_ARGS, _Slot
+                )
+                for ids in _IDS_LIST
+            ]
+            waves = [future.result() for future in futures]
+    finally:
+        batcher.shutdown()
+
+    assert slots == ["enter", "exit"] * batcher.stats()["batches"]
+    for ids, wave in zip(_IDS_LIST, waves):
+        np.testing.assert_allclose(wave, _single(text2speech, ids), rtol=0, atol=1e-6)
+
+
+def test_batches_with_different_keys_run_in_parallel_by_default(monkeypatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: 2)
+    batcher = Text2SpeechBatcher(batch_window=0.0, max_batch_size=8)
+    # 2つのキーのバッチが同時に推論されていなければ、待ちきれずにBrokenBarrierErrorになる
+    barrier = threading.Barrier(2, timeout=5)
+
+    def run_batch(items):
+        barrier.wait()
+        return items
+
+    try:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [
+                executor.submit(batcher.infer, key, key, run_batch)
+                for key in ["style1", "style2"]
+            ]
+            results = [future.result() for future in futures]
+    finally:
+        batcher.shutdown()
+
+    assert results == ["style1", "style2"]
+
+
+def test_rejects_invalid_num_workers():
+    with pytest.raises(ValueError):
+        Text2SpeechBatcher(batch_window=0.0, max_batch_size=8, num_workers=0)